@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Minimal blurhash encoder (https://blurha.sh/) used to generate the tiny placeholders that
+# the search page paints while the real thumbnails are downloading. The matching decoder
+# lives in static/search.js.
+
+import math
+
+BASE83_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+# Size that the source thumbnail is scaled down to before computing the components. The
+# placeholder is heavily blurred, so there's no point in looking at more pixels than this.
+SAMPLE_SIZE = 16
+
+def _encode_base83(value, length):
+    ret = ""
+    for i in range(1, length + 1):
+        digit = (value // (83 ** (length - i))) % 83
+        ret += BASE83_CHARS[digit]
+    return ret
+
+def _srgb_to_linear(value):
+    value = value / 255.0
+    if value <= 0.04045:
+        return value / 12.92
+    return math.pow((value + 0.055) / 1.055, 2.4)
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * math.pow(value, 1 / 2.4) - 0.055) * 255 + 0.5)
+
+def _sign_pow(value, exp):
+    return math.copysign(math.pow(abs(value), exp), value)
+
+def encode(pixels, width, height, x_components=4, y_components=3):
+    # pixels is a flat sequence of (r, g, b) tuples in row-major order.
+    if not 1 <= x_components <= 9 or not 1 <= y_components <= 9:
+        raise ValueError("blurhash components must be between 1 and 9")
+
+    if len(pixels) != width * height:
+        raise ValueError("expected %d pixels, got %d" % (width * height, len(pixels)))
+
+    linear = [(_srgb_to_linear(r), _srgb_to_linear(g), _srgb_to_linear(b))
+              for (r, g, b) in pixels]
+
+    # The cosine basis is separable, so precompute it for each axis.
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)]
+             for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)]
+             for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            total = [0.0, 0.0, 0.0]
+            for y in range(height):
+                row_basis = cos_y[j][y]
+                row = y * width
+                for x in range(width):
+                    basis = row_basis * cos_x[i][x]
+                    pixel = linear[row + x]
+                    total[0] += basis * pixel[0]
+                    total[1] += basis * pixel[1]
+                    total[2] += basis * pixel[2]
+
+            scale = normalisation / (width * height)
+            factors.append((total[0] * scale, total[1] * scale, total[2] * scale))
+
+    ret = _encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    ac_components = factors[1:]
+    if ac_components:
+        actual_max = max(abs(value) for factor in ac_components for value in factor)
+        quantised_max = int(max(0, min(82, math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        ret += _encode_base83(quantised_max, 1)
+    else:
+        max_value = 1
+        ret += _encode_base83(0, 1)
+
+    (r, g, b) = factors[0]
+    ret += _encode_base83((_linear_to_srgb(r) << 16) + (_linear_to_srgb(g) << 8) +
+                          _linear_to_srgb(b), 4)
+
+    for (r, g, b) in ac_components:
+        quant = [int(max(0, min(18, math.floor(_sign_pow(value / max_value, 0.5) * 9 + 9.5))))
+                 for value in (r, g, b)]
+        ret += _encode_base83(quant[0] * 19 * 19 + quant[1] * 19 + quant[2], 2)
+
+    return ret
+
+def encode_image(image):
+    # Encodes an already opened PIL image.
+    image = image.convert("RGB")
+    image.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    (width, height) = image.size
+    return encode(list(image.getdata()), width, height)
@@ -25,6 +25,10 @@ def add_date_to_stats(stats, date):
 def cleanup_event_title(event):
     return event["title"] if event["title"] else "Unnamed %s" % (event["id"])
 
+def delta_encode(values):
+    # Stores each value in a sorted list as the difference from the previous value.
+    return values[:1] + [values[idx] - values[idx - 1] for idx in range(1, len(values))]
+
 def get_dir_hash(basename):
     return hashlib.sha1(basename.encode('UTF-8')).hexdigest()[0:2]
 
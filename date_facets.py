@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Builds the date facets that the search page uses for the date searches instead of parsing the
+# exposure time of every media item. month_days maps each MM-dd to the delta encoded positions
+# of the media in the concatenated shards for the "was taken on month/day", "this day", "this
+# week", "month" and "this month" searches. days is a histogram of the media per yyyy-MM-dd
+# that is used to find the years that can match the date range searches.
+
+from common import delta_encode
+
+DATE_FACETS_FILENAME = "media-dates.js"
+
+def get_date(media):
+    # Matches input.split('T')[0] in search.js.
+    return media["exposure_time"].split("T")[0]
+
+def get_month_day(date):
+    return "-".join(date.split("-")[1:3])
+
+def build_date_facets(media_list):
+    # media_list needs to be in the same order as the shards.
+    month_days = {}
+    days = {}
+    for (position, media) in enumerate(media_list):
+        date = get_date(media)
+        month_days.setdefault(get_month_day(date), []).append(position)
+        days[date] = days.get(date, 0) + 1
+
+    return {"month_days": {month_day: delta_encode(month_days[month_day])
+                           for month_day in sorted(month_days.keys())},
+            "days": {date: days[date] for date in sorted(days.keys())}}
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Reads the handful of EXIF and XMP tags that the site uses straight out of JPEG and TIFF
+# based files so that exiv2 doesn't need to be ran for every photo. The entries use the same
+# keys and value formatting as `exiv2 -PEXvkyc` so that Exiv2MetadataParser and the motion
+# photo detection work the same with either source. NotScannable is raised for the formats
+# that need to go through exiv2.
+
+import mmap
+import os
+import struct
+import xml.etree.ElementTree as ET
+from xmp_motion_photo import MAX_HEADER_BYTES, XMP_APP1_SIGNATURE, NotScannable, \
+    iter_app1_segments
+
+EXIF_APP1_SIGNATURE = b"Exif\x00\x00"
+
+# name, size of each component, struct format
+TIFF_TYPES = {1: ("Byte", 1, "B"),
+              2: ("Ascii", 1, None),
+              3: ("Short", 2, "H"),
+              4: ("Long", 4, "L"),
+              5: ("Rational", 8, "LL"),
+              7: ("Undefined", 1, "B"),
+              8: ("SShort", 2, "h"),
+              9: ("SLong", 4, "l"),
+              10: ("SRational", 8, "ll")}
+
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+IMAGE_TAGS = {0x010f: "Exif.Image.Make",
+              0x0110: "Exif.Image.Model",
+              0x8827: "Exif.Image.ISOSpeedRatings"}
+
+PHOTO_TAGS = {0x829a: "Exif.Photo.ExposureTime",
+              0x829d: "Exif.Photo.FNumber",
+              0x8827: "Exif.Photo.ISOSpeedRatings",
+              0x9201: "Exif.Photo.ShutterSpeedValue",
+              0x9202: "Exif.Photo.ApertureValue",
+              0x920a: "Exif.Photo.FocalLength"}
+
+GPS_TAGS = {0x0001: "Exif.GPSInfo.GPSLatitudeRef",
+            0x0002: "Exif.GPSInfo.GPSLatitude",
+            0x0003: "Exif.GPSInfo.GPSLongitudeRef",
+            0x0004: "Exif.GPSInfo.GPSLongitude"}
+
+GCAMERA_NS = "http://ns.google.com/photos/1.0/camera/"
+CONTAINER_NS = "http://ns.google.com/photos/1.0/container/"
+RDF_NS = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+
+def _format_value(raw, type_id, count, byte_order):
+    (_, _, fmt) = TIFF_TYPES[type_id]
+    if fmt is None:
+        return raw.split(b"\x00", 1)[0].decode("UTF-8", "ignore")
+
+    values = struct.unpack(byte_order + fmt * count, raw)
+    if len(fmt) == 2:
+        return " ".join("%d/%d" % (values[i], values[i + 1]) for i in range(0, len(values), 2))
+
+    return " ".join(str(value) for value in values)
+
+def _read_ifd(data, tiff_start, ifd_offset, byte_order, tags, entries):
+    # Appends the entries for the requested tags and returns the offsets of the EXIF and
+    # GPS sub-IFDs.
+    pos = tiff_start + ifd_offset
+    (num_entries,) = struct.unpack(byte_order + "H", data[pos:pos + 2])
+
+    pointers = {}
+    for i in range(num_entries):
+        entry_pos = pos + 2 + (i * 12)
+        (tag, type_id, count) = struct.unpack(byte_order + "HHL", data[entry_pos:entry_pos + 8])
+        if tag in (EXIF_IFD_POINTER, GPS_IFD_POINTER):
+            (pointers[tag],) = struct.unpack(byte_order + "L", data[entry_pos + 8:entry_pos + 12])
+            continue
+
+        if tag not in tags or type_id not in TIFF_TYPES:
+            continue
+
+        length = TIFF_TYPES[type_id][1] * count
+        if length <= 4:
+            value_pos = entry_pos + 8
+        else:
+            (value_pos,) = struct.unpack(byte_order + "L", data[entry_pos + 8:entry_pos + 12])
+            value_pos += tiff_start
+
+        raw = data[value_pos:value_pos + length]
+        if len(raw) != length:
+            raise NotScannable("truncated value for tag 0x%04x" % (tag))
+
+        entries.append((tags[tag], TIFF_TYPES[type_id][0], count,
+                        _format_value(raw, type_id, count, byte_order)))
+
+    return pointers
+
+def _read_tiff(data, tiff_start, entries):
+    header = data[tiff_start:tiff_start + 8]
+    if header[0:4] == b"II*\x00":
+        byte_order = "<"
+    elif header[0:4] == b"MM\x00*":
+        byte_order = ">"
+    else:
+        raise NotScannable("not a TIFF header")
+
+    (ifd0_offset,) = struct.unpack(byte_order + "L", header[4:8])
+    pointers = _read_ifd(data, tiff_start, ifd0_offset, byte_order, IMAGE_TAGS, entries)
+    if EXIF_IFD_POINTER in pointers:
+        _read_ifd(data, tiff_start, pointers[EXIF_IFD_POINTER], byte_order, PHOTO_TAGS, entries)
+    if GPS_IFD_POINTER in pointers:
+        _read_ifd(data, tiff_start, pointers[GPS_IFD_POINTER], byte_order, GPS_TAGS, entries)
+
+def _get_props(element, namespace):
+    # XMP properties can either be written as attributes or as child elements.
+    props = []
+    prefix = "{%s}" % (namespace)
+    for key, value in element.attrib.items():
+        if key.startswith(prefix):
+            props.append((key[len(prefix):], value.strip()))
+
+    for child in element:
+        if child.tag.startswith(prefix) and len(child) == 0 and child.text:
+            props.append((child.tag[len(prefix):], child.text.strip()))
+
+    return props
+
+def _read_xmp(xmp_packet, entries):
+    # Only the Google camera tags that describe motion photos are needed.
+    try:
+        root = ET.fromstring(xmp_packet.strip(b"\x00 \r\n\t"))
+    except ET.ParseError:
+        return
+
+    for element in root.iter():
+        for (name, value) in _get_props(element, GCAMERA_NS):
+            entries.append(("Xmp.GCamera.%s" % (name), "XmpText", len(value), value))
+
+    for directory in root.iter("{%s}Directory" % (CONTAINER_NS)):
+        items = directory.iter("{%s}li" % (RDF_NS))
+        for (index, item) in enumerate(items, start=1):
+            for container_item in item.iter("{%s}Item" % (CONTAINER_NS)):
+                for (name, value) in _get_props(container_item, CONTAINER_NS + "item/"):
+                    key = "Xmp.Container.Directory[%d]/Container:Item/Item:%s" % (index, name)
+                    entries.append((key, "XmpText", len(value), value))
+
+def read_metadata_entries(filename):
+    # Returns a list of (key, type, count, value) tuples.
+    entries = []
+    with open(filename, "rb") as infile:
+        size = os.fstat(infile.fileno()).st_size
+        if size < 8:
+            raise NotScannable("file is too small")
+
+        magic = infile.read(4)
+
+        try:
+            if magic[0:2] == b"\xff\xd8":
+                with mmap.mmap(infile.fileno(), min(size, MAX_HEADER_BYTES),
+                               access=mmap.ACCESS_READ) as data:
+                    for segment in iter_app1_segments(data):
+                        if segment[0:len(EXIF_APP1_SIGNATURE)] == EXIF_APP1_SIGNATURE:
+                            _read_tiff(segment, len(EXIF_APP1_SIGNATURE), entries)
+                        elif segment[0:len(XMP_APP1_SIGNATURE)] == XMP_APP1_SIGNATURE:
+                            _read_xmp(segment[len(XMP_APP1_SIGNATURE):], entries)
+            elif magic in (b"II*\x00", b"MM\x00*"):
+                # TIFF based raw files. The IFDs can be anywhere in the file.
+                with mmap.mmap(infile.fileno(), size, access=mmap.ACCESS_READ) as data:
+                    _read_tiff(data, 0, entries)
+            else:
+                raise NotScannable("unsupported file format")
+        except struct.error as err:
+            raise NotScannable("corrupt EXIF data: %s" % (err)) from err
+
+    return entries
+
+def format_exiv2_text(entries):
+    # Formats the entries like the `exiv2 -PEXvkyc` output for the metadata text files.
+    return "".join("%-44s %-11s %3d  %s\n" % entry for entry in entries)
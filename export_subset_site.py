@@ -17,8 +17,10 @@ import os
 import shutil
 import sys
 import geojson
+import precompress
 from media_writer_common import CommonWriter
-from media_writer_structured import Structured
+from media_writer_structured import BUILD_INFO_FILENAME, Structured, write_build_info, \
+    write_compressed_if_changed, write_map_tiles, write_media_shards
 
 # Top level support files that are copied verbatim from the source site (if present).
 SUPPORT_FILES = ["index.html", "map.html", "map.css", "search.css", "search.js",
@@ -266,7 +268,7 @@ def collect_referenced_files(output):
     for media in output.get("media", []):
         add(media.get("link"))
         add(media.get("metadata_text"))
-        for size in ("small", "medium", "large", "reg"):
+        for size in ("small", "medium", "large", "reg", "fullscreen"):
             add(media.get("thumbnail", {}).get(size))
         for variant_path in media.get("variants", {}).values():
             add(variant_path)
@@ -309,6 +311,7 @@ def copy_support_files(site_dir, dest_dir):
         src_path = os.path.join(site_dir, name)
         if os.path.exists(src_path):
             shutil.copy2(src_path, os.path.join(dest_dir, name))
+            precompress.compress_file(os.path.join(dest_dir, name))
         else:
             logging.warning("Support file %s not found in source site", name)
 
@@ -352,23 +355,16 @@ def write_geojson_file(dest_dir, output):
         features.append(geojson.Feature(geometry=point, properties=row))
 
     feature_collection = geojson.FeatureCollection(features)
-    with open(os.path.join(dest_dir, "media.geojson"), "w", encoding="UTF-8") as fhandle:
-        geojson.dump(feature_collection, fhandle)
+    write_compressed_if_changed(os.path.join(dest_dir, "media.geojson"),
+                                geojson.dumps(feature_collection))
 
 
 def write_media_files(dest_dir, output):
-    with open(os.path.join(dest_dir, "media.json"), "w", encoding="UTF-8") as outfile:
-        outfile.write(json.dumps(output, indent="\t"))
+    write_compressed_if_changed(os.path.join(dest_dir, "media.json"),
+                                json.dumps(output, indent="\t"))
 
-    # The site reads the media from this embedded JavaScript file to work around
-    # browser mitigations for CVE-2019-11730 so that it works for file:// URIs.
-    with open(os.path.join(dest_dir, "media.js"), "w", encoding="UTF-8") as outfile:
-        outfile.write("const _allMedia = ")
-        outfile.write(json.dumps(output, indent=None))
-        outfile.write(";\n")
-        outfile.write("function getAllMediaViaJsFile() {\n")
-        outfile.write("  return _allMedia;\n")
-        outfile.write("}\n")
+    # The site reads the media from the per-year JavaScript files.
+    write_media_shards(dest_dir, output)
 
 
 def build_output(source, selected_media, builder, title):
@@ -378,9 +374,8 @@ def build_output(source, selected_media, builder, title):
             media_by_event.setdefault(media["event_id"], []).append(media)
 
     output = {"title": title}
-    for key in ("version_label", "generated_at"):
-        if key in source:
-            output[key] = source[key]
+    if "version_label" in source:
+        output["version_label"] = source["version_label"]
 
     output["media"] = selected_media
 
@@ -399,6 +394,16 @@ def build_output(source, selected_media, builder, title):
     return output
 
 
+def read_build_info(site_dir, source):
+    # Sites generated before the build info was moved out of media.json have it there.
+    filename = os.path.join(site_dir, BUILD_INFO_FILENAME)
+    if not os.path.exists(filename):
+        return {key: source.get(key) for key in ("version_label", "generated_at")}
+
+    with open(filename, "r", encoding="UTF-8") as fhandle:
+        return json.load(fhandle)
+
+
 def process(options):
     media_ids = read_csv_media_ids(options.media_csv)
     logging.info("Read %d media id(s) from %s", len(media_ids), options.media_csv)
@@ -447,12 +452,18 @@ def process(options):
     logging.info("Copying support files")
     copy_support_files(options.site_directory, options.dest_directory)
 
-    logging.info("Writing media.json and media.js")
+    logging.info("Writing media.json and the media shards")
+    build_info = read_build_info(options.site_directory, source)
+    write_build_info(options.dest_directory, build_info.get("version_label"),
+                     build_info.get("generated_at"))
     write_media_files(options.dest_directory, output)
 
     logging.info("Writing media.geojson")
     write_geojson_file(options.dest_directory, output)
 
+    logging.info("Writing the map tiles")
+    write_map_tiles(options.dest_directory, output["media"])
+
     logging.info("Finished. Self-contained site written to %s", options.dest_directory)
     return 0
 
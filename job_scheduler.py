@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Runs the external commands for the thumbnail pipeline in parallel. Each class of job gets
+# its own concurrency limit and thread cap since ImageMagick and ffmpeg are multithreaded
+# themselves, and new jobs are held back while the system is overloaded or low on memory.
+
+import concurrent.futures
+import enum
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+class JobClass(enum.Enum):
+    PHOTO_RESIZE = 1
+    COMPOSITE = 2
+    GIF = 3
+    TRANSCODE = 4
+
+# How often to check the load average and available memory while backing off.
+BACKOFF_SECS = 0.5
+
+# subprocess.run() kills the command with SIGKILL when the timeout expires.
+TIMED_OUT_RETURN_CODE = -signal.SIGKILL
+
+def run_command(cmd, capture_output=False, env=None, timeout=None):
+    logging.debug("Executing %s", " ".join(cmd))
+    if env:
+        env = {**os.environ, **env}
+
+    try:
+        return subprocess.run(cmd, check=False, capture_output=capture_output, env=env,
+                              timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logging.warning("Killed %s after %s seconds", " ".join(cmd), timeout)
+        return subprocess.CompletedProcess(cmd, TIMED_OUT_RETURN_CODE, b"", b"")
+
+def get_available_memory_mb():
+    try:
+        with open("/proc/meminfo", "r", encoding="UTF-8") as infile:
+            for line in infile:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return None
+
+def get_load_average():
+    try:
+        return os.getloadavg()[0]
+    except OSError:
+        return None
+
+class JobScheduler:
+    def __init__(self, max_jobs, max_load=None, min_free_memory_mb=1024, timeout=None):
+        # max_jobs <= 1 runs every command inline, which is the same as not having a
+        # scheduler at all. timeout is in seconds and applies to each command.
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.max_load = max_load if max_load is not None else float(os.cpu_count() or 1)
+        self.min_free_memory_mb = min_free_memory_mb
+
+        self.limits = {JobClass.PHOTO_RESIZE: max_jobs,
+                       JobClass.COMPOSITE: max(1, max_jobs // 2),
+                       JobClass.GIF: max(1, max_jobs // 2),
+                       JobClass.TRANSCODE: max(1, max_jobs // 4)}
+
+        # Split the CPUs between the jobs that can run at the same time for each class.
+        cpus = os.cpu_count() or 1
+        self.thread_limits = {job_class: max(1, cpus // limit)
+                              for job_class, limit in self.limits.items()}
+
+        self.executors = {}
+        if self.is_parallel():
+            self.executors = {job_class: concurrent.futures.ThreadPoolExecutor(
+                                  max_workers=limit,
+                                  thread_name_prefix=job_class.name.lower())
+                              for job_class, limit in self.limits.items()}
+
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.num_running = 0
+
+    def is_parallel(self):
+        return self.max_jobs > 1
+
+    def get_thread_limit(self, job_class):
+        return self.thread_limits[job_class] if self.is_parallel() else None
+
+    def is_pending(self, path):
+        with self.lock:
+            future = self.pending.get(path)
+            return future is not None and not future.done()
+
+    def submit(self, job_class, cmd, outputs, inputs=(), env=None, on_done=None):
+        # Runs cmd once all of the jobs that create the inputs are finished. on_done is
+        # called with the return code after the command completes, and wait_for() can be
+        # used to wait for the outputs.
+        if not self.is_parallel():
+            self.__run(cmd, env, on_done)
+            return
+
+        future = concurrent.futures.Future()
+        with self.lock:
+            dependencies = [self.pending[path] for path in inputs
+                            if path in self.pending and not self.pending[path].done()]
+            for output in outputs:
+                self.pending[output] = future
+
+        remaining = [len(dependencies)]
+
+        def start(_=None):
+            with self.lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+
+            job = self.executors[job_class].submit(self.__run_when_resources_available,
+                                                   cmd, env, on_done)
+            job.add_done_callback(lambda job: self.__finish(future, job))
+
+        if not dependencies:
+            remaining[0] = 1
+            start()
+        else:
+            for dependency in dependencies:
+                dependency.add_done_callback(start)
+
+    def __finish(self, future, job):
+        exc = job.exception()
+        if exc:
+            logging.error("Job failed: %s", exc)
+        future.set_result(None)
+
+    def __is_overloaded(self):
+        load = get_load_average()
+        if load is not None and load > self.max_load:
+            return True
+
+        free_memory = get_available_memory_mb()
+        return free_memory is not None and free_memory < self.min_free_memory_mb
+
+    def __run_when_resources_available(self, cmd, env, on_done):
+        while True:
+            with self.lock:
+                # Always let one job run so that the pipeline makes progress.
+                if self.num_running == 0 or not self.__is_overloaded():
+                    self.num_running += 1
+                    break
+
+            time.sleep(BACKOFF_SECS)
+
+        try:
+            self.__run(cmd, env, on_done)
+        finally:
+            with self.lock:
+                self.num_running -= 1
+
+    def __run(self, cmd, env, on_done):
+        result = run_command(cmd, env=env, timeout=self.timeout)
+        if on_done:
+            on_done(result.returncode)
+
+    def wait_for(self, paths):
+        with self.lock:
+            futures = [self.pending[path] for path in paths if path in self.pending]
+
+        concurrent.futures.wait(futures)
+
+    def wait_for_all(self):
+        # Dependent jobs are only submitted once their inputs are done, so keep waiting
+        # until nothing new shows up.
+        while True:
+            with self.lock:
+                futures = [future for future in self.pending.values() if not future.done()]
+                if not futures:
+                    self.pending = {}
+                    return
+
+            concurrent.futures.wait(futures)
+
+    def shutdown(self):
+        self.wait_for_all()
+        for executor in self.executors.values():
+            executor.shutdown()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Buckets the geotagged media into z/x/y Web Mercator tiles so that map.html only needs to
+# load the points in the current viewport instead of all of the media. The tiles start at
+# MAP_TILE_ZOOM, and any tile with more than MAX_TILE_POINTS is split into its 4 children at
+# the next zoom level, up to MAX_TILE_ZOOM. Most libraries have their media in a few small
+# areas, so those areas get small tiles while the rest of the world keeps large ones. The
+# tiles don't overlap, and the index lists each one with its zoom level. Each point only has
+# the fields that the map markers and popups need, in the order listed in POINT_FIELDS. The
+# tiles are written as Javascript files that call registerMapTile() so that the map also works
+# for file URIs.
+#
+# Below MAP_TILE_ZOOM, the map shows the precomputed cluster summaries in the index
+# instead. The clusters use a grid with CLUSTER_GRID_ZOOM more zoom levels than the map so
+# that each cell is 64x64 pixels on the screen. The grids are nested so each zoom level is
+# built by merging the 4 child cells of the level below.
+
+import json
+import math
+
+MAP_TILE_ZOOM = 6
+MAX_TILE_ZOOM = 14
+MAX_TILE_POINTS = 500
+MAX_LATITUDE = 85.0511287798
+
+CLUSTER_GRID_ZOOM = 2
+
+POINT_FIELDS = ["media_id", "lat", "lon", "type", "title", "exposure_time",
+                "exposure_time_pretty", "camera", "small", "medium", "reg", "video", "motion_gif"]
+
+CLUSTER_FIELDS = ["lat", "lon", "count", "south", "west", "north", "east", "thumbnail"]
+
+def get_tile(lat, lon, zoom):
+    num_tiles = 2 ** zoom
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = int((lon + 180.0) / 360.0 * num_tiles)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * num_tiles)
+    return (min(max(x, 0), num_tiles - 1), min(max(y, 0), num_tiles - 1))
+
+def get_point(media):
+    thumbnail = media.get("thumbnail", {})
+    video = None
+    if media.get("type") == "video":
+        video = media.get("variants", {}).get("480p", media.get("link"))
+
+    return [media["media_id"], media["lat"], media["lon"], media.get("type"),
+            media.get("title", ""), media.get("exposure_time"),
+            media.get("exposure_time_pretty"), media.get("camera", ""),
+            thumbnail.get("small"), thumbnail.get("medium"), thumbnail.get("reg"), video,
+            media.get("motion_photo", {}).get("reg_gif")]
+
+def _new_cluster(media):
+    return {"lat_sum": media["lat"], "lon_sum": media["lon"], "count": 1,
+            "bounds": [media["lat"], media["lon"], media["lat"], media["lon"]],
+            "rating": media.get("rating", 0),
+            "thumbnail": media.get("thumbnail", {}).get("small")}
+
+def _merge_cluster(cluster, other):
+    cluster["lat_sum"] += other["lat_sum"]
+    cluster["lon_sum"] += other["lon_sum"]
+    cluster["count"] += other["count"]
+    cluster["bounds"] = [min(cluster["bounds"][0], other["bounds"][0]),
+                         min(cluster["bounds"][1], other["bounds"][1]),
+                         max(cluster["bounds"][2], other["bounds"][2]),
+                         max(cluster["bounds"][3], other["bounds"][3])]
+
+    # The highest rated thumbnail represents the cluster.
+    if cluster["thumbnail"] is None or \
+       (other["thumbnail"] is not None and other["rating"] > cluster["rating"]):
+        cluster["rating"] = other["rating"]
+        cluster["thumbnail"] = other["thumbnail"]
+
+def _cluster_to_list(cluster):
+    return [round(cluster["lat_sum"] / cluster["count"], 5),
+            round(cluster["lon_sum"] / cluster["count"], 5),
+            cluster["count"]] + cluster["bounds"] + [cluster["thumbnail"]]
+
+def build_clusters(media_list, max_zoom):
+    # Returns a dictionary that maps each zoom level below max_zoom to its list of clusters.
+    cells = {}
+    for media in media_list:
+        if "lat" not in media:
+            continue
+
+        cell = get_tile(media["lat"], media["lon"], max_zoom - 1 + CLUSTER_GRID_ZOOM)
+        if cell in cells:
+            _merge_cluster(cells[cell], _new_cluster(media))
+        else:
+            cells[cell] = _new_cluster(media)
+
+    ret = {}
+    for zoom in range(max_zoom - 1, -1, -1):
+        ret[str(zoom)] = [_cluster_to_list(cells[cell]) for cell in sorted(cells)]
+
+        parents = {}
+        for (x, y) in sorted(cells):
+            parent = (x // 2, y // 2)
+            if parent in parents:
+                _merge_cluster(parents[parent], cells[(x, y)])
+            else:
+                parents[parent] = cells[(x, y)]
+        cells = parents
+
+    return ret
+
+def _split_tile(tiles, zoom, tile, media_list, max_points):
+    if len(media_list) <= max_points or zoom >= MAX_TILE_ZOOM:
+        tiles["%d/%d/%d" % (zoom, tile[0], tile[1])] = [get_point(media) for media in media_list]
+        return
+
+    children = {}
+    for media in media_list:
+        children.setdefault(get_tile(media["lat"], media["lon"], zoom + 1), []).append(media)
+
+    for child in sorted(children):
+        _split_tile(tiles, zoom + 1, child, children[child], max_points)
+
+def build_map_tiles(media_list, zoom=MAP_TILE_ZOOM, max_points=MAX_TILE_POINTS):
+    # Returns the tile index and a dictionary that maps "z/x/y" to the points in that tile.
+    # zoom is the lowest zoom level of the tiles.
+    by_tile = {}
+    bounds = None
+    for media in media_list:
+        if "lat" not in media:
+            continue
+
+        by_tile.setdefault(get_tile(media["lat"], media["lon"], zoom), []).append(media)
+
+        if bounds is None:
+            bounds = [[media["lat"], media["lon"]], [media["lat"], media["lon"]]]
+        else:
+            bounds = [[min(bounds[0][0], media["lat"]), min(bounds[0][1], media["lon"])],
+                      [max(bounds[1][0], media["lat"]), max(bounds[1][1], media["lon"])]]
+
+    tiles = {}
+    for tile in sorted(by_tile):
+        _split_tile(tiles, zoom, tile, by_tile[tile], max_points)
+
+    index = {"zoom": zoom, "fields": POINT_FIELDS, "bounds": bounds,
+             "count": sum(len(points) for points in tiles.values()),
+             "tiles": {key: len(points) for key, points in tiles.items()},
+             "cluster_fields": CLUSTER_FIELDS, "clusters": build_clusters(media_list, zoom)}
+
+    return (index, tiles)
+
+def get_tile_filename(key):
+    return "map/tiles/%s.js" % (key)
+
+def get_js_call(function, *args):
+    return "%s(%s);\n" % (function, ", ".join(json.dumps(arg, separators=(",", ":"))
+                                              for arg in args))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Writes the full-sized transformed originals for a site that was generated with
+# --virtual-transformed-originals. The generator only records the transformation pipeline
+# in a <transformed image>.pipeline.json sidecar, and this script renders the image from the
+# original and that pipeline. It can either be ran as a batch job over the whole site, or
+# for individual files from a web server handler when a transformed image is requested.
+#
+# Examples:
+#   ./materialize_transformed.py --dest-directory /path/to/generated/html/site
+#   ./materialize_transformed.py --dest-directory /path/to/generated/html/site \
+#       transformed/2024/Vacation/IMG_1234.JPG
+
+import argparse
+import json
+import logging
+import os
+import sys
+from PIL import Image
+import pillow_transformer
+from media_thumbnailer import get_pipeline_filename
+
+PIPELINE_SUFFIX = get_pipeline_filename("")
+
+def is_materialized(transformed_image, pipeline_file):
+    return os.path.isfile(transformed_image) and \
+        os.path.getmtime(transformed_image) >= os.path.getmtime(pipeline_file)
+
+def materialize(transformed_image):
+    pipeline_file = get_pipeline_filename(transformed_image)
+    if not os.path.isfile(pipeline_file):
+        logging.warning("No transformation pipeline found for %s", transformed_image)
+        return False
+
+    if is_materialized(transformed_image, pipeline_file):
+        return True
+
+    with open(pipeline_file, "r", encoding="UTF-8") as infile:
+        pipeline = json.load(infile)
+
+    logging.info("Materializing %s", transformed_image)
+    save_format = pillow_transformer.get_save_format(transformed_image)
+    # Write to a temporary file first so that a web server never serves a partial image.
+    tmp_filename = "%s.tmp" % (transformed_image)
+    try:
+        with Image.open(pipeline["original"]) as image:
+            transformed = pillow_transformer.apply_transformations(image,
+                                                                   pipeline["transformations"])
+            pillow_transformer.save_image(transformed, tmp_filename, image.info, save_format)
+        os.replace(tmp_filename, transformed_image)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
+
+    return True
+
+def find_all_transformed_images(dest_directory):
+    for root, _, files in os.walk(os.path.join(dest_directory, "transformed")):
+        for filename in files:
+            if filename.endswith(PIPELINE_SUFFIX):
+                yield os.path.join(root, filename[:-len(PIPELINE_SUFFIX)])
+
+def process(options):
+    if options.files:
+        transformed_images = []
+        transformed_directory = os.path.realpath(os.path.join(options.dest_directory,
+                                                              "transformed"))
+        for filename in options.files:
+            # The paths may come from a web request, so don't allow escaping the directory.
+            path = os.path.realpath(os.path.join(options.dest_directory, filename))
+            if not path.startswith(transformed_directory + os.sep):
+                logging.error("%s is not a transformed image", filename)
+                return 1
+            transformed_images.append(path)
+    else:
+        transformed_images = find_all_transformed_images(options.dest_directory)
+
+    ret = 0
+    for transformed_image in transformed_images:
+        try:
+            if not materialize(transformed_image):
+                ret = 1
+        except pillow_transformer.IMAGE_ERRORS + (KeyError,) as e:
+            logging.error("Failed to materialize %s: %s", transformed_image, e)
+            ret = 1
+
+    return ret
+
+if __name__ == "__main__":
+    ARGPARSER = argparse.ArgumentParser(
+        description="Write the full-sized transformed originals that were recorded by "
+                    "--virtual-transformed-originals.")
+    ARGPARSER.add_argument("--dest-directory", required=True,
+                           help="Base directory of the generated site")
+    ARGPARSER.add_argument("files", nargs="*",
+                           help="Only materialize these paths, relative to the site directory")
+    ARGPARSER.add_argument("--debug", action="store_true", default=False)
+    ARGS = ARGPARSER.parse_args(sys.argv[1:])
+    logging.basicConfig(format="%(asctime)s %(message)s",
+                        level=logging.DEBUG if ARGS.debug else logging.INFO)
+    sys.exit(process(ARGS))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Writes the fields that the search page can check against all of the media with typed arrays
+# into one binary file of little endian columns. They are only used to find which of the
+# per-year shards need to be loaded, so the dates are cut down to the year. The camera and
+# media type strings are stored as indexes into string tables, and the tag ids are stored as a
+# flat list with the offset of each item's first tag. The JSON header with the column offsets
+# goes into the media index.
+
+import array
+import sys
+
+COLUMNS_FILENAME = "media-columns.bin"
+
+# array typecode: name of the type used by the header
+TYPES = {"b": "int8", "i": "int32", "I": "uint32", "d": "float64"}
+
+# name, typecode. Missing values are written as -1 for the integer columns and NaN for the
+# floating point columns.
+NUMERIC_COLUMNS = [("year", "i"),
+                   ("rating", "b"),
+                   ("width", "i"),
+                   ("height", "i"),
+                   ("filesize", "d"),
+                   ("megapixels", "d"),
+                   ("fps", "d"),
+                   ("clip_duration_secs", "i"),
+                   ("lat", "d"),
+                   ("lon", "d"),
+                   ("event_id", "i")]
+
+STRING_COLUMNS = ["camera", "type"]
+
+def _get_value(media, name):
+    if name == "year":
+        return int(media["exposure_time"].split("-")[0])
+
+    return media.get(name)
+
+def build_media_columns(media_list):
+    # Returns the header and the contents of the binary file.
+    columns = []
+    for (name, typecode) in NUMERIC_COLUMNS:
+        missing = float("nan") if typecode == "d" else -1
+        values = [_get_value(media, name) for media in media_list]
+        columns.append((name, array.array(typecode, [missing if value is None else value
+                                                     for value in values])))
+
+    strings = {}
+    for name in STRING_COLUMNS:
+        strings[name] = sorted(set(media[name] for media in media_list if name in media))
+        string_index = {value: idx for (idx, value) in enumerate(strings[name])}
+        columns.append((name, array.array("i", [string_index[media[name]] if name in media else -1
+                                                for media in media_list])))
+
+    tag_offsets = array.array("I", [0])
+    tag_ids = array.array("i")
+    for media in media_list:
+        tag_ids.extend(media.get("tags", []))
+        tag_offsets.append(len(tag_ids))
+    columns.append(("tag_offsets", tag_offsets))
+    columns.append(("tag_ids", tag_ids))
+
+    header = {"file": COLUMNS_FILENAME, "count": len(media_list), "columns": {},
+              "strings": strings}
+    contents = bytearray()
+    for (name, values) in columns:
+        # Typed arrays need to start on a multiple of their element size.
+        contents.extend(b"\x00" * (-len(contents) % 8))
+        if sys.byteorder != "little":
+            values.byteswap()
+
+        header["columns"][name] = {"type": TYPES[values.typecode], "offset": len(contents),
+                                   "length": len(values)}
+        if values.typecode != "I":
+            header["columns"][name]["missing"] = None if values.typecode == "d" else -1
+
+        contents.extend(values.tobytes())
+
+    return (header, bytes(contents))
@@ -10,8 +10,9 @@ import logging
 import os
 import re
 from PIL import Image
-from common import add_date_to_stats, cleanup_event_title, get_dir_hash
-from media_thumbnailer import ThumbnailType
+from common import cleanup_event_title, get_dir_hash
+from media_stats import add_group_stats
+from media_thumbnailer import SPRITE_SHEET_COLUMNS, SPRITE_SHEET_ROWS, ThumbnailType
 from exiv2_metadata import Exiv2MetadataParser
 
 class Icons:
@@ -73,13 +74,8 @@ class Database:
                 all_media["events_by_year"][year]["events"].append(event)
                 all_media["events_by_year"][year]["stats"]["num_events"] += 1
 
-                for media in event["media"]:
-                    if media["year"] == year:
-                        self.__add_media_to_stats(all_media["events_by_year"][year]["stats"], media)
-
-            self.__sum_stats(all_media["all_stats"], event["stats"])
-
         self.__fetch_tags(all_media)
+        self.__compute_stats(all_media)
 
         thumbnail_basedir = os.path.join(self.dest_thumbs_directory, "year")
         if not os.path.isdir(thumbnail_basedir):
@@ -98,12 +94,18 @@ class Database:
             small_fspath = self.__get_thumbnail_fs_path(year_block["small_thumbnail_path"])
             self.thumbnailer.create_thumbnail(fspath, False, 0, small_fspath, None,
                                               ThumbnailType.SMALL_SQ, None, None)
+            year_block["placeholder"] = self.thumbnailer.get_placeholder(small_fspath)
 
             year_block["medium_thumbnail_path"] = "year/medium/%s" % ("%s.jpg" % (year))
             medium_fspath = self.__get_thumbnail_fs_path(year_block["medium_thumbnail_path"])
             self.thumbnailer.create_thumbnail(fspath, False, 0, medium_fspath, None,
                                               ThumbnailType.MEDIUM_SQ, None, None)
 
+            year_media = [media for event in year_block["events"] for media in event["media"]
+                          if media["year"] == year]
+            year_block["sprites"] = self.__generate_sprite_sheets("year %s" % (year), year_media,
+                                                                  "year/sprite_%%s/%s" % (year))
+
             year_block["events"].sort(key=lambda event: event["stats"]["min_date"], reverse=True)
 
 
@@ -209,7 +211,7 @@ class Database:
                                                                             None, None, None,
                                                                             ThumbnailType.MEDIUM_SQ)
                 video = self.__transform_video(row["filename"])
-                (video_json, video_metadata) = self.thumbnailer.write_video_json(video, media_id)
+                (video_json, video_metadata) = self.thumbnailer.get_video_metadata(video, media_id)
 
                 parsed_video_info = self.__parse_video_tags(video_metadata)
 
@@ -226,6 +228,12 @@ class Database:
                                          medium_short_mp_path, video_json, None, None, variants)
                 media.update(parsed_video_info)
 
+        # The thumbnails may still be generated in the background, so the values that are read
+        # back from the generated files are filled in once all of the jobs are finished.
+        self.thumbnailer.wait_for_all_jobs()
+        for media in all_media["media_by_id"].values():
+            self.__add_generated_media_info(all_media, media)
+
 
     def __parse_orientation(self, orientation):
         if orientation == 6:
@@ -243,15 +251,17 @@ class Database:
                                                                   row["width"], row["height"],
                                                                   rotate)
 
-        # Read the EXIV/XMP/IPTC metadata from the generated text file with all of the metadata
-        # in text form. Some of the Android phones that support motion photos write out the XMP
-        # metadata with a tag like
-        # Xmp.Container.Directory[2]/Container:Item/Item:Length. However, some photos get written
-        # out with the tag Xmp.Container_1_.Directory[2]/Container_1_:Item/Item_1_:Length instead.
-        # The text files are used to extract photo metadata (GPS, aperture, shutter speed, etc.),
-        # generate the animated GIFs, and extract the motion photos.
+        # Read the EXIV/XMP/IPTC metadata that exiv2 dumps in text form. The parsed values are
+        # kept in the metadata store so exiv2 only runs again when the photo changes. Some of
+        # the Android phones that support motion photos write out the XMP metadata with a tag
+        # like Xmp.Container.Directory[2]/Container:Item/Item:Length. However, some photos get
+        # written out with the tag Xmp.Container_1_.Directory[2]/Container_1_:Item/Item_1_:Length
+        # instead. The metadata is used to extract photo metadata (GPS, aperture, shutter
+        # speed, etc.), and as a fallback for detecting motion photos when the XMP packet
+        # can't be read directly from the JPEG header.
         media_id = "thumb%016x" % (row["id"])
-        (metadata_text, exif_metadata) = self.thumbnailer.write_exif_txt(row["filename"], media_id)
+        (metadata_text, exif_metadata) = self.thumbnailer.get_photo_metadata(row["filename"],
+                                                                             media_id)
 
         # Get the original shotwell image width/height and pass that to create_animated_gif()
         # since that's the pixel count that shotwell expects. Note that the width/height are
@@ -260,24 +270,35 @@ class Database:
         if rotate in (90, -90):
             (orig_width, orig_height) = (orig_height, orig_width)
 
-        reg_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"], media_id,
-                                                                 rotate, exif_metadata,
-                                                                 transformations, orig_width,
-                                                                 orig_height, ThumbnailType.REGULAR)
-        large_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"], media_id,
-                                                                   rotate, exif_metadata,
-                                                                   transformations, orig_width,
-                                                                   orig_height, ThumbnailType.LARGE)
-        small_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"], media_id,
-                                                                   rotate, exif_metadata,
-                                                                   transformations, orig_width,
-                                                                   orig_height,
-                                                                   ThumbnailType.SMALL_SQ)
-        medium_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"], media_id,
-                                                                    rotate, exif_metadata,
-                                                                    transformations, orig_width,
-                                                                    orig_height,
-                                                                    ThumbnailType.MEDIUM_SQ)
+        # Photos that aren't motion photos don't need any of the animated GIFs.
+        mp_offset = self.thumbnailer.get_motion_photo_offset(row["filename"], exif_metadata)
+        if mp_offset:
+            reg_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"], media_id,
+                                                                     rotate, mp_offset,
+                                                                     transformations, orig_width,
+                                                                     orig_height,
+                                                                     ThumbnailType.REGULAR)
+            large_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"], media_id,
+                                                                       rotate, mp_offset,
+                                                                       transformations,
+                                                                       orig_width, orig_height,
+                                                                       ThumbnailType.LARGE)
+            small_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"], media_id,
+                                                                       rotate, mp_offset,
+                                                                       transformations,
+                                                                       orig_width, orig_height,
+                                                                       ThumbnailType.SMALL_SQ)
+            medium_short_mp_path = self.thumbnailer.create_animated_gif(row["filename"],
+                                                                        media_id, rotate,
+                                                                        mp_offset,
+                                                                        transformations,
+                                                                        orig_width, orig_height,
+                                                                        ThumbnailType.MEDIUM_SQ)
+        else:
+            reg_short_mp_path = None
+            large_short_mp_path = None
+            small_short_mp_path = None
+            medium_short_mp_path = None
 
         if reg_short_mp_path:
             reg_overlay_icon = self.icons.motion_photo
@@ -346,6 +367,12 @@ class Database:
             event["thumbnail_path"] = overall_thumbnail["thumbnail_path"]
             event["small_thumbnail_path"] = overall_thumbnail["small_thumbnail_path"]
             event["medium_thumbnail_path"] = overall_thumbnail["medium_thumbnail_path"]
+            event["placeholder"] = overall_thumbnail["placeholder"]
+
+            event["sprites"] = \
+                self.__generate_sprite_sheets("event %s" % (cleanup_event_title(event)),
+                                              event["media"],
+                                              "event/sprite_%%s/%s/%d" % (dirhash, event["id"]))
 
             if len(event["years"]) == 1:
                 # Event only spans one year, so use the already generated thumbnail.
@@ -359,13 +386,13 @@ class Database:
         self.__fetch_event_max_dates(all_media)
 
     def __generate_event_thumbnail(self, dirhash, event, year):
+        # The stats are filled in by __compute_stats().
         stats = self.__create_new_stats()
 
         candidate_media = []
         for media in event["media"]:
             if not year or media["year"] == year:
                 candidate_media.append(media)
-                self.__add_media_to_stats(stats, media)
 
         if not year:
             thumbnail_basename = "%d.jpg" % (event["id"])
@@ -383,6 +410,7 @@ class Database:
         small_fspath = self.__get_thumbnail_fs_path(small_thumbnail_path)
         self.thumbnailer.create_thumbnail(fspath, False, 0, small_fspath, None,
                                           ThumbnailType.SMALL_SQ, None, None)
+        placeholder = self.thumbnailer.get_placeholder(small_fspath)
 
         medium_thumbnail_path = "event/medium/%s/%s" % (dirhash, thumbnail_basename)
         medium_fspath = self.__get_thumbnail_fs_path(medium_thumbnail_path)
@@ -390,7 +418,28 @@ class Database:
                                           ThumbnailType.MEDIUM_SQ, None, None)
 
         return {"thumbnail_path": thumbnail_path, "small_thumbnail_path": small_thumbnail_path,
-                "medium_thumbnail_path": medium_thumbnail_path, "stats": stats}
+                "medium_thumbnail_path": medium_thumbnail_path, "placeholder": placeholder,
+                "stats": stats}
+
+    def __generate_sprite_sheets(self, descr, source_media, path_format):
+        # Packs the small and medium thumbnails into sprite sheets so that the search page
+        # can show an event or year with one request per sheet. path_format contains a %s
+        # placeholder for the thumbnail size.
+        source_media = sorted(source_media, key=lambda media: media["exposure_time"])
+
+        ret = {}
+        for size, thumbnail_type in [("small", ThumbnailType.SMALL_SQ),
+                                     ("medium", ThumbnailType.MEDIUM_SQ)]:
+            dest_prefix = self.__get_thumbnail_fs_path(path_format % (size))
+            sheets, media_ids, tile = self.thumbnailer.create_sprite_sheets(descr, source_media,
+                                                                            thumbnail_type,
+                                                                            dest_prefix)
+            ret[size] = {"sheets": [(os.path.relpath(sheet, self.dest_thumbs_directory),
+                                     width, height) for sheet, width, height in sheets],
+                         "media_ids": media_ids, "tile": tile,
+                         "grid": (SPRITE_SHEET_COLUMNS, SPRITE_SHEET_ROWS)}
+
+        return ret
 
     def __fetch_tags(self, all_media):
         tags_by_name = {}
@@ -427,8 +476,6 @@ class Database:
                 all_media["tags"].append(row["id"])
                 all_media["media_by_id"][media["media_id"]]["tags"].add(row["id"])
 
-                self.__add_media_to_stats(tag["stats"], media)
-
             thumbnail_basename = "%d.jpg" % (tag["id"])
             dir_shard = get_dir_hash(thumbnail_basename)
             tag["thumbnail_path"] = "tag/large/%s/%s" % (dir_shard, thumbnail_basename)
@@ -440,6 +487,7 @@ class Database:
             small_fspath = self.__get_thumbnail_fs_path(tag["small_thumbnail_path"])
             self.thumbnailer.create_thumbnail(fspath, False, 0, small_fspath, None,
                                               ThumbnailType.SMALL_SQ, None, None)
+            tag["placeholder"] = self.thumbnailer.get_placeholder(small_fspath)
 
             tag["medium_thumbnail_path"] = "tag/medium/%s/%s" % (dir_shard, thumbnail_basename)
             medium_fspath = self.__get_thumbnail_fs_path(tag["medium_thumbnail_path"])
@@ -492,7 +540,7 @@ class Database:
 
         if transformed:
             # Photos can be cropped and Shotwell doesn't contain the cropped size. Look it up again.
-            (width, height) = self.__get_image_dimensions(new_file)
+            (width, height) = self.thumbnailer.get_transformed_image_dimensions(new_file)
 
         if rotate in (90, -90):
             (width, height) = (height, width)
@@ -556,6 +604,11 @@ class Database:
         media["reg_thumbnail_path"] = "media/regular/%s/%s.jpg" % (dir_shard, media["media_id"])
         media["small_thumbnail_path"] = "media/small/%s/%s.jpg" % (dir_shard, media["media_id"])
         media["medium_thumbnail_path"] = "media/medium/%s/%s.jpg" % (dir_shard, media["media_id"])
+        if not media["media_id"].startswith("video"):
+            # Screen-sized version of the photo for the slideshow and photo frame so that the
+            # browser doesn't need to download and decode the full-sized original.
+            media["fullscreen_path"] = "media/fullscreen/%s/%s.jpg" % (dir_shard,
+                                                                       media["media_id"])
 
         all_artifacts.add(media_filename)
         media["filename"] = self.__get_html_basepath(media_filename)
@@ -565,20 +618,26 @@ class Database:
                                              ThumbnailType.REGULAR, media["reg_thumbnail_path"],
                                              orig_width, orig_height)
         all_artifacts.add(reg_fspath)
-        media["reg_thumbnail_width"] = self.__get_image_dimensions(reg_fspath)[0]
 
         all_artifacts.add(self.__create_thumbnail(media, media_filename, rotate,
                                                   large_overlay_icon, ThumbnailType.LARGE,
                                                   media["thumbnail_path"],
                                                   orig_width, orig_height))
-        all_artifacts.add(self.__create_thumbnail(media, media_filename, rotate,
-                                                  small_overlay_icon, ThumbnailType.SMALL_SQ,
-                                                  media["small_thumbnail_path"],
-                                                  orig_width, orig_height))
+        small_fspath = self.__create_thumbnail(media, media_filename, rotate,
+                                               small_overlay_icon, ThumbnailType.SMALL_SQ,
+                                               media["small_thumbnail_path"],
+                                               orig_width, orig_height)
+        all_artifacts.add(small_fspath)
         all_artifacts.add(self.__create_thumbnail(media, media_filename, rotate,
                                                   medium_overlay_icon, ThumbnailType.MEDIUM_SQ,
                                                   media["medium_thumbnail_path"],
                                                   orig_width, orig_height))
+        if "fullscreen_path" in media:
+            all_artifacts.add(self.__create_thumbnail(media, media_filename, rotate, None,
+                                                      ThumbnailType.FULLSCREEN,
+                                                      media["fullscreen_path"],
+                                                      orig_width, orig_height))
+        self.thumbnailer.release_transformed_image()
 
         all_media["media_by_id"][media_id] = media
 
@@ -608,14 +667,24 @@ class Database:
             for variant in video_variants:
                 all_artifacts.add(os.path.join(self.dest_directory, variant[1]))
 
-        media["all_artifacts_size"] = 0
-        for artifact in all_artifacts:
-            media["all_artifacts_size"] += os.path.getsize(artifact)
-
-        self.__add_media_to_stats(event["stats"], media)
+        # Removed by __add_generated_media_info()
+        media["all_artifacts"] = all_artifacts
 
         return media
 
+    def __add_generated_media_info(self, all_media, media):
+        reg_fspath = self.__get_thumbnail_fs_path(media["reg_thumbnail_path"])
+        media["reg_thumbnail_width"] = self.__get_image_dimensions(reg_fspath)[0]
+
+        small_fspath = self.__get_thumbnail_fs_path(media["small_thumbnail_path"])
+        media["placeholder"] = self.thumbnailer.get_placeholder(small_fspath)
+
+        media["all_artifacts_size"] = 0
+        for artifact in media.pop("all_artifacts"):
+            # Virtual transformed originals may not be materialized yet.
+            if os.path.exists(artifact):
+                media["all_artifacts_size"] += os.path.getsize(artifact)
+
     def __get_event(self, event_id, all_media):
         if event_id in all_media["events_by_id"]:
             return all_media["events_by_id"][event_id]
@@ -641,21 +710,39 @@ class Database:
         stats["max_date"] = None
         return stats
 
-    def __sum_stats(self, total_stats, stats):
-        total_stats["num_photos"] += stats["num_photos"]
-        total_stats["num_videos"] += stats["num_videos"]
-        total_stats["total_filesize"] += stats["total_filesize"]
-        add_date_to_stats(total_stats, stats["min_date"])
-        add_date_to_stats(total_stats, stats["max_date"])
+    def __compute_stats(self, all_media):
+        # The stats of all of the groups of media are computed together once all of the media,
+        # events and tags are fetched.
+        groups = []
+        all_event_media = []
+        media_by_year = {}
+        for event in all_media["events_by_id"].values():
+            groups.append((event["stats"], event["media"]))
+
+            event_media_by_year = {}
+            for media in event["media"]:
+                event_media_by_year.setdefault(media["year"], []).append(media)
+
+            for year, year_media in event_media_by_year.items():
+                if event["years"].get(year) is not None:
+                    groups.append((event["years"][year]["stats"], year_media))
+
+            # The events without a date aren't shown.
+            if event["date"] is None:
+                continue
 
-    def __add_media_to_stats(self, stats, media):
-        num_media_stat = "num_videos" if media["media_id"].startswith("video") else "num_photos"
-        stats[num_media_stat] += 1
+            all_event_media += event["media"]
+            for year, year_media in event_media_by_year.items():
+                media_by_year.setdefault(year, []).extend(year_media)
+
+        groups.append((all_media["all_stats"], all_event_media))
+        for year, year_block in all_media["events_by_year"].items():
+            groups.append((year_block["stats"], media_by_year.get(year, [])))
 
-        stats["total_filesize"] += media["all_artifacts_size"]
+        for tag in all_media["tags_by_id"].values():
+            groups.append((tag["stats"], tag["media"]))
 
-        if media["exposure_time"] != 0:
-            add_date_to_stats(stats, media["exposure_time"])
+        add_group_stats(list(all_media["media_by_id"].values()), groups)
 
     def __get_camera_transformations(self):
         camera_file = os.path.join(self.dest_directory, "cameras.csv")
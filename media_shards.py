@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Splits the media.json contents into a small index with the events, tags and years and one
+# shard of media per year so that the search page only needs to load the years that the
+# current search can match. The shards are listed newest first and keep the order of the
+# media in media.json, so the concatenated shards are in the same order as the full list.
+#
+# Most of the artifact paths follow from the media_id and its directory hash. The shards drop
+# the paths that match one of the PATH_TEMPLATES and set the template's bit in the media's
+# "paths" field instead. search.js rebuilds them from the templates in the index. media.json
+# keeps the full paths for scripts.
+
+from common import get_dir_hash
+
+MEDIA_INDEX_FILENAME = "media-index.js"
+SHARD_DIRECTORY = "media-years"
+
+PATH_TEMPLATES = [["thumbnail.small", "thumbnails/media/small/{dir_hash}/{media_id}.jpg"],
+                  ["thumbnail.medium", "thumbnails/media/medium/{dir_hash}/{media_id}.jpg"],
+                  ["thumbnail.large", "thumbnails/media/large/{dir_hash}/{media_id}.jpg"],
+                  ["thumbnail.reg", "thumbnails/media/regular/{dir_hash}/{media_id}.jpg"],
+                  ["thumbnail.fullscreen",
+                   "thumbnails/media/fullscreen/{dir_hash}/{media_id}.jpg"],
+                  ["motion_photo.mp4", "motion_photo/original/{dir_hash}/{media_id}.mp4"],
+                  ["motion_photo.small_gif", "motion_photo/small/{dir_hash}/{media_id}.gif"],
+                  ["motion_photo.medium_gif", "motion_photo/medium/{dir_hash}/{media_id}.gif"],
+                  ["motion_photo.large_gif", "motion_photo/large/{dir_hash}/{media_id}.gif"],
+                  ["motion_photo.reg_gif", "motion_photo/regular/{dir_hash}/{media_id}.gif"],
+                  ["metadata_text", "metadata/{dir_hash}/{media_id}.txt"],
+                  ["metadata_text", "metadata/{dir_hash}/{media_id}.json"]]
+
+def get_media_year(media):
+    # Matches how search.js gets the year from the exposure time.
+    return media["exposure_time"].split("-")[0]
+
+def get_shard_filename(year):
+    return "%s/%s.js" % (SHARD_DIRECTORY, year)
+
+def expand_path_template(template, media_id, dir_hash):
+    return template.replace("{dir_hash}", dir_hash).replace("{media_id}", media_id)
+
+def compact_media_paths(media):
+    # Returns a copy of the media without the paths that can be rebuilt from PATH_TEMPLATES.
+    dir_hash = get_dir_hash(media["media_id"])
+    ret = dict(media)
+    copied_parents = set([])
+    paths = 0
+    for (bit, (field, template)) in enumerate(PATH_TEMPLATES):
+        (parent_key, key) = field.split(".") if "." in field else (None, field)
+        parent = ret if parent_key is None else ret.get(parent_key)
+        if not parent or \
+           parent.get(key) != expand_path_template(template, media["media_id"], dir_hash):
+            continue
+
+        if parent_key is not None and parent_key not in copied_parents:
+            parent = ret[parent_key] = dict(parent)
+            copied_parents.add(parent_key)
+
+        del parent[key]
+        paths |= 1 << bit
+
+    if paths:
+        ret["dir_hash"] = dir_hash
+        ret["paths"] = paths
+
+    return ret
+
+def build_media_shards(output):
+    # Returns the index and a dictionary that maps each year to its media.
+    shards = {}
+    for media in output["media"]:
+        shards.setdefault(get_media_year(media), []).append(compact_media_paths(media))
+
+    index = {key: value for key, value in output.items() if key != "media"}
+    index["path_templates"] = PATH_TEMPLATES
+    index["shards"] = [{"year": year, "file": get_shard_filename(year),
+                        "count": len(shards[year])}
+                       for year in sorted(shards.keys(), key=int, reverse=True)]
+
+    return (index, shards)
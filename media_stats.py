@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Computes the number of photos and videos, the total file size and the date range of groups of
+# media, such as the events, the years of each event, the years and the tags, together with a
+# few numpy passes over arrays of the fields of all of the media instead of adding each media
+# item to the stats of every group that it is in one at a time.
+
+import numpy
+from common import add_date_to_stats
+
+def add_group_stats(all_media, groups):
+    # groups is a list of (stats, media_list) pairs. The media in each media_list is added to
+    # the stats dictionary that it is paired with. A media item that is in a media_list more
+    # than once is counted each time.
+    positions = {media["media_id"]: idx for (idx, media) in enumerate(all_media)}
+    is_video = numpy.array([media["media_id"].startswith("video") for media in all_media],
+                           dtype=bool)
+    filesize = numpy.array([media["all_artifacts_size"] for media in all_media],
+                           dtype=numpy.int64)
+    exposure_time = numpy.array([media["exposure_time"] for media in all_media],
+                                dtype=numpy.int64)
+
+    group_sizes = [len(media_list) for (_, media_list) in groups]
+    group_ids = numpy.repeat(numpy.arange(len(groups)), group_sizes)
+    members = numpy.fromiter((positions[media["media_id"]]
+                              for (_, media_list) in groups for media in media_list),
+                             dtype=numpy.int64, count=sum(group_sizes))
+
+    num_media = numpy.bincount(group_ids, minlength=len(groups))
+    num_videos = numpy.bincount(group_ids[is_video[members]], minlength=len(groups))
+
+    total_filesize = numpy.zeros(len(groups), dtype=numpy.int64)
+    numpy.add.at(total_filesize, group_ids, filesize[members])
+
+    # An exposure time of 0 means that the date is unknown.
+    member_times = exposure_time[members]
+    dated = member_times != 0
+    dated_ids = group_ids[dated]
+    has_dates = numpy.bincount(dated_ids, minlength=len(groups)) > 0
+    min_dates = numpy.full(len(groups), numpy.iinfo(numpy.int64).max, dtype=numpy.int64)
+    numpy.minimum.at(min_dates, dated_ids, member_times[dated])
+    max_dates = numpy.full(len(groups), numpy.iinfo(numpy.int64).min, dtype=numpy.int64)
+    numpy.maximum.at(max_dates, dated_ids, member_times[dated])
+
+    # The stats are written out as JSON, so the numpy integers are converted back.
+    for (idx, (stats, _)) in enumerate(groups):
+        stats["num_videos"] += int(num_videos[idx])
+        stats["num_photos"] += int(num_media[idx] - num_videos[idx])
+        stats["total_filesize"] += int(total_filesize[idx])
+        if has_dates[idx]:
+            add_date_to_stats(stats, int(min_dates[idx]))
+            add_date_to_stats(stats, int(max_dates[idx]))
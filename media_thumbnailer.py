@@ -9,24 +9,62 @@ import os
 import pathlib
 import re
 import subprocess
+import tempfile
+import threading
+from PIL import Image
+import blurhash
 import common
+import exif_reader
+import pillow_transformer
+from job_scheduler import TIMED_OUT_RETURN_CODE, JobClass, JobScheduler, run_command
+from metadata_store import MetadataStore
+import xmp_motion_photo
 
 COMPOSITE_FRAME_SIZE = 4
 
+# Where the poster frame is taken from for the video thumbnails.
+POSTER_FRAME_SECS = 1
+
+# The poster frame commands write to a new temporary file each time, so the failures are
+# recorded under this name and the video instead of the command.
+POSTER_FRAME_FAILURE_KEY = "extract-poster-frame"
+
+# The failures of the in process Pillow transformations are recorded under this name and the
+# original since there isn't a command.
+PILLOW_TRANSFORM_FAILURE_KEY = "pillow-transform"
+
+# Streams that can be copied as is into the MP4 container and played by browsers. A missing
+# audio stream is also fine.
+REMUX_VIDEO_CODECS = ["h264"]
+REMUX_PIXEL_FORMATS = ["yuv420p", "yuvj420p"]
+REMUX_AUDIO_CODECS = ["aac", None]
+
+def get_pipeline_filename(transformed_image):
+    return transformed_image + ".pipeline.json"
+
+# Sprite sheets hold up to SPRITE_SHEET_COLUMNS x SPRITE_SHEET_ROWS thumbnails so that the
+# search page can draw a whole event with a handful of requests.
+SPRITE_SHEET_COLUMNS = 10
+SPRITE_SHEET_ROWS = 10
+
 class ThumbnailType(enum.Enum):
     SMALL_SQ = 1
     MEDIUM_SQ = 2
     LARGE = 3
     REGULAR = 4
+    FULLSCREEN = 5
 
 class Thumbnailer:
-    def __init__(self, thumbnail_size, small_thumbnail_size, medium_thumbnail_size, dest_directory,
-                 remove_stale_artifacts, imagemagick_command, ffmpeg_command, ffprobe_command,
-                 exiv2_command, skip_metadata_text_if_exists, play_icon,
-                 play_icon_small, play_icon_medium):
+    def __init__(self, thumbnail_size, small_thumbnail_size, medium_thumbnail_size,
+                 fullscreen_size, dest_directory, remove_stale_artifacts, imagemagick_command,
+                 ffmpeg_command, ffprobe_command, exiv2_command, skip_metadata_text_if_exists,
+                 play_icon, play_icon_small, play_icon_medium, transform_engine="imagemagick",
+                 virtual_transformed_originals=False, scheduler=None, write_metadata_text=True,
+                 native_metadata_reader=False):
         self.thumbnail_size = thumbnail_size
         self.small_thumbnail_size = small_thumbnail_size
         self.medium_thumbnail_size = medium_thumbnail_size
+        self.fullscreen_size = fullscreen_size
         self.dest_thumbs_directory = os.path.join(dest_directory, "thumbnails")
         self.transformed_origs_directory = os.path.join(dest_directory, "transformed")
         self.motion_photo_directory = os.path.join(dest_directory, "motion_photo")
@@ -37,16 +75,124 @@ class Thumbnailer:
         self.ffprobe_command = ffprobe_command
         self.exiv2_command = exiv2_command
         self.skip_metadata_text_if_exists = skip_metadata_text_if_exists
+        self.write_metadata_text = write_metadata_text
+        self.native_metadata_reader = native_metadata_reader
         self.play_icon = play_icon
         self.play_icon_small = play_icon_small
         self.play_icon_medium = play_icon_medium
+        self.transform_engine = transform_engine
+        # The most recently transformed original that was decoded in process so that the
+        # thumbnails can be generated without reading the full-sized image back in. It's
+        # dropped by release_transformed_image() once the media's thumbnails are made.
+        self.transformed_image_cache = None
+        # With virtual transformed originals, only the transformation pipeline is recorded
+        # in a sidecar file and the thumbnails are rendered from the original. The
+        # full-sized transformed image is written later by materialize_transformed.py.
+        self.virtual_transformed_originals = virtual_transformed_originals
+        self.virtual_transforms = {}
+        # The poster frame for the most recent video so that all of the thumbnail sizes are
+        # created from a single ffmpeg run.
+        self.video_poster_frame = None
+        self.video_poster_frame_outputs = []
+        self.scheduler = scheduler if scheduler else JobScheduler(1)
         self.generated_artifacts = set([])
         self.video_metadata_cache_file = os.path.join(dest_directory, "video-metadata-cache.json")
         self.video_metadata_cache = self._load_video_metadata_cache()
+        self.placeholder_cache_file = os.path.join(dest_directory, "placeholder-cache.json")
+        self.placeholder_cache = self._load_placeholder_cache()
+        # Commands that failed on a source file are skipped until that file changes so that
+        # corrupt or unsupported media isn't retried in full on every run.
+        self.failure_cache_file = os.path.join(dest_directory, "failure-cache.json")
+        self.failure_cache = self._load_failure_cache()
+        self.failure_cache_lock = threading.Lock()
+        self.checked_failures = set([])
+        self.failure_report_file = os.path.join(dest_directory, "failed-media.txt")
+        self.metadata_store_file = os.path.join(dest_directory, "metadata.sqlite3")
+        self.metadata_store = MetadataStore(self.metadata_store_file)
+
+    def _do_run_command(self, cmd, capture_output, source=None):
+        # source is the media file that the command reads. When it's passed, the result is
+        # recorded in the failure cache.
+        if source and self._is_known_failure(source, cmd):
+            return subprocess.CompletedProcess(cmd,
+                                               self.failure_cache[" ".join(cmd)]["returncode"],
+                                               b"", b"")
+
+        result = run_command(cmd, capture_output, timeout=self.scheduler.timeout)
+        if source:
+            self._record_command_result(source, cmd, result.returncode)
+
+        return result
+
+    def __get_source_fingerprint(self, source):
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+
+        return [stat.st_mtime, stat.st_size]
 
-    def _do_run_command(self, cmd, capture_output):
-        logging.debug("Executing %s", " ".join(cmd))
-        return subprocess.run(cmd, check=False, capture_output=capture_output)
+    def _is_known_failure(self, source, cmd):
+        key = " ".join(cmd)
+        with self.failure_cache_lock:
+            self.checked_failures.add(key)
+            entry = self.failure_cache.get(key)
+
+        if not entry or entry["fingerprint"] != self.__get_source_fingerprint(source):
+            return False
+
+        logging.info("Skipping %s since it failed on a previous run", key)
+        return True
+
+    def _record_command_result(self, source, cmd, returncode):
+        key = " ".join(cmd)
+        with self.failure_cache_lock:
+            self.checked_failures.add(key)
+            if returncode == 0:
+                self.failure_cache.pop(key, None)
+                return
+
+            self.failure_cache[key] = {"source": source,
+                                       "fingerprint": self.__get_source_fingerprint(source),
+                                       "returncode": returncode}
+
+    def _submit_command(self, job_class, cmd, outputs, inputs=(), on_done=None, source=None):
+        # Queues a command that creates the outputs on the job scheduler. Anything that reads
+        # the outputs needs to call wait_for() first. on_done is only called when the command
+        # succeeds, and failures are recorded in the failure cache when source is passed.
+        if source and self._is_known_failure(source, cmd):
+            return
+
+        def command_finished(returncode):
+            if source:
+                self._record_command_result(source, cmd, returncode)
+            if returncode != 0:
+                logging.warning("Error executing %s: %d", " ".join(cmd), returncode)
+            elif on_done:
+                on_done()
+
+        env = None
+        run_cmd = cmd
+        threads = self.scheduler.get_thread_limit(job_class)
+        if threads:
+            if cmd[0] == self.ffmpeg_command:
+                run_cmd = cmd[:-1] + ["-threads", str(threads), cmd[-1]]
+            else:
+                env = {"MAGICK_THREAD_LIMIT": str(threads)}
+
+        self.scheduler.submit(job_class, run_cmd, outputs, inputs, env, command_finished)
+
+    def _write_idx_file_when_done(self, tn_idx_file, tn_idx_contents):
+        return lambda: pathlib.Path(tn_idx_file).write_text(tn_idx_contents, encoding="UTF-8")
+
+    def wait_for(self, paths):
+        self.scheduler.wait_for(paths)
+
+    def wait_for_all_jobs(self):
+        self.scheduler.wait_for_all()
+
+    def _exists_or_pending(self, path):
+        return self.scheduler.is_pending(path) or os.path.isfile(path)
 
     def _load_video_metadata_cache(self):
         if not os.path.exists(self.video_metadata_cache_file):
@@ -68,6 +214,99 @@ class Thumbnailer:
         except IOError as e:
             logging.warning("Failed to save video metadata cache: %s", e)
 
+    def _load_placeholder_cache(self):
+        if not os.path.exists(self.placeholder_cache_file):
+            return {}
+
+        try:
+            with open(self.placeholder_cache_file, 'r', encoding='UTF-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.warning("Failed to load placeholder cache: %s", e)
+            return {}
+
+    def _save_placeholder_cache(self):
+        # Only keep the entries for thumbnails that are still part of the site.
+        cache = {key: value for key, value in self.placeholder_cache.items()
+                 if os.path.join(self.dest_thumbs_directory, key) in self.generated_artifacts}
+
+        try:
+            with open(self.placeholder_cache_file, 'w', encoding='UTF-8') as f:
+                json.dump(cache, f, indent=2)
+            self.generated_artifacts.add(self.placeholder_cache_file)
+        except IOError as e:
+            logging.warning("Failed to save placeholder cache: %s", e)
+
+    def _load_failure_cache(self):
+        if not os.path.exists(self.failure_cache_file):
+            return {}
+
+        try:
+            with open(self.failure_cache_file, 'r', encoding='UTF-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.warning("Failed to load failure cache: %s", e)
+            return {}
+
+    def _save_failure_cache(self):
+        # Only keep the entries for commands that were still needed on this run.
+        cache = {key: value for key, value in self.failure_cache.items()
+                 if key in self.checked_failures}
+
+        try:
+            with open(self.failure_cache_file, 'w', encoding='UTF-8') as f:
+                json.dump(cache, f, indent=2)
+            self.generated_artifacts.add(self.failure_cache_file)
+        except IOError as e:
+            logging.warning("Failed to save failure cache: %s", e)
+
+        return cache
+
+    def _write_failure_report(self, failures):
+        lines = []
+        for key, value in sorted(failures.items(), key=lambda item: item[1]["source"]):
+            if value["returncode"] == TIMED_OUT_RETURN_CODE:
+                status = "timed out"
+            else:
+                status = "exited with %d" % (value["returncode"])
+            lines.append("%s: %s: %s\n" % (value["source"], status, key))
+
+        if lines:
+            logging.warning("%d commands failed. See %s for the list of media.", len(lines),
+                            self.failure_report_file)
+
+        try:
+            with open(self.failure_report_file, 'w', encoding='UTF-8') as f:
+                f.writelines(lines)
+            self.generated_artifacts.add(self.failure_report_file)
+        except IOError as e:
+            logging.warning("Failed to write failure report: %s", e)
+
+    def get_placeholder(self, thumbnail):
+        # Returns a blurhash string for the thumbnail that the search page can paint while the
+        # real image is downloading. The small square thumbnails are passed in here so that
+        # only a few KB needs to be decoded.
+        self.wait_for([thumbnail])
+        if not os.path.isfile(thumbnail):
+            return None
+
+        stat = os.stat(thumbnail)
+        cache_key = os.path.relpath(thumbnail, self.dest_thumbs_directory)
+        cached = self.placeholder_cache.get(cache_key)
+        if cached and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+            return cached["blurhash"]
+
+        try:
+            with Image.open(thumbnail) as image:
+                placeholder = blurhash.encode_image(image)
+        except (OSError, ValueError) as e:
+            logging.warning("Failed to generate placeholder for %s: %s", thumbnail, e)
+            return None
+
+        self.placeholder_cache[cache_key] = {"mtime": stat.st_mtime, "size": stat.st_size,
+                                             "blurhash": placeholder}
+        return placeholder
+
     def create_composite_media_thumbnail(self, title, source_media, dest_filename):
         base_dir = os.path.dirname(dest_filename)
         if not os.path.isdir(base_dir):
@@ -92,25 +331,86 @@ class Thumbnailer:
                             dest_filename, title)
             cmd = [self.imagemagick_command, "-size", self.thumbnail_size, "xc:lightgray",
                    dest_filename]
-            self._do_run_command(cmd, False)
-            pathlib.Path(tn_idx_file).write_text(tn_idx_contents, encoding="UTF-8")
+            self._submit_command(JobClass.COMPOSITE, cmd, [dest_filename],
+                                 on_done=self._write_idx_file_when_done(tn_idx_file,
+                                                                        tn_idx_contents))
             return
 
         logging.info("Generating composite thumbnail for %s: %s", title, dest_filename)
 
         file_ops = []
+        inputs = []
         for media in source_media:
-            file_ops += ["(",
-                         os.path.join(self.dest_thumbs_directory, media["medium_thumbnail_path"]),
-                         "-thumbnail", "%s^" % (geometry), "-gravity", "center",
+            thumbnail = os.path.join(self.dest_thumbs_directory, media["medium_thumbnail_path"])
+            inputs.append(thumbnail)
+            file_ops += ["(", thumbnail, "-thumbnail", "%s^" % (geometry), "-gravity", "center",
                          "-extent", geometry, ")"]
 
         cmd = ["montage", *file_ops, "-geometry", "%s+0+0" % (geometry),
                "-background", "white", "-tile", tile_size, "-frame", str(COMPOSITE_FRAME_SIZE),
                dest_filename]
-        self._do_run_command(cmd, False)
+        self._submit_command(JobClass.COMPOSITE, cmd, [dest_filename], inputs,
+                             self._write_idx_file_when_done(tn_idx_file, tn_idx_contents))
+
+    def create_sprite_sheets(self, title, source_media, thumbnail_type, dest_prefix):
+        # Packs the small or medium square thumbnails for the media into one or more sprite
+        # sheets named <dest_prefix>_<page>.jpg. Returns the list of sheets as
+        # (filename, width, height), the media_ids in the order of the tiles and the tile size.
+        # The tiles fill each sheet row by row with SPRITE_SHEET_COLUMNS tiles per row, so the
+        # position of each media follows from its place in the list.
+        if thumbnail_type == ThumbnailType.SMALL_SQ:
+            path_key = "small_thumbnail_path"
+            tile_width, tile_height = [int(x) for x in self.small_thumbnail_size.split("x")]
+        else:
+            path_key = "medium_thumbnail_path"
+            tile_width, tile_height = [int(x) for x in self.medium_thumbnail_size.split("x")]
 
-        pathlib.Path(tn_idx_file).write_text(tn_idx_contents, encoding="UTF-8")
+        thumbnails = []
+        for media in source_media:
+            thumbnail = os.path.join(self.dest_thumbs_directory, media[path_key])
+            self.wait_for([thumbnail])
+            if os.path.isfile(thumbnail):
+                thumbnails.append((media["media_id"], thumbnail))
+
+        sheets = []
+        tiles_per_sheet = SPRITE_SHEET_COLUMNS * SPRITE_SHEET_ROWS
+        for page, start in enumerate(range(0, len(thumbnails), tiles_per_sheet)):
+            page_thumbnails = thumbnails[start:start + tiles_per_sheet]
+            dest_filename = "%s_%d.jpg" % (dest_prefix, page)
+            columns = min(len(page_thumbnails), SPRITE_SHEET_COLUMNS)
+            self.__create_sprite_sheet(title, page_thumbnails, dest_filename,
+                                       "%dx%d" % (tile_width, tile_height), columns)
+
+            rows = -(-len(page_thumbnails) // SPRITE_SHEET_COLUMNS)
+            sheets.append((dest_filename, columns * tile_width, rows * tile_height))
+
+        return sheets, [media_id for media_id, _ in thumbnails], (tile_width, tile_height)
+
+    def __create_sprite_sheet(self, title, thumbnails, dest_filename, geometry, columns):
+        base_dir = os.path.dirname(dest_filename)
+        if not os.path.isdir(base_dir):
+            os.makedirs(base_dir)
+
+        # Include the modification time of each thumbnail so that the sheet is regenerated
+        # if one of the thumbnails is recreated.
+        tn_idx_file = "%s.idx" % (dest_filename)
+        tn_idx_contents = ','.join(["%s:%d" % (media_id, os.path.getmtime(thumbnail))
+                                    for media_id, thumbnail in thumbnails])
+
+        self.generated_artifacts.add(dest_filename)
+        self.generated_artifacts.add(tn_idx_file)
+
+        if self.__is_thumbnail_up_to_date(dest_filename, tn_idx_file, tn_idx_contents):
+            return
+
+        logging.info("Generating sprite sheet for %s: %s", title, dest_filename)
+
+        cmd = ["montage", *[thumbnail for _, thumbnail in thumbnails],
+               "-geometry", "%s+0+0" % (geometry), "-background", "white",
+               "-tile", "%dx" % (columns), dest_filename]
+        self._submit_command(JobClass.COMPOSITE, cmd, [dest_filename],
+                             on_done=self._write_idx_file_when_done(tn_idx_file,
+                                                                    tn_idx_contents))
 
     def __get_composite_thumbnail_media(self, source_media, max_photos):
         # Group the media by rating (largest to smallest). For each rating, if there is more
@@ -180,11 +480,66 @@ class Thumbnailer:
         return num_photos, tile_size, geometry
 
     def transform_video(self, original_video, transformed_video):
+        codecs = self._get_video_codecs(original_video)
+        if codecs and codecs["video"] in REMUX_VIDEO_CODECS and \
+           codecs["pix_fmt"] in REMUX_PIXEL_FORMATS:
+            # The video stream can be played by browsers as is, so only the container needs
+            # to be changed. The audio is only reencoded if it isn't already AAC.
+            if codecs["audio"] in REMUX_AUDIO_CODECS:
+                audio_args = ["-c:a", "copy"]
+            else:
+                audio_args = ["-c:a", "aac", "-b:a", "128k"]
+
+            cmd = [self.ffmpeg_command, "-y", "-hide_banner", "-loglevel", "warning",
+                   "-i", original_video, "-map", "0:v:0", "-map", "0:a:0?",
+                   "-map_metadata", "0", "-c:v", "copy", *audio_args,
+                   "-movflags", "+faststart+use_metadata_tags", transformed_video]
+            return self.__run_cmd(cmd, original_video, transformed_video, JobClass.TRANSCODE)
+
         cmd = [self.ffmpeg_command, "-y", "-hide_banner", "-loglevel", "warning",
                "-i", original_video, "-map_metadata", "0", "-c:v", "libx264", "-preset", "slow",
                "-pix_fmt", "yuv420p", "-c:a", "aac", "-b:a", "128k",
                "-movflags", "+faststart+use_metadata_tags", transformed_video]
-        return self.__run_cmd(cmd, transformed_video)
+        return self.__run_cmd(cmd, original_video, transformed_video, JobClass.TRANSCODE)
+
+    def _get_video_codecs(self, filename):
+        # Returns the codecs of the first video and audio streams along with the pixel format
+        # of the video. This is cached separately from the resolution since it's only needed
+        # for the videos that need to be transformed.
+        abs_filename = os.path.abspath(filename)
+        file_mtime = os.path.getmtime(filename)
+
+        cache_key = "codecs:%s" % (abs_filename)
+        cached = self.video_metadata_cache.get(cache_key)
+        if cached and cached['mtime'] == file_mtime:
+            logging.debug("Using cached video codecs for %s", filename)
+            return cached['codecs']
+
+        cmd = [self.ffprobe_command, "-v", "error", "-show_entries",
+               "stream=codec_type,codec_name,pix_fmt", "-of", "json", filename]
+        result = self._do_run_command(cmd, True, filename)
+        if result.returncode != 0:
+            logging.error("Error running %s: %s", cmd, result.returncode)
+            return None
+
+        try:
+            streams = json.loads(result.stdout.decode("UTF-8")).get("streams", [])
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logging.warning("Cannot parse the streams for %s: %s", filename, e)
+            return None
+
+        video_streams = [stream for stream in streams if stream.get("codec_type") == "video"]
+        audio_streams = [stream for stream in streams if stream.get("codec_type") == "audio"]
+        if not video_streams:
+            return None
+
+        codecs = {"video": video_streams[0].get("codec_name"),
+                  "pix_fmt": video_streams[0].get("pix_fmt"),
+                  "audio": audio_streams[0].get("codec_name") if audio_streams else None}
+
+        self.video_metadata_cache[cache_key] = {'codecs': codecs, 'mtime': file_mtime}
+
+        return codecs
 
     def create_multiple_resolutions(self, original_video, base_filename):
         (orig_width, orig_height, rotate) = self._get_video_resolution(original_video)
@@ -209,7 +564,7 @@ class Thumbnailer:
                    "-pix_fmt", "yuv420p", "-c:a", "aac", "-b:a", "128k",
                    "-movflags", "+faststart+use_metadata_tags", filename]
 
-            self.__run_cmd(cmd, filename)
+            self.__run_cmd(cmd, original_video, filename, JobClass.TRANSCODE)
             ret.append((name, filename))
 
         return ret
@@ -218,14 +573,38 @@ class Thumbnailer:
         # Use imagemagick to perform transformations on the original image that are defined in
         # Shotwell.
 
+        if self.virtual_transformed_originals:
+            if not transformations:
+                return (original_image, False)
+
+            new_file = self.__record_virtual_transform(original_image, transformed_image,
+                                                       transformations)
+            if not new_file:
+                return (original_image, False)
+
+            return (new_file, True)
+
+        if self.transform_engine == "pillow":
+            if not transformations:
+                return (original_image, False)
+
+            new_file = self.__transform_with_pillow(original_image, transformed_image,
+                                                    transformations)
+            if not new_file:
+                # Use the original as is so that the media still shows up on the site.
+                return (original_image, False)
+
+            return (new_file, True)
+
         cmd = self.__get_imagemagick_transformation_cmd(original_image, transformed_image,
                                                         transformations)
         if not cmd:
             return (original_image, False)
 
-        return (self.__run_cmd(cmd, transformed_image), True)
+        return (self.__run_cmd(cmd, original_image, transformed_image, JobClass.PHOTO_RESIZE),
+                True)
 
-    def __run_cmd(self, cmd, transformed_image):
+    def __run_cmd(self, cmd, source, transformed_image, job_class):
         self.generated_artifacts.add(transformed_image)
 
         base_dir = os.path.dirname(transformed_image)
@@ -240,12 +619,209 @@ class Thumbnailer:
             return transformed_image
 
         logging.info("Transforming original image: %s", " ".join(cmd))
-        self._do_run_command(cmd, False)
+        self._submit_command(job_class, cmd, [transformed_image],
+                             on_done=self._write_idx_file_when_done(idx_file, idx_contents),
+                             source=source)
+
+        return transformed_image
+
+    def __transform_with_pillow(self, original_image, transformed_image, transformations):
+        self.generated_artifacts.add(transformed_image)
+
+        base_dir = os.path.dirname(transformed_image)
+        if not os.path.isdir(base_dir):
+            os.makedirs(base_dir)
+
+        idx_file = transformed_image + ".idx"
+        self.generated_artifacts.add(idx_file)
+        idx_contents = "pillow %s" % (json.dumps(transformations, sort_keys=True))
+
+        if self.__is_thumbnail_up_to_date(transformed_image, idx_file, idx_contents):
+            return transformed_image
+
+        failure_key = [PILLOW_TRANSFORM_FAILURE_KEY, original_image]
+        if self._is_known_failure(original_image, failure_key):
+            return None
+
+        logging.info("Transforming original image %s: %s", original_image, idx_contents)
+        try:
+            with Image.open(original_image) as image:
+                transformed = pillow_transformer.apply_transformations(image, transformations)
+                pillow_transformer.save_image(transformed, transformed_image, image.info)
+        except pillow_transformer.IMAGE_ERRORS as e:
+            logging.warning("Cannot transform %s: %s", original_image, e)
+            self._record_command_result(original_image, failure_key, 1)
+            if os.path.exists(transformed_image):
+                os.unlink(transformed_image)
+            return None
+
+        self._record_command_result(original_image, failure_key, 0)
+        self.transformed_image_cache = (transformed_image, transformed)
 
         pathlib.Path(idx_file).write_text(idx_contents, encoding="UTF-8")
 
         return transformed_image
 
+    def __record_virtual_transform(self, original_image, transformed_image, transformations):
+        # The transformed image path is still used for the links on the site, and is kept if
+        # it was already materialized for the same pipeline. Only the header of the original
+        # is read here, so originals that can't be decoded are caught when the thumbnails are
+        # rendered.
+        try:
+            pillow_transformer.get_save_format(transformed_image)
+            with Image.open(original_image):
+                pass
+        except pillow_transformer.IMAGE_ERRORS as e:
+            logging.warning("Cannot transform %s: %s", original_image, e)
+            return None
+
+        self.generated_artifacts.add(transformed_image)
+
+        base_dir = os.path.dirname(transformed_image)
+        if not os.path.isdir(base_dir):
+            os.makedirs(base_dir)
+
+        pipeline_file = get_pipeline_filename(transformed_image)
+        self.generated_artifacts.add(pipeline_file)
+        pipeline_contents = json.dumps({"original": original_image,
+                                        "transformations": transformations},
+                                       indent=2, sort_keys=True)
+
+        self.virtual_transforms[transformed_image] = (original_image, transformations)
+
+        if os.path.isfile(pipeline_file) and \
+           pathlib.Path(pipeline_file).read_text(encoding="UTF-8") == pipeline_contents:
+            return transformed_image
+
+        logging.info("Recording transformation pipeline for %s", original_image)
+
+        # Remove a previously materialized image since it no longer matches the pipeline.
+        for stale_file in [transformed_image, transformed_image + ".idx"]:
+            if os.path.isfile(stale_file):
+                os.unlink(stale_file)
+
+        pathlib.Path(pipeline_file).write_text(pipeline_contents, encoding="UTF-8")
+
+        return transformed_image
+
+    def __get_virtual_transformed_image(self, transformed_image):
+        # Returns None when the original can't be decoded. The failure is cached so that the
+        # other thumbnails of the media don't try again.
+        if self.transformed_image_cache and self.transformed_image_cache[0] == transformed_image:
+            return self.transformed_image_cache[1]
+
+        (original_image, transformations) = self.virtual_transforms[transformed_image]
+        failure_key = [PILLOW_TRANSFORM_FAILURE_KEY, original_image]
+        transformed = None
+        if not self._is_known_failure(original_image, failure_key):
+            logging.info("Transforming original image %s in memory", original_image)
+            try:
+                with Image.open(original_image) as image:
+                    transformed = pillow_transformer.apply_transformations(image,
+                                                                           transformations)
+                self._record_command_result(original_image, failure_key, 0)
+            except pillow_transformer.IMAGE_ERRORS as e:
+                logging.warning("Cannot transform %s: %s", original_image, e)
+                self._record_command_result(original_image, failure_key, 1)
+
+        self.transformed_image_cache = (transformed_image, transformed)
+        return transformed
+
+    def release_transformed_image(self):
+        # The decoded full-sized image can be tens of MB, so it's only kept while the
+        # thumbnails of its media are created.
+        self.transformed_image_cache = None
+
+    def get_transformed_image_dimensions(self, transformed_image):
+        if transformed_image not in self.virtual_transforms:
+            self.wait_for([transformed_image])
+            with Image.open(transformed_image) as image:
+                return image.size
+
+        # Only the header of the original needs to be read. Straightening keeps the canvas
+        # size and the crop has the final size.
+        (original_image, transformations) = self.virtual_transforms[transformed_image]
+        if "crop.left" in transformations:
+            return (int(transformations["crop.right"]) - int(transformations["crop.left"]),
+                    int(transformations["crop.bottom"]) - int(transformations["crop.top"]))
+
+        with Image.open(original_image) as image:
+            return image.size
+
+    def __create_thumbnail_with_pillow(self, image, rotate, resized_image, overlay_icon,
+                                       thumbnail_type, orig_width, orig_height):
+        quality = pillow_transformer.JPEG_QUALITY
+        if thumbnail_type == ThumbnailType.LARGE:
+            size, mode = (self.thumbnail_size, "fill")
+        elif thumbnail_type == ThumbnailType.SMALL_SQ:
+            size, mode = (self.small_thumbnail_size, "fill")
+        elif thumbnail_type == ThumbnailType.MEDIUM_SQ:
+            size, mode = (self.medium_thumbnail_size, "fill")
+        elif thumbnail_type == ThumbnailType.FULLSCREEN:
+            size, mode = (self.fullscreen_size, "shrink")
+            quality = 90
+        else:
+            new_height = int(self.thumbnail_size.split('x')[1])
+            if not orig_width:
+                (orig_width, orig_height) = image.size
+                if rotate in (90, -90):
+                    (orig_width, orig_height) = (orig_height, orig_width)
+            new_width = self._scale_number(orig_width, orig_height, new_height)
+            size, mode = ("%dx%d" % (new_width, new_height), "exact")
+
+        size = tuple(int(part) for part in size.split("x"))
+        pillow_transformer.create_thumbnail(image, rotate, resized_image, size, mode,
+                                            overlay_icon, quality)
+
+    def __get_video_poster_frame(self, video):
+        if self.video_poster_frame and self.video_poster_frame[0] == video:
+            return self.video_poster_frame[1]
+
+        self.__remove_video_poster_frame()
+
+        failure_key = [POSTER_FRAME_FAILURE_KEY, video]
+        if self._is_known_failure(video, failure_key):
+            return None
+
+        (fd, poster_frame) = tempfile.mkstemp(prefix="poster-", suffix=".png")
+        os.close(fd)
+
+        # Seek on the input to the keyframe at or before POSTER_FRAME_SECS so that ffmpeg
+        # doesn't need to decode the frames leading up to it. This skips over the black or
+        # blurry frames at the start of a lot of clips. Very short clips fall back to the
+        # first frame.
+        returncode = 1
+        try:
+            for seek_args in [["-noaccurate_seek", "-ss", str(POSTER_FRAME_SECS)], []]:
+                cmd = [self.ffmpeg_command, "-y", "-hide_banner", "-loglevel", "warning",
+                       *seek_args, "-i", video, "-frames:v", "1", "-update", "1", poster_frame]
+                returncode = self._do_run_command(cmd, False).returncode
+                if os.path.getsize(poster_frame) > 0:
+                    self.video_poster_frame = (video, poster_frame)
+                    break
+        finally:
+            if not self.video_poster_frame:
+                os.unlink(poster_frame)
+
+        if not self.video_poster_frame:
+            logging.warning("Cannot extract a poster frame from %s", video)
+            self._record_command_result(video, failure_key, returncode or 1)
+            return None
+
+        self._record_command_result(video, failure_key, 0)
+        return poster_frame
+
+    def __remove_video_poster_frame(self):
+        if self.video_poster_frame:
+            # The thumbnails are created from the poster frame in the background.
+            try:
+                self.wait_for(self.video_poster_frame_outputs)
+            finally:
+                self.video_poster_frame_outputs = []
+                if os.path.isfile(self.video_poster_frame[1]):
+                    os.unlink(self.video_poster_frame[1])
+                self.video_poster_frame = None
+
     def __get_imagemagick_transformation_cmd(self, original_image, transformed_image,
                                              transformations):
         if not transformations:
@@ -316,12 +892,13 @@ class Thumbnailer:
 
     def create_thumbnail(self, source_image, is_video, rotate, resized_image, overlay_icon,
                          thumbnail_type, orig_width, orig_height):
-        if not os.path.isfile(source_image):
+        is_virtual = source_image in self.virtual_transforms
+        if not is_virtual and not self._exists_or_pending(source_image):
             logging.warning("Cannot find filename %s", source_image)
             return
 
         self.generated_artifacts.add(resized_image)
-        if os.path.isfile(resized_image):
+        if self._exists_or_pending(resized_image):
             return
 
         base_dir = os.path.dirname(resized_image)
@@ -330,8 +907,26 @@ class Thumbnailer:
 
         logging.info("Generating thumbnail for %s", source_image)
 
+        if is_virtual:
+            image = self.__get_virtual_transformed_image(source_image)
+            if image is not None:
+                self.__create_thumbnail_with_pillow(image, rotate, resized_image, overlay_icon,
+                                                    thumbnail_type, orig_width, orig_height)
+            return
+
+        if not is_video and self.transformed_image_cache and \
+           self.transformed_image_cache[0] == source_image:
+            self.__create_thumbnail_with_pillow(self.transformed_image_cache[1], rotate,
+                                                resized_image, overlay_icon, thumbnail_type,
+                                                orig_width, orig_height)
+            return
+
         if is_video:
-            source_image += "[1]"
+            self.wait_for([source_image])
+            source_image = self.__get_video_poster_frame(source_image)
+            if not source_image:
+                return
+            self.video_poster_frame_outputs.append(resized_image)
 
         if thumbnail_type == ThumbnailType.LARGE:
             tn_size = f'{self.thumbnail_size}^'
@@ -339,6 +934,9 @@ class Thumbnailer:
             tn_size = f'{self.small_thumbnail_size}^'
         elif thumbnail_type == ThumbnailType.MEDIUM_SQ:
             tn_size = f'{self.medium_thumbnail_size}^'
+        elif thumbnail_type == ThumbnailType.FULLSCREEN:
+            # Only shrink images that are larger than the screen size.
+            tn_size = f'{self.fullscreen_size}>'
         elif orig_width:
             # Note that we can pass x:height to have imagemagick automatically scale the image.
             # I'm not doing that since ffmpeg and imagemagick round differently so the
@@ -350,8 +948,14 @@ class Thumbnailer:
         else:
             tn_size = 'x' + (self.thumbnail_size.split('x')[1])
 
-        resize_cmd = [self.imagemagick_command, source_image, "-strip", "-rotate", str(rotate),
-                      "-thumbnail", tn_size]
+        if thumbnail_type == ThumbnailType.FULLSCREEN:
+            # This is shown in the slideshow and photo frame so use the higher quality resize
+            # filter instead of -thumbnail.
+            resize_cmd = [self.imagemagick_command, source_image, "-strip", "-rotate", str(rotate),
+                          "-resize", tn_size, "-quality", "90"]
+        else:
+            resize_cmd = [self.imagemagick_command, source_image, "-strip", "-rotate",
+                          str(rotate), "-thumbnail", tn_size]
 
         if thumbnail_type == ThumbnailType.LARGE:
             resize_cmd += ["-gravity", "center", "-extent", self.thumbnail_size]
@@ -365,7 +969,20 @@ class Thumbnailer:
 
         resize_cmd += [resized_image]
 
-        self._do_run_command(resize_cmd, False)
+        # The video thumbnails are created from a temporary poster frame, so only the poster
+        # frame extraction is recorded in the failure cache for those.
+        self._submit_command(JobClass.PHOTO_RESIZE, resize_cmd, [resized_image], [source_image],
+                             source=None if is_video else source_image)
+
+    def get_motion_photo_offset(self, src_filename, photo_metadata):
+        # Read the XMP packet straight out of the JPEG header. Only fall back to the tags in
+        # the exiv2 text dump for the files that the header scanner can't handle.
+        try:
+            return xmp_motion_photo.scan_motion_photo_offset(src_filename)
+        except (xmp_motion_photo.NotScannable, OSError, ValueError) as err:
+            logging.debug("Cannot scan %s for motion photo XMP: %s", src_filename, err)
+
+        return self._get_motion_photo_offset(photo_metadata)
 
     def _get_motion_photo_offset(self, photo_metadata):
         # Support the two types of Motion Photos from the Pixel phones:
@@ -387,6 +1004,8 @@ class Thumbnailer:
         return None
 
     def _get_video_resolution(self, filename):
+        self.wait_for([filename])
+
         # Check if we have cached metadata for this file
         abs_filename = os.path.abspath(filename)
         file_mtime = os.path.getmtime(filename)
@@ -400,7 +1019,7 @@ class Thumbnailer:
         # Look up the video resolution
         cmd = [self.ffprobe_command, "-v", "error", "-select_streams", "v:0", "-show_entries",
                "stream=width,height", "-of", "csv=s=x:p=0", filename]
-        result = self._do_run_command(cmd, True)
+        result = self._do_run_command(cmd, True, filename)
         if result.returncode != 0:
             logging.error("Error running %s: %s", cmd, result.returncode)
             return None
@@ -416,7 +1035,7 @@ class Thumbnailer:
         # commands.
         cmd = [self.ffprobe_command, "-v", "error", "-select_streams", "v:0", "-show_entries",
                "stream_side_data=rotation", "-of", "csv=s=x:p=0", filename]
-        result = self._do_run_command(cmd, True)
+        result = self._do_run_command(cmd, True, filename)
         if result.returncode != 0:
             logging.error("Error running %s: %s", cmd, result.returncode)
             return None
@@ -445,7 +1064,7 @@ class Thumbnailer:
     def _get_num_video_frames(self, filename):
         cmd = [self.ffprobe_command, "-v", "error", "-select_streams", "v:0", "-count_packets",
                "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", filename]
-        result = self._do_run_command(cmd, True)
+        result = self._do_run_command(cmd, True, filename)
         if result.returncode != 0:
             logging.error("Error running %s: %s", cmd, result.returncode)
             return None
@@ -575,11 +1194,7 @@ class Thumbnailer:
 
         return cmd
 
-    def _extract_motion_photo(self, src_filename, media_id, photo_metadata):
-        offset = self._get_motion_photo_offset(photo_metadata)
-        if not offset:
-            return (None, None)
-
+    def _extract_motion_photo(self, src_filename, media_id, offset):
         (mp4_dest_filename, mp4_short_path) = \
             self.__get_hashed_file_path(os.path.join(self.motion_photo_directory, "original"),
                                         media_id, "mp4")
@@ -595,8 +1210,10 @@ class Thumbnailer:
 
         return (mp4_dest_filename, mp4_short_path)
 
-    def create_animated_gif(self, src_filename, media_id, rotate, photo_metadata, transformations,
-                            orig_img_width, orig_img_height, thumbnail_type):
+    def create_animated_gif(self, src_filename, media_id, rotate, motion_photo_offset,
+                            transformations, orig_img_width, orig_img_height, thumbnail_type):
+        # motion_photo_offset is the value returned by get_motion_photo_offset() for motion
+        # photos, and None for videos.
         if thumbnail_type == ThumbnailType.SMALL_SQ:
             path_part = "small"
         elif thumbnail_type == ThumbnailType.MEDIUM_SQ:
@@ -606,12 +1223,9 @@ class Thumbnailer:
         else:
             path_part = "regular"
 
-        if photo_metadata is not None:
+        if motion_photo_offset is not None:
             (src_filename, mp4_short_path) = self._extract_motion_photo(src_filename, media_id,
-                                                                        photo_metadata)
-            if not mp4_short_path:
-                return None
-
+                                                                        motion_photo_offset)
             mp4_short_path = f"motion_photo/{mp4_short_path}"
         else:
             mp4_short_path = None
@@ -621,9 +1235,11 @@ class Thumbnailer:
                                         media_id, "gif")
         self.generated_artifacts.add(gif_dest_filename)
 
-        if not os.path.exists(gif_dest_filename):
+        if not self._exists_or_pending(gif_dest_filename):
+            # The number of frames is probed from the transformed video.
+            self.wait_for([src_filename])
             cmd = self._get_ffmpeg_animated_gif_cmd(src_filename,
-                                                    photo_metadata is None,
+                                                    motion_photo_offset is None,
                                                     thumbnail_type, rotate, transformations,
                                                     orig_img_width, orig_img_height,
                                                     gif_dest_filename)
@@ -631,7 +1247,8 @@ class Thumbnailer:
                 return None
 
             logging.info("Creating animated GIF for %s", src_filename)
-            self._do_run_command(cmd, False)
+            self._submit_command(JobClass.GIF, cmd, [gif_dest_filename], [src_filename],
+                                 source=src_filename)
 
         return (mp4_short_path, f"motion_photo/{path_part}/{gif_short_path}")
 
@@ -646,28 +1263,74 @@ class Thumbnailer:
 
         return ret
 
-    def write_exif_txt(self, img_filename, media_id):
-        (exif_filename, short_path) = self.__get_hashed_file_path(self.metadata_directory, media_id,
-                                                                  "txt")
-        short_path = f"metadata/{short_path}"
-        self.generated_artifacts.add(exif_filename)
+    def __write_metadata_text(self, media_id, file_ext, raw_output, updated):
+        # The text files are only used for the metadata link on the search page, so they are
+        # only written when the store was updated or the file is missing.
+        if not self.write_metadata_text:
+            return None
+
+        (metadata_filename, short_path) = self.__get_hashed_file_path(self.metadata_directory,
+                                                                      media_id, file_ext)
+        self.generated_artifacts.add(metadata_filename)
+
+        if updated or not os.path.exists(metadata_filename):
+            with open(metadata_filename, "w", encoding="UTF-8") as file:
+                file.write(raw_output)
 
-        if self.skip_metadata_text_if_exists and os.path.exists(exif_filename):
-            with open(exif_filename, "r", encoding="UTF-8") as infile:
-                return (short_path, self._read_exif_txt(infile))
+        return f"metadata/{short_path}"
 
-        cmd = [self.exiv2_command, "-PEXvkyc", img_filename]
+    def __read_existing_metadata_text(self, media_id, file_ext):
+        # Imports the text file from an earlier run into the metadata store instead of running
+        # exiv2 or ffprobe again.
+        if not self.skip_metadata_text_if_exists:
+            return None
+
+        metadata_filename = os.path.join(self.metadata_directory,
+                                         common.get_dir_hash(media_id), f"{media_id}.{file_ext}")
+        if not os.path.exists(metadata_filename):
+            return None
+
+        with open(metadata_filename, "r", encoding="UTF-8") as infile:
+            return infile.read()
+
+    def get_photo_metadata(self, img_filename, media_id):
+        # Returns the path to the optional metadata text file and the exiv2 key/value pairs.
+        # The exiv2 entries have all of the tags, so they are also used with the native reader.
+        sources = ["native", "exiv2"] if self.native_metadata_reader else ["exiv2"]
+        stored = self.metadata_store.get(img_filename, sources)
+        if stored:
+            (exif_metadata, raw_output) = stored
+            return (self.__write_metadata_text(media_id, "txt", raw_output, False), exif_metadata)
+
+        # The text file from an earlier run could be from the other reader when the store has
+        # an entry for the photo.
+        raw_output = None
+        source = "exiv2"
+        if not self.metadata_store.contains(img_filename):
+            raw_output = self.__read_existing_metadata_text(media_id, "txt")
 
-        logging.debug("Executing %s", cmd)
-        ret = subprocess.run(cmd, check=False, capture_output=True)
-        if ret.returncode != 0:
-            logging.warning("Error executing %s: %d", cmd, ret.returncode)
+        if raw_output is None and self.native_metadata_reader:
+            # Only exiv2 knows about all of the formats, so fall back to it for the rest.
+            try:
+                entries = exif_reader.read_metadata_entries(img_filename)
+                raw_output = exif_reader.format_exiv2_text(entries)
+                source = "native"
+            except (xmp_motion_photo.NotScannable, OSError) as err:
+                logging.debug("Using exiv2 for %s: %s", img_filename, err)
 
-        decoded_text = ret.stdout.decode("UTF-8", 'ignore')
-        with open(exif_filename, "w", encoding="UTF-8") as file:
-            file.write(decoded_text)
+        if raw_output is None:
+            cmd = [self.exiv2_command, "-PEXvkyc", img_filename]
 
-        return (short_path, self._read_exif_txt(decoded_text.split('\n')))
+            ret = self._do_run_command(cmd, True, img_filename)
+            if ret.returncode != 0:
+                logging.warning("Error executing %s: %d", cmd, ret.returncode)
+
+            raw_output = ret.stdout.decode("UTF-8", 'ignore')
+
+        exif_metadata = self._read_exif_txt(raw_output.split('\n'))
+        self.metadata_store.put(img_filename, source, exif_metadata, raw_output)
+
+        return (self.__write_metadata_text(media_id, "txt", raw_output, True), exif_metadata)
 
     def __read_video_metadata(self, tags):
         ret = {}
@@ -694,29 +1357,31 @@ class Thumbnailer:
 
         return ret
 
-    def write_video_json(self, video_filename, media_id):
-        (metadata_filename, short_path) = self.__get_hashed_file_path(self.metadata_directory,
-                                                                      media_id, "json")
-        short_path = f"metadata/{short_path}"
-        self.generated_artifacts.add(metadata_filename)
+    def get_video_metadata(self, video_filename, media_id):
+        # Returns the path to the optional ffprobe JSON file and the parsed video metadata.
+        self.wait_for([video_filename])
+        stored = self.metadata_store.get(video_filename, ["ffprobe"])
+        if stored:
+            (tags, raw_output) = stored
+            return (self.__write_metadata_text(media_id, "json", raw_output, False),
+                    self.__read_video_metadata(tags))
 
-        if self.skip_metadata_text_if_exists and os.path.exists(metadata_filename):
-            with open(metadata_filename, "r", encoding="UTF-8") as infile:
-                return (short_path, self.__read_video_metadata(json.load(infile)))
+        raw_output = self.__read_existing_metadata_text(media_id, "json")
+        if raw_output is None:
+            cmd = [self.ffprobe_command, "-v", "quiet", "-print_format", "json", "-show_streams",
+                   "-show_entries", "stream_tags:format_tags", video_filename]
 
-        cmd = [self.ffprobe_command, "-v", "quiet", "-print_format", "json", "-show_streams",
-               "-show_entries", "stream_tags:format_tags", video_filename]
+            ret = self._do_run_command(cmd, True, video_filename)
+            if ret.returncode != 0:
+                logging.warning("Error executing %s: %d", cmd, ret.returncode)
 
-        logging.debug("Executing %s", cmd)
-        ret = subprocess.run(cmd, check=False, capture_output=True)
-        if ret.returncode != 0:
-            logging.warning("Error executing %s: %d", cmd, ret.returncode)
+            raw_output = ret.stdout.decode("UTF-8", 'ignore')
 
-        decoded_text = ret.stdout.decode("UTF-8", 'ignore')
-        with open(metadata_filename, "w", encoding="UTF-8") as file:
-            file.write(decoded_text)
+        tags = json.loads(raw_output) if raw_output.strip() else {}
+        self.metadata_store.put(video_filename, "ffprobe", tags, raw_output)
 
-        return (short_path, self.__read_video_metadata(json.loads(decoded_text)))
+        return (self.__write_metadata_text(media_id, "json", raw_output, True),
+                self.__read_video_metadata(tags))
 
     def __get_hashed_file_path(self, dest_directory, media_id, file_ext):
         dirhash = common.get_dir_hash(media_id)
@@ -728,6 +1393,7 @@ class Thumbnailer:
                 f"{dirhash}/{media_id}.{file_ext}")
 
     def remove_thumbnails(self):
+        self.wait_for_all_jobs()
         common.remove_stale_artifacts(self.dest_thumbs_directory, self.generated_artifacts,
                                       self.remove_stale_artifacts)
         common.remove_stale_artifacts(self.transformed_origs_directory, self.generated_artifacts,
@@ -737,3 +1403,8 @@ class Thumbnailer:
         common.remove_stale_artifacts(self.motion_photo_directory, self.generated_artifacts,
                                       self.remove_stale_artifacts)
         self._save_video_metadata_cache()
+        self._save_placeholder_cache()
+        self._write_failure_report(self._save_failure_cache())
+        self.metadata_store.close()
+        self.generated_artifacts.add(self.metadata_store_file)
+        self.__remove_video_poster_frame()
@@ -16,10 +16,20 @@ class CommonWriter:
         self.years_prior_are_approximate = years_prior_are_approximate
         self.extra_header = extra_header
         self.version_label = version_label
+        self.date_parts_cache = {}
         self.generated_at = datetime.datetime.now(dateutil.tz.tzlocal()) \
             .strftime("%B %-d, %Y %H:%M:%S %Z")
 
     def _get_date_parts(self, timestamp):
+        # The same timestamps are looked up again for the date ranges of the events, years and
+        # tags, so each one is only converted once. The returned dictionary is shared and must
+        # not be changed.
+        if timestamp not in self.date_parts_cache:
+            self.date_parts_cache[timestamp] = self.__convert_date_parts(timestamp)
+
+        return self.date_parts_cache[timestamp]
+
+    def __convert_date_parts(self, timestamp):
         date = datetime.datetime.fromtimestamp(timestamp)
         if self.years_prior_are_approximate and date.year < int(self.years_prior_are_approximate):
             return {"year": str(date.year), "month": None}
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Writes a static HTML page for each event, tag and year at the link in media.json so that
+# shared links show the thumbnails without needing to load the search page and all of the
+# media. The media is split into pages of max_media_per_page items. The full search page is
+# linked from each page.
+
+import html
+import os
+from urllib.parse import quote
+from media_shards import get_media_year
+from media_writer_common import CommonWriter
+from media_writer_structured import remove_stale_files, write_if_changed
+
+STYLE = """
+body { font-family: sans-serif; margin: 1em; background: #fff; color: #202124; }
+@media (prefers-color-scheme: dark) {
+  body { background: #202124; color: #e8eaed; }
+  a { color: #8ab4f8; }
+}
+.media { display: flex; flex-wrap: wrap; gap: 4px; }
+.media img { width: 160px; height: 160px; object-fit: cover; display: block; }
+.entity { display: inline-block; margin: 0 8px 8px 0; text-align: center; width: 160px; }
+.pages a, .pages span { margin-right: 0.5em; }
+"""
+
+def _quote_path(path):
+    return quote(path, safe="/")
+
+def get_page_filename(link, page_number):
+    # Page 1 is at the link and the other pages have the page number added to the name.
+    if page_number == 1:
+        return link
+
+    (base, ext) = os.path.splitext(link)
+    return "%s_%d%s" % (base, page_number, ext)
+
+def get_search_link(field, value):
+    criteria = "%s,equals,%s" % (field, value)
+    return "../index.html?search=%s#" % (quote(criteria, safe=""))
+
+class Html(CommonWriter):
+    def __init__(self, all_media, main_title, max_media_per_page, dest_directory,
+                 years_prior_are_approximate, extra_header, version_label):
+        CommonWriter.__init__(self, all_media, main_title, max_media_per_page,
+                              years_prior_are_approximate, extra_header, version_label)
+        self.dest_directory = dest_directory
+        self.written = set([])
+
+    def write(self, output):
+        media_by_event = {}
+        media_by_tag = {}
+        media_by_year = {}
+        for media in output["media"]:
+            media_by_event.setdefault(media.get("event_id"), []).append(media)
+            for tag_id in media.get("tags", []):
+                media_by_tag.setdefault(tag_id, []).append(media)
+            media_by_year.setdefault(int(get_media_year(media)), []).append(media)
+
+        # The events and media in output are newest first. Events and years are shown oldest
+        # first like the search page does.
+        events_by_year = {}
+        for event in reversed(output["events"]):
+            years = [block["year"] for block in event["years"]] if "years" in event \
+                else [event["min_date"].split("-")[0]]
+            for year in years:
+                events_by_year.setdefault(int(year), []).append(event)
+
+        for event in output["events"]:
+            self.__write_pages(event, event.get("title", "Unnamed %s" % (event["id"])),
+                               get_search_link("Event ID", event["id"]), [],
+                               list(reversed(media_by_event.get(event["id"], []))))
+
+        for tag in output["tags"]:
+            self.__write_pages(tag, tag["title"], get_search_link("Tag ID", tag["id"]), [],
+                               media_by_tag.get(tag["id"], []))
+
+        for year in output["years"]:
+            self.__write_pages(year, "Year %s" % (year["title"]),
+                               get_search_link("Year", year["id"]),
+                               events_by_year.get(int(year["id"]), []),
+                               list(reversed(media_by_year.get(int(year["id"]), []))))
+
+        for directory in ["event", "tag", "year"]:
+            remove_stale_files(os.path.join(self.dest_directory, directory), self.written)
+
+    def __write_pages(self, entity, title, search_link, child_entities, media_list):
+        config = {"entity": entity, "title": title, "search_link": search_link,
+                  "child_entities": child_entities,
+                  "num_pages": max(1, -(-len(media_list) // self.max_media_per_page))}
+
+        if not media_list:
+            self.__media_indexer(config, 1, [])
+        else:
+            self._generate_media_index(media_list, self.__media_indexer, config)
+
+    def __media_indexer(self, config, page_number, media_on_page):
+        entity = config["entity"]
+        filename = os.path.join(self.dest_directory, get_page_filename(entity["link"],
+                                                                       page_number))
+        write_if_changed(filename, self.__render_page(config, page_number, media_on_page))
+        self.written.add(filename)
+
+    def __render_stats(self, entity):
+        parts = []
+        if entity.get("date_range"):
+            parts.append(html.escape(entity["date_range"]))
+        for (field, singular, plural) in [("num_photos", "photo", "photos"),
+                                          ("num_videos", "video", "videos")]:
+            if entity.get(field):
+                parts.append("%d %s" % (entity[field], singular if entity[field] == 1 else plural))
+
+        return " &middot; ".join(parts)
+
+    def __render_pagination(self, entity, page_number, num_pages):
+        if num_pages == 1:
+            return ""
+
+        def page_link(number, label):
+            href = os.path.basename(get_page_filename(entity["link"], number))
+            return '<a href="%s">%s</a>' % (_quote_path(href), label)
+
+        links = []
+        if page_number > 1:
+            links.append(page_link(page_number - 1, "&laquo; Previous"))
+        for number in range(1, num_pages + 1):
+            links.append("<span>%d</span>" % (number) if number == page_number
+                         else page_link(number, str(number)))
+        if page_number < num_pages:
+            links.append(page_link(page_number + 1, "Next &raquo;"))
+
+        return '<nav class="pages">%s</nav>\n' % (" ".join(links))
+
+    def __render_page(self, config, page_number, media_on_page):
+        entity = config["entity"]
+        title = html.escape(config["title"])
+        if config["num_pages"] > 1:
+            title += " (page %d of %d)" % (page_number, config["num_pages"])
+
+        ret = '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n' + \
+              '<meta name="viewport" content="width=device-width, initial-scale=1">\n' + \
+              "<title>%s: %s</title>\n<style>%s</style>\n</head>\n<body>\n" % \
+              (html.escape(self.main_title), title, STYLE)
+        ret += '<p><a href="../index.html">%s</a></p>\n' % (html.escape(self.main_title))
+        ret += "<h1>%s</h1>\n" % (title)
+        ret += "<p>%s</p>\n" % (self.__render_stats(entity))
+        if entity.get("comment"):
+            ret += "<p>%s</p>\n" % (html.escape(entity["comment"]))
+        ret += '<p><a href="%s">Open in the search page</a></p>\n' % \
+               (html.escape(config["search_link"]))
+
+        if page_number == 1 and config["child_entities"]:
+            ret += '<div class="events">\n'
+            for child in config["child_entities"]:
+                ret += '<a class="entity" href="../%s"><img src="../%s" alt="" ' \
+                       'loading="lazy" width="160" height="160"><br>%s</a>\n' % \
+                       (_quote_path(child["link"]), _quote_path(child["thumbnail"]["medium"]),
+                        html.escape(child.get("title", "")))
+            ret += "</div>\n"
+
+        pagination = self.__render_pagination(entity, page_number, config["num_pages"])
+        ret += pagination
+        ret += '<div class="media">\n'
+        for media in media_on_page:
+            descr = media.get("title") or media.get("exposure_time_pretty", "")
+            ret += '<a href="../%s" title="%s"><img src="../%s" alt="%s" loading="lazy">' \
+                   '</a>\n' % (_quote_path(media["link"]),
+                               html.escape(media.get("exposure_time_pretty", "")),
+                               _quote_path(media["thumbnail"]["medium"]), html.escape(descr))
+        ret += "</div>\n"
+        ret += pagination
+        ret += "</body>\n</html>\n"
+
+        return ret
@@ -6,43 +6,168 @@
 
 import csv
 import datetime
-import filecmp
-import io
+import hashlib
 import json
 import logging
 import os
 import tempfile
 import geojson
 import humanize
+import date_facets
+import map_tiles
+import media_columns
+import media_shards
+import precompress
+import text_index
 from media_writer_common import CommonWriter
+from stream_writer import MediaJsonWriter, StreamingFileWriter, get_file_digest
+
+BUILD_INFO_FILENAME = "build-info.json"
 
 def write_if_changed(dest, content):
+    # The new content is compared against the existing file by its size and hash before anything
+    # is written so that unchanged files keep their mtime, and the web server's ETag and
+    # Last-Modified headers, across runs. Returns whether the file was written.
+    if not isinstance(content, bytes):
+        content = content.encode("UTF-8")
+
+    if os.path.exists(dest) and os.path.getsize(dest) == len(content) and \
+       get_file_digest(dest) == hashlib.sha256(content).digest():
+        return False
+
     dest_dir = os.path.dirname(dest)
     os.makedirs(dest_dir, exist_ok=True)
     fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix='.media.', suffix='.tmp')
     try:
-        with os.fdopen(fd, 'w', encoding='UTF-8') as fhandle:
+        with os.fdopen(fd, 'wb') as fhandle:
             fhandle.write(content)
         os.chmod(tmp_path, 0o644)
-        if os.path.exists(dest) and filecmp.cmp(tmp_path, dest, shallow=False):
-            os.unlink(tmp_path)
-        else:
-            logging.info("Writing %s", dest)
-            os.replace(tmp_path, dest)
+        logging.info("Writing %s", dest)
+        os.replace(tmp_path, dest)
     except BaseException:
         if os.path.exists(tmp_path):
             os.unlink(tmp_path)
         raise
 
+    return True
+
+def write_compressed_if_changed(dest, content):
+    write_if_changed(dest, content)
+    precompress.compress_file(dest)
+
+def write_build_info(dest_directory, version_label, generated_at):
+    # The time of the run changes every time, so it goes into its own small file instead of the
+    # media files that would otherwise be rewritten, and downloaded again, after every run.
+    write_if_changed(os.path.join(dest_directory, BUILD_INFO_FILENAME),
+                     json.dumps({"version_label": version_label, "generated_at": generated_at},
+                                indent="\t"))
+
+def write_map_tiles(dest_directory, media_list, remove_stale_artifacts):
+    (index, tiles) = map_tiles.build_map_tiles(media_list)
+
+    written = set([])
+    for key, points in tiles.items():
+        filename = os.path.join(dest_directory, map_tiles.get_tile_filename(key))
+        write_compressed_if_changed(filename,
+                                    map_tiles.get_js_call("registerMapTile", key, points))
+        written.add(filename)
+
+    # The tiles that no longer have any media, or that were split, aren't in the index.
+    remove_stale_files(os.path.join(dest_directory, "map", "tiles"), written,
+                       remove_stale_artifacts)
+
+    write_compressed_if_changed(os.path.join(dest_directory, "map", "index.js"),
+                                map_tiles.get_js_call("registerMapTileIndex", index))
+
+def write_media_shards(dest_directory, output):
+    # Write out the media in embedded Javascript files to work around browser mitigations
+    # for CVE-2019-11730 so that the search page will work for file URIs. Only the years that
+    # changed are rewritten.
+    (index, shards) = media_shards.build_media_shards(output)
+
+    written = set([])
+    for year, media in shards.items():
+        filename = os.path.join(dest_directory, media_shards.get_shard_filename(year))
+        write_compressed_if_changed(filename,
+                                    map_tiles.get_js_call("registerMediaShard", year, media))
+        written.add(filename)
+
+    remove_stale_files(os.path.join(dest_directory, media_shards.SHARD_DIRECTORY), written)
+
+    # The text index refers to the media by its position in the shards.
+    shard_media = [media for shard in index["shards"] for media in shards[shard["year"]]]
+    (index["text_index"], words) = text_index.build_text_index(shard_media,
+                                                                output.get("events", []),
+                                                                output.get("tags", []))
+    written = set([])
+    for prefix, postings in words.items():
+        filename = os.path.join(dest_directory, text_index.get_shard_filename(prefix))
+        write_compressed_if_changed(filename,
+                                    map_tiles.get_js_call("registerTextIndex", prefix, postings))
+        written.add(filename)
+
+    remove_stale_files(os.path.join(dest_directory, text_index.TEXT_INDEX_DIRECTORY), written)
+
+    index["date_facets"] = {"file": date_facets.DATE_FACETS_FILENAME}
+    write_compressed_if_changed(os.path.join(dest_directory, date_facets.DATE_FACETS_FILENAME),
+                                map_tiles.get_js_call("registerDateFacets",
+                                                      date_facets.build_date_facets(shard_media)))
+
+    (index["columns"], contents) = media_columns.build_media_columns(output["media"])
+    write_compressed_if_changed(os.path.join(dest_directory, media_columns.COLUMNS_FILENAME),
+                                contents)
+
+    write_compressed_if_changed(os.path.join(dest_directory, media_shards.MEDIA_INDEX_FILENAME),
+                                map_tiles.get_js_call("registerMediaIndex", index))
+
+    # The single media.js file that was used before the media was split up.
+    old_media_js = os.path.join(dest_directory, "media.js")
+    if os.path.exists(old_media_js):
+        logging.info("Removing %s", old_media_js)
+        os.unlink(old_media_js)
+        precompress.remove_compressed_files(old_media_js)
+
+def remove_stale_files(directory, written, do_remove=True):
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if path in written or precompress.get_source_filename(path) in written:
+                continue
+
+            if do_remove:
+                logging.info("Removing %s", path)
+                os.unlink(path)
+            else:
+                logging.warning("File %s is no longer used.", path)
+
 def write_column(media, colname, _event_names, _tag_names):
     return media[colname] if colname in media else ''
 
+class GeoJsonWriter:
+    # Writes a FeatureCollection one feature at a time in the same format as geojson.dumps().
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.feature_count = 0
+        self.outfile.write('{"type": "FeatureCollection", "features": [')
+
+    def add_feature(self, lat, lon, properties):
+        point = geojson.Point((lon, lat))
+        if self.feature_count:
+            self.outfile.write(", ")
+        self.outfile.write(geojson.dumps(geojson.Feature(geometry=point, properties=properties)))
+        self.feature_count += 1
+
+    def end(self):
+        self.outfile.write("]}")
+
 class Structured(CommonWriter):
     def __init__(self, all_media, main_title, max_media_per_page, dest_directory,
-                 years_prior_are_approximate, extra_header, version_label):
+                 years_prior_are_approximate, extra_header, version_label,
+                 remove_stale_artifacts=False):
         CommonWriter.__init__(self, all_media, main_title, max_media_per_page,
                               years_prior_are_approximate, extra_header, version_label)
         self.dest_directory = dest_directory
+        self.remove_stale_artifacts = remove_stale_artifacts
 
     def write(self):
         shown_media = []
@@ -58,8 +183,11 @@ class Structured(CommonWriter):
             item["thumbnail"]["small"] = "thumbnails/" + event["small_thumbnail_path"]
             item["thumbnail"]["medium"] = "thumbnails/" + event["medium_thumbnail_path"]
             item["thumbnail"]["large"] = "thumbnails/" + event["thumbnail_path"]
+            if event.get("placeholder"):
+                item["thumbnail"]["placeholder"] = event["placeholder"]
 
             item["link"] = "event/%s.html" % (event["id"])
+            item.update(self.__get_sprites(event))
             item.update(self.__get_stats(event["stats"]))
             item.update(self.__add_year_blocks(event))
             shown_events.append(item)
@@ -75,8 +203,7 @@ class Structured(CommonWriter):
         tags = self.__get_tags()
         years = self.__get_years()
         ret = {"title": self.main_title, "version_label": self.version_label,
-               "generated_at": self.generated_at, "media": shown_media,
-               "events": shown_events, "tags": tags, "years": years}
+               "media": shown_media, "events": shown_events, "tags": tags, "years": years}
 
         if self.extra_header:
             ret['extra_header'] = {'description': self.extra_header[0],
@@ -84,9 +211,12 @@ class Structured(CommonWriter):
 
         event_names = {event['id']: event['title'] for event in shown_events}
         tag_names = {tag['id']: tag['title'] for tag in tags}
-        self.__write_json_files(ret)
-        self.__write_csv_files(ret, event_names, tag_names)
-        self.__write_geojson_file(ret, event_names, tag_names)
+        write_build_info(self.dest_directory, self.version_label, self.generated_at)
+        self.__write_media_files(ret, event_names, tag_names)
+        write_media_shards(self.dest_directory, ret)
+        write_map_tiles(self.dest_directory, ret["media"], self.remove_stale_artifacts)
+
+        return ret
 
     def __create_media_element(self, media):
         item = self.__copy_fields(["title", "comment", "event_id", "rating", "filesize",
@@ -121,9 +251,13 @@ class Structured(CommonWriter):
         item["thumbnail"]["small"] = "thumbnails/" + media["small_thumbnail_path"]
         item["thumbnail"]["medium"] = "thumbnails/" + media["medium_thumbnail_path"]
         item["thumbnail"]["large"] = "thumbnails/" + media["thumbnail_path"]
+        if media.get("placeholder"):
+            item["thumbnail"]["placeholder"] = media["placeholder"]
         if "reg_thumbnail_path" in media:
             item["thumbnail"]["reg"] = "thumbnails/" + media["reg_thumbnail_path"]
             item["thumbnail"]["reg_width"] = media["reg_thumbnail_width"]
+        if "fullscreen_path" in media:
+            item["thumbnail"]["fullscreen"] = "thumbnails/" + media["fullscreen_path"]
 
         item["tags"] = []
         for tag_id, _ in self._cleanup_tags(media["tags"]):
@@ -164,6 +298,8 @@ class Structured(CommonWriter):
                                                 event["years"][year]["medium_thumbnail_path"]
             year_block["thumbnail"]["large"] = \
                 "thumbnails/" + event["years"][year]["thumbnail_path"]
+            if event["years"][year].get("placeholder"):
+                year_block["thumbnail"]["placeholder"] = event["years"][year]["placeholder"]
 
             year_block.update(self.__get_stats(event["years"][year]["stats"]))
             ret["years"].append(year_block)
@@ -182,6 +318,8 @@ class Structured(CommonWriter):
             item["thumbnail"]["small"] = "thumbnails/" + tag["small_thumbnail_path"]
             item["thumbnail"]["medium"] = "thumbnails/" + tag["medium_thumbnail_path"]
             item["thumbnail"]["large"] = "thumbnails/" + tag["thumbnail_path"]
+            if tag.get("placeholder"):
+                item["thumbnail"]["placeholder"] = tag["placeholder"]
 
             item["link"] = "tag/%s.html" % (tag["id"])
             item.update(self.__get_stats(tag["stats"]))
@@ -213,8 +351,11 @@ class Structured(CommonWriter):
             item["thumbnail"]["small"] = "thumbnails/%s" % (year_block["small_thumbnail_path"])
             item["thumbnail"]["medium"] = "thumbnails/%s" % (year_block["medium_thumbnail_path"])
             item["thumbnail"]["large"] = "thumbnails/%s" % (year_block["thumbnail_path"])
+            if year_block.get("placeholder"):
+                item["thumbnail"]["placeholder"] = year_block["placeholder"]
 
             item["num_events"] = len(year_block["events"])
+            item.update(self.__get_sprites(year_block))
             item.update(self.__get_stats(year_block["stats"]))
             shown_years.append(item)
 
@@ -269,89 +410,75 @@ class Structured(CommonWriter):
                     lambda media, _colname, _event_names, tag_names:
                         ', '.join(tag_names[tag_id] for tag_id in media['tags']))]
 
-    def __write_csv_files(self, ret, event_names, tag_names):
-        header_row = []
-        for col in self.csv_cols:
-            header_row.append(col[0])
-
+    def __write_media_files(self, ret, event_names, tag_names):
+        # media.json, media.csv and media.geojson are written in a single pass over the media,
+        # and the CSV columns of each media item are only computed once. No part of the
+        # generated site reads these files. They are included for scripting purposes. The rows
+        # of the per directory CSV files are oldest first, so they are kept in memory along with
+        # the media list until the end of the pass.
+        header_row = [col[0] for col in self.csv_cols]
         event_csv_files = {}
 
-        # Build the toplevel CSV file
-        outfile = io.StringIO()
-        csv_writer = csv.writer(outfile)
-        csv_writer.writerow(header_row)
+        with StreamingFileWriter(os.path.join(self.dest_directory, "media.json"),
+                                 compress=True) as json_file, \
+             StreamingFileWriter(os.path.join(self.dest_directory, "media.csv"),
+                                 compress=True) as csv_file, \
+             StreamingFileWriter(os.path.join(self.dest_directory, "media.geojson"),
+                                 compress=True) as geojson_file:
+            json_writer = MediaJsonWriter(json_file, ret)
+            json_writer.begin()
 
-        for media in ret['media']:
-            row = []
-            for col in self.csv_cols:
-                row.append(col[1](media, col[0], event_names, tag_names))
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(header_row)
 
-            csv_writer.writerow(row)
+            geojson_writer = GeoJsonWriter(geojson_file)
 
-            base_dir = os.path.dirname(media["link"])
-            if base_dir.startswith("transformed/"):
-                base_dir = base_dir.replace("transformed/", "original/")
+            for media in ret['media']:
+                json_writer.add_media(media)
 
-            if base_dir not in event_csv_files:
-                event_csv_files[base_dir] = []
+                row = [col[1](media, col[0], event_names, tag_names) for col in self.csv_cols]
+                csv_writer.writerow(row)
 
-            event_csv_files[base_dir].append(row)
+                if 'lat' in media:
+                    geojson_writer.add_feature(media['lat'], media['lon'],
+                                               {name: value
+                                                for (name, value) in zip(header_row, row)
+                                                if name not in ('lat', 'lon') and value != ""})
 
-        write_if_changed(os.path.join(self.dest_directory, "media.csv"), outfile.getvalue())
+                base_dir = os.path.dirname(media["link"])
+                if base_dir.startswith("transformed/"):
+                    base_dir = base_dir.replace("transformed/", "original/")
 
-        # Now write out all of the per event CSV files
-        for base_dir, rows in event_csv_files.items():
-            outfile = io.StringIO()
-            csv_writer = csv.writer(outfile)
-            csv_writer.writerow(header_row)
+                event_csv_files.setdefault(base_dir, []).append(row)
 
-            rows.reverse()
-            for row in rows:
-                csv_writer.writerow(row)
-
-            write_if_changed(os.path.join(self.dest_directory, base_dir, "media.csv"),
-                             outfile.getvalue())
-
-    def __write_geojson_file(self, ret, event_names, tag_names):
-        features = []
+            json_writer.end()
+            geojson_writer.end()
 
-        for media in ret['media']:
-            if 'lat' not in media:
+        # Now write out all of the per event CSV files, oldest media first.
+        for base_dir, rows in event_csv_files.items():
+            with StreamingFileWriter(os.path.join(self.dest_directory, base_dir,
+                                                  "media.csv")) as csv_file:
+                csv_writer = csv.writer(csv_file)
+                csv_writer.writerow(header_row)
+                csv_writer.writerows(reversed(rows))
+
+    def __get_sprites(self, entity):
+        # Sprite sheets with the small and medium thumbnails of all of the media in an event
+        # or year. search.js works out the sheet and position of each media from its place in
+        # media_ids and the grid size instead of listing the position of every tile.
+        ret = {}
+        for size, sprite in entity.get("sprites", {}).items():
+            if not sprite["sheets"]:
                 continue
 
-            row = {}
-            for col in self.csv_cols:
-                if col[0] in ('lat', 'lon'):
-                    continue
-
-                value = col[1](media, col[0], event_names, tag_names)
-                if value != "":
-                    row[col[0]] = value
-
-            point = geojson.Point((media['lon'], media['lat']))
-            features.append(geojson.Feature(geometry=point, properties=row))
-
-        feature_collection = geojson.FeatureCollection(features)
-        with open(os.path.join(self.dest_directory, "media.geojson"), "w",
-                  encoding="UTF-8") as f:
-            geojson.dump(feature_collection, f)
-
-    def __write_json_files(self, ret):
-        # No part of the generated site reads this generated media.json file. Including here
-        # for scripting purposes.
-        with open(os.path.join(self.dest_directory, "media.json"), "w",
-                  encoding="UTF-8") as outfile:
-            outfile.write(json.dumps(ret, indent="\t"))
-
-        # Write out the media in an embedded Javascript file to work around browser mitigations
-        # for CVE-2019-11730 so that the search page will work for file URIs.
-        with open(os.path.join(self.dest_directory, "media.js"), "w", encoding="UTF-8") as outfile:
-            outfile.write("const _allMedia = ")
-            outfile.write(json.dumps(ret, indent=None))
-            outfile.write(";\n")
-            outfile.write("function getAllMediaViaJsFile() {\n")
-            outfile.write("  return _allMedia;\n")
-            outfile.write("}\n")
+            ret[size] = {}
+            ret[size]["sheets"] = [["thumbnails/" + sheet, width, height]
+                                   for sheet, width, height in sprite["sheets"]]
+            (ret[size]["cols"], ret[size]["rows"]) = sprite["grid"]
+            ret[size]["tile"] = list(sprite["tile"])
+            ret[size]["media_ids"] = sprite["media_ids"]
+
+        return {"sprites": ret} if ret else {}
 
     def __get_stats(self, stats):
         ret = self.__copy_fields(["num_photos", "num_videos"], stats)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# SQLite store for the parsed exiv2 and ffprobe metadata so that the per-media text and JSON
+# files don't need to be read back in and parsed on every run. Entries are keyed by the
+# media filename and are only used while the file's mtime and size are unchanged. Each entry
+# also records the source that produced it, such as exiv2 or the native EXIF reader, so that
+# changing the reader doesn't keep serving the entries from the other one.
+
+import json
+import logging
+import os
+import sqlite3
+
+SCHEMA_VERSION = 2
+
+# The new entries are committed every COMMIT_INTERVAL puts so that the metadata that was
+# already extracted isn't lost when a long first run is interrupted.
+COMMIT_INTERVAL = 100
+
+class MetadataStore:
+    def __init__(self, filename):
+        self.filename = filename
+        self.seen = set([])
+        self.uncommitted = 0
+        self.conn = self.__open()
+
+    def __open(self):
+        try:
+            conn = sqlite3.connect(self.filename)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            logging.warning("Recreating metadata store %s: %s", self.filename, e)
+            if os.path.exists(self.filename):
+                os.unlink(self.filename)
+            conn = sqlite3.connect(self.filename)
+            version = 0
+
+        if version != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS media_metadata")
+            conn.execute("CREATE TABLE media_metadata (filename TEXT PRIMARY KEY, " +
+                         "mtime REAL NOT NULL, size INTEGER NOT NULL, source TEXT NOT NULL, " +
+                         "metadata TEXT NOT NULL, raw_output TEXT NOT NULL)")
+            conn.execute("PRAGMA user_version = %d" % (SCHEMA_VERSION))
+            conn.commit()
+
+        return conn
+
+    def __get_fingerprint(self, filename):
+        stat = os.stat(filename)
+        return (stat.st_mtime, stat.st_size)
+
+    def contains(self, filename):
+        return self.conn.execute("SELECT 1 FROM media_metadata WHERE filename = ?",
+                                 (filename,)).fetchone() is not None
+
+    def get(self, filename, sources):
+        # Returns (metadata, raw_output) or None when the file was changed since it was stored,
+        # or when the entry came from a source that isn't in sources.
+        self.seen.add(filename)
+
+        row = self.conn.execute("SELECT mtime, size, source, metadata, raw_output " +
+                                "FROM media_metadata WHERE filename = ?",
+                                (filename,)).fetchone()
+        if not row or (row[0], row[1]) != self.__get_fingerprint(filename) or \
+           row[2] not in sources:
+            return None
+
+        return (json.loads(row[3]), row[4])
+
+    def put(self, filename, source, metadata, raw_output):
+        self.seen.add(filename)
+
+        (mtime, size) = self.__get_fingerprint(filename)
+        self.conn.execute("INSERT OR REPLACE INTO media_metadata " +
+                          "(filename, mtime, size, source, metadata, raw_output) " +
+                          "VALUES (?, ?, ?, ?, ?, ?)",
+                          (filename, mtime, size, source, json.dumps(metadata), raw_output))
+
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_INTERVAL:
+            self.conn.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        # Drop the media that's no longer in the library.
+        stale = [(row[0],) for row in self.conn.execute("SELECT filename FROM media_metadata")
+                 if row[0] not in self.seen]
+        self.conn.executemany("DELETE FROM media_metadata WHERE filename = ?", stale)
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Applies the Shotwell transformations (straighten, crop, levels, exposure/saturation and
+# shadows) in process with Pillow and NumPy. This mirrors the ImageMagick command that
+# Thumbnailer builds so that either engine can be used, and allows the thumbnails to be
+# created from the decoded result without reading the transformed original back in.
+
+import os
+import numpy
+from PIL import Image, ImageOps
+
+JPEG_QUALITY = 92
+
+# The errors that Pillow raises for an original that is corrupt, too large or in a format that
+# it can't read or write.
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+def _to_array(image):
+    return numpy.asarray(image.convert("RGB"), dtype=numpy.float32) / 255.0
+
+def _from_array(data):
+    return Image.fromarray((numpy.clip(data, 0.0, 1.0) * 255.0 + 0.5).astype(numpy.uint8), "RGB")
+
+def get_expansion_levels(transformations):
+    # Has format: { 0, 130 }
+    parts = transformations["adjustments.expansion"].replace(",", "").split(" ")
+    return (float(parts[1]) / 255.0, float(parts[2]) / 255.0)
+
+def get_modulate_multipliers(transformations):
+    # Returns the brightness and saturation multipliers using the same formulas as the
+    # ImageMagick -modulate arguments.
+    brightness = 1.0
+    if "adjustments.exposure" in transformations:
+        brightness = ((float(transformations["adjustments.exposure"]) + 16.0) / 32.0) + 0.5
+
+    saturation = 1.0
+    if "adjustments.saturation" in transformations:
+        saturation = (float(transformations["adjustments.saturation"]) / 16.0) + 1.0
+
+    return (brightness, saturation)
+
+def get_shadows_contrast(transformations):
+    shadows_param = float(transformations.get("adjustments.shadows", 0.0))
+    if shadows_param <= 0.0:
+        return None
+
+    return 3.0 - ((shadows_param / 32.0) * 2.0)
+
+def levels(data, black, white):
+    # Equivalent of ImageMagick's -level black,white
+    if white <= black:
+        return numpy.where(data >= white, 1.0, 0.0).astype(numpy.float32)
+
+    return numpy.clip((data - black) / (white - black), 0.0, 1.0)
+
+def modulate(data, brightness, saturation):
+    # Equivalent of ImageMagick's -modulate in the HSL colorspace. For a fixed hue, each
+    # channel is L + C * (f(hue) - 0.5), where C is the chroma, so the lightness and
+    # saturation can be scaled without converting to and from HSL.
+    cmax = data.max(axis=2, keepdims=True)
+    cmin = data.min(axis=2, keepdims=True)
+    chroma = cmax - cmin
+    lightness = (cmax + cmin) / 2.0
+
+    denom = 1.0 - numpy.abs(2.0 * lightness - 1.0)
+    has_chroma = (chroma > 1e-6) & (denom > 1e-6)
+    sat = numpy.where(has_chroma, chroma / numpy.where(has_chroma, denom, 1.0), 0.0)
+
+    new_lightness = numpy.clip(lightness * brightness, 0.0, 1.0)
+    new_sat = numpy.clip(sat * saturation, 0.0, 1.0)
+    new_chroma = new_sat * (1.0 - numpy.abs(2.0 * new_lightness - 1.0))
+
+    ratio = numpy.where(has_chroma, new_chroma / numpy.where(has_chroma, chroma, 1.0), 0.0)
+    return new_lightness + (data - lightness) * ratio
+
+def sigmoidal_contrast(data, contrast, midpoint):
+    # Equivalent of ImageMagick's -sigmoidal-contrast contrast,midpoint
+    if contrast == 0.0:
+        return data
+
+    def sigmoid(value):
+        return 1.0 / (1.0 + numpy.exp(-value))
+
+    low = sigmoid(-contrast * midpoint)
+    high = sigmoid(contrast * (1.0 - midpoint))
+    return (sigmoid(contrast * (data - midpoint)) - low) / (high - low)
+
+def apply_transformations(image, transformations):
+    # Returns a new image with the transformations applied in the same order as the
+    # ImageMagick command.
+    if "straighten.angle" in transformations:
+        # -distort SRT rotates clockwise around the center and keeps the canvas size.
+        image = image.rotate(-float(transformations["straighten.angle"]),
+                             resample=Image.Resampling.BICUBIC, expand=False)
+
+    if "crop.left" in transformations:
+        image = image.crop((int(transformations["crop.left"]), int(transformations["crop.top"]),
+                            int(transformations["crop.right"]),
+                            int(transformations["crop.bottom"])))
+
+    brightness, saturation = get_modulate_multipliers(transformations)
+    shadows_contrast = get_shadows_contrast(transformations)
+    if "adjustments.expansion" not in transformations and brightness == 1.0 and \
+       saturation == 1.0 and shadows_contrast is None:
+        # The caller may close the source image, so always return a separate image.
+        return image.copy()
+
+    data = _to_array(image)
+
+    if "adjustments.expansion" in transformations:
+        data = levels(data, *get_expansion_levels(transformations))
+
+    if brightness != 1.0 or saturation != 1.0:
+        data = modulate(data, brightness, saturation)
+
+    if shadows_contrast is not None:
+        data = sigmoidal_contrast(data, shadows_contrast, 0.3)
+
+    return _from_array(data)
+
+def _get_metadata_args(source_info):
+    # Keep the EXIF and color profile from the original like ImageMagick does.
+    kwargs = {}
+    if source_info.get("exif"):
+        kwargs["exif"] = source_info["exif"]
+    if source_info.get("icc_profile"):
+        kwargs["icc_profile"] = source_info["icc_profile"]
+    return kwargs
+
+def save_jpeg(image, dest_filename, source_info, quality=JPEG_QUALITY):
+    image.convert("RGB").save(dest_filename, "JPEG", quality=quality,
+                              **_get_metadata_args(source_info))
+
+def get_save_format(filename):
+    # The transformed originals keep the extension of the original, so they are written in the
+    # format of that extension like ImageMagick does. Raises ValueError when Pillow can't write
+    # that format.
+    ext = os.path.splitext(filename)[1].lower()
+    save_format = Image.registered_extensions().get(ext)
+    if save_format is None or save_format not in Image.SAVE:
+        raise ValueError("Cannot write images with the extension '%s'" % (ext))
+    return save_format
+
+def save_image(image, dest_filename, source_info, save_format=None):
+    # save_format is passed when dest_filename is a temporary file without the real extension.
+    if save_format is None:
+        save_format = get_save_format(dest_filename)
+
+    if save_format == "JPEG":
+        save_jpeg(image, dest_filename, source_info)
+    else:
+        image.save(dest_filename, save_format, **_get_metadata_args(source_info))
+
+def _rotate(image, rotate):
+    # ImageMagick's -rotate is clockwise.
+    if rotate == 90:
+        return image.transpose(Image.Transpose.ROTATE_270)
+    if rotate in (-90, 270):
+        return image.transpose(Image.Transpose.ROTATE_90)
+    if rotate == 180:
+        return image.transpose(Image.Transpose.ROTATE_180)
+    return image
+
+def create_thumbnail(image, rotate, dest_filename, size, mode, overlay_icon, quality=JPEG_QUALITY):
+    # mode is one of:
+    #   fill   - scale and center crop to exactly size (-thumbnail WxH^ -extent WxH)
+    #   exact  - scale to exactly size
+    #   shrink - only scale down to fit within size (-resize WxH>)
+    image = _rotate(image, rotate)
+
+    if mode == "fill":
+        image = ImageOps.fit(image, size, method=Image.Resampling.LANCZOS)
+    elif mode == "exact":
+        image = image.resize(size, resample=Image.Resampling.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail(size, resample=Image.Resampling.LANCZOS)
+
+    image = image.convert("RGB")
+    if overlay_icon:
+        with Image.open(overlay_icon) as icon:
+            icon = icon.convert("RGBA")
+            image.paste(icon, (image.width - icon.width, image.height - icon.height), icon)
+
+    image.save(dest_filename, "JPEG", quality=quality)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Writes gzip and brotli compressed copies next to the large generated files so that web
+# servers can serve them as is with nginx's gzip_static / brotli_static instead of compressing
+# them on every request. The brotli copies are only written when the brotli module is
+# installed. The compressed copies get the same mtime as the file they were made from, so they
+# are only compressed again when that file was rewritten.
+
+import gzip
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_EXTENSIONS = [".gz", ".br"]
+
+# Small files don't save enough to be worth the extra request handling.
+MIN_SIZE = 1024
+
+def _compress_gzip(content):
+    # mtime=0 so the output only depends on the content.
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+def _get_compressors():
+    ret = {".gz": _compress_gzip}
+    if brotli is not None:
+        ret[".br"] = brotli.compress
+    return ret
+
+def compress_file(filename):
+    stat = os.stat(filename)
+    compressors = _get_compressors() if stat.st_size >= MIN_SIZE else {}
+
+    content = None
+    for ext in COMPRESSED_EXTENSIONS:
+        compressed_filename = filename + ext
+        if ext not in compressors:
+            # Don't leave behind an out of date copy that the web server would still serve.
+            if os.path.exists(compressed_filename):
+                logging.info("Removing %s", compressed_filename)
+                os.unlink(compressed_filename)
+            continue
+
+        if os.path.exists(compressed_filename) and \
+           os.stat(compressed_filename).st_mtime_ns == stat.st_mtime_ns:
+            continue
+
+        if content is None:
+            with open(filename, "rb") as infile:
+                content = infile.read()
+
+        logging.info("Compressing %s", compressed_filename)
+        tmp_filename = compressed_filename + ".tmp"
+        with open(tmp_filename, "wb") as outfile:
+            outfile.write(compressors[ext](content))
+        os.chmod(tmp_filename, 0o644)
+        os.utime(tmp_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_filename, compressed_filename)
+
+def remove_compressed_files(filename):
+    for ext in COMPRESSED_EXTENSIONS:
+        if os.path.exists(filename + ext):
+            logging.info("Removing %s", filename + ext)
+            os.unlink(filename + ext)
+
+def get_source_filename(filename):
+    # Returns the file that a compressed copy was made from, or None for other files.
+    for ext in COMPRESSED_EXTENSIONS:
+        if filename.endswith(ext):
+            return filename[:-len(ext)]
+    return None
@@ -1,3 +1,3 @@
 #!/usr/bin/env bash
 
-python3 -m unittest test_exiv2_metadata
+python3 -m unittest test_blurhash test_date_facets test_exif_reader test_exiv2_metadata test_job_scheduler test_map_tiles test_materialize_transformed test_media_columns test_media_shards test_media_stats test_media_thumbnailer test_media_writer_html test_metadata_store test_pillow_transformer test_precompress test_stream_writer test_text_index test_xmp_motion_photo
@@ -12,9 +12,13 @@ import shutil
 import sqlite3
 import subprocess
 import sys
+import tempfile
 import media_fetcher
 import media_thumbnailer
+import media_writer_html
 import media_writer_structured
+import precompress
+from job_scheduler import JobScheduler
 
 def _app_icon_by_size(size, purpose):
     return {"src": f"icons/app-icon-{size}-{purpose}.png",
@@ -41,10 +45,25 @@ def write_manifest_json(options):
                      _app_icon_by_size("192x192", "any"),
                      _app_icon_by_size("192x192", "maskable")]
 
-    with open(os.path.join(options.dest_directory, "manifest.json"), "w",
-              encoding="UTF-8") as outfile:
-        outfile.write(json.dumps(vals, indent=2))
-
+    media_writer_structured.write_if_changed(os.path.join(options.dest_directory,
+                                                          "manifest.json"),
+                                             json.dumps(vals, indent=2))
+
+def write_minified_search_js(options):
+    # uglifyjs always writes its output, so it goes to a temporary directory and is only
+    # installed, and compressed again, when the minified code or its source map changed.
+    with tempfile.TemporaryDirectory() as tmpdir:
+        subprocess.run(["uglifyjs", "--compress", "--mangle",
+                        "--source-map", "url='search.min.js.map'",
+                        "-o", os.path.join(tmpdir, "search.min.js"),
+                        __get_assets_path(options, "static/search.js")], check=True)
+        for asset in ["search.min.js", "search.min.js.map"]:
+            with open(os.path.join(tmpdir, asset), "rb") as infile:
+                content = infile.read()
+
+            dest = os.path.join(options.dest_directory, asset)
+            if media_writer_structured.write_if_changed(dest, content):
+                precompress.compress_file(dest)
 
 def process_photos(options):
     conn = sqlite3.connect(options.input_database)
@@ -60,9 +79,13 @@ def process_photos(options):
                                 __get_image_path(options, "motion-photo-small.png"),
                                 __get_image_path(options, "motion-photo-medium.png"))
 
+    scheduler = JobScheduler(options.max_jobs, options.max_load, options.min_free_memory,
+                             options.command_timeout)
+
     thumbnailer = media_thumbnailer.Thumbnailer(options.thumbnail_size,
                                                 options.small_thumbnail_size,
                                                 options.medium_thumbnail_size,
+                                                options.fullscreen_size,
                                                 options.dest_directory,
                                                 options.remove_stale_artifacts,
                                                 options.imagemagick_command,
@@ -72,7 +95,12 @@ def process_photos(options):
                                                 options.skip_metadata_text_if_exists,
                                                 icons.play,
                                                 icons.play_small,
-                                                icons.play_medium)
+                                                icons.play_medium,
+                                                options.transform_engine,
+                                                options.virtual_transformed_originals,
+                                                scheduler,
+                                                not options.skip_metadata_text,
+                                                options.native_metadata_reader)
 
     fetcher = media_fetcher.Database(conn, options.input_media_path, options.dest_directory,
                                      thumbnailer, set(options.tags_to_skip),
@@ -90,24 +118,24 @@ def process_photos(options):
                                                 options.max_media_per_page,
                                                 options.dest_directory,
                                                 options.years_prior_are_approximate,
-                                                extra_header, options.version_label)
-    writer.write()
+                                                extra_header, options.version_label,
+                                                options.remove_stale_artifacts)
+    output = writer.write()
+
+    logging.info("Generating HTML pages")
+    media_writer_html.Html(all_media, options.title, options.max_media_per_page,
+                           options.dest_directory, options.years_prior_are_approximate,
+                           extra_header, options.version_label).write(output)
 
     logging.info("Copying other support files")
-    subprocess.run(["uglifyjs", "--compress", "--mangle",
-                    "--source-map", "url='search.min.js.map'",
-                    "-o", os.path.join(options.dest_directory, "search.min.js"),
-                    __get_assets_path(options, "static/search.js")], check=True)
-    shutil.copyfile(__get_assets_path(options, "static/index.html"),
-                    os.path.join(options.dest_directory, "index.html"))
-    shutil.copyfile(__get_assets_path(options, "static/map.css"),
-                    os.path.join(options.dest_directory, "map.css"))
-    shutil.copyfile(__get_assets_path(options, "static/map.html"),
-                    os.path.join(options.dest_directory, "map.html"))
-    shutil.copyfile(__get_assets_path(options, "static/search.css"),
-                    os.path.join(options.dest_directory, "search.css"))
-    shutil.copyfile(__get_assets_path(options, "static/search.js"),
-                    os.path.join(options.dest_directory, "search.js"))
+    write_minified_search_js(options)
+    # copy2() keeps the mtime of the assets so that the compressed copies are only made again
+    # when an asset changes.
+    for asset in ["index.html", "map.css", "map.html", "search.css", "search.js"]:
+        shutil.copy2(__get_assets_path(options, "static/%s" % (asset)),
+                     os.path.join(options.dest_directory, asset))
+    for asset in ["index.html", "map.css", "map.html", "search.css", "search.js"]:
+        precompress.compress_file(os.path.join(options.dest_directory, asset))
     shutil.copyfile(__get_assets_path(options, "images/close-web-icon.png"),
                     os.path.join(options.dest_directory, "icons/close-web-icon.png"))
     shutil.copyfile(__get_assets_path(options, "images/fullscreen-web-icon.png"),
@@ -119,6 +147,7 @@ def process_photos(options):
     shutil.copyfile(__get_assets_path(options, "images/play-web-icon.png"),
                     os.path.join(options.dest_directory, "icons/play-web-icon.png"))
     thumbnailer.remove_thumbnails()
+    scheduler.shutdown()
     write_manifest_json(options)
 
     media_dir = os.path.join(options.dest_directory, "original")
@@ -130,14 +159,9 @@ def process_photos(options):
     logging.info("Finished")
 
 def write_redirect(filename, redirect_to):
-    base_dir = os.path.dirname(filename)
-    if not os.path.isdir(base_dir):
-        os.makedirs(base_dir)
-
-    with open(filename, "w", encoding="UTF-8") as output:
-        output.write("<html>")
-        output.write("<head><meta http-equiv='refresh' content='0;url=%s'/></head>" % (redirect_to))
-        output.write("</html>")
+    media_writer_structured.write_if_changed(
+        filename,
+        "<html><head><meta http-equiv='refresh' content='0;url=%s'/></head></html>" % (redirect_to))
 
 def __get_image_path(options, name):
     return os.path.join(options.src_assets_directory, "images", name)
@@ -155,6 +179,7 @@ if __name__ == "__main__":
     ARGPARSER.add_argument("--thumbnail-size", default="388x388")
     ARGPARSER.add_argument("--small-thumbnail-size", default="94x94")
     ARGPARSER.add_argument("--medium-thumbnail-size", default="192x192")
+    ARGPARSER.add_argument("--fullscreen-size", default="2560x2560")
     ARGPARSER.add_argument("--years-prior-are-approximate", default="2000")
     ARGPARSER.add_argument("--max-media-per-page", type=int, default=24)
     ARGPARSER.add_argument("--tags-to-skip", nargs="+", default=[])
@@ -165,7 +190,36 @@ if __name__ == "__main__":
     ARGPARSER.add_argument("--ffmpeg-command", default="ffmpeg")
     ARGPARSER.add_argument("--ffprobe-command", default="ffprobe")
     ARGPARSER.add_argument("--exiv2-command", default="exiv2")
-    ARGPARSER.add_argument("--skip-metadata-text-if-exists", action="store_true", default=False)
+    ARGPARSER.add_argument("--transform-engine", choices=["imagemagick", "pillow"],
+                           default="imagemagick")
+    ARGPARSER.add_argument("--virtual-transformed-originals", action="store_true", default=False,
+                           help="Only record the transformation pipeline for edited photos "
+                                "and render the thumbnails from the original. The full-sized "
+                                "transformed images are written by materialize_transformed.py.")
+    ARGPARSER.add_argument("--max-jobs", type=int, default=1,
+                           help="Number of ImageMagick / ffmpeg commands to run at the same "
+                                "time. Composites and animated GIFs use half as many, and "
+                                "video transcodes a quarter.")
+    ARGPARSER.add_argument("--max-load", type=float,
+                           help="Hold back new jobs while the 1 minute load average is above "
+                                "this value. Defaults to the number of CPUs.")
+    ARGPARSER.add_argument("--min-free-memory", type=int, default=1024,
+                           help="Hold back new jobs while less than this many MB of memory "
+                                "is available.")
+    ARGPARSER.add_argument("--command-timeout", type=int,
+                           help="Kill ImageMagick / ffmpeg / exiv2 commands that run longer "
+                                "than this many seconds. The failure is remembered until the "
+                                "media file changes.")
+    ARGPARSER.add_argument("--skip-metadata-text-if-exists", action="store_true", default=False,
+                           help="Import the existing metadata text files into the metadata "
+                                "store instead of running exiv2 / ffprobe again.")
+    ARGPARSER.add_argument("--native-metadata-reader", action="store_true", default=False,
+                           help="Read the EXIF and XMP tags that the site uses directly from "
+                                "JPEG and TIFF files instead of running exiv2 for every photo. "
+                                "The metadata text files then only have those tags.")
+    ARGPARSER.add_argument("--skip-metadata-text", action="store_true", default=False,
+                           help="Only keep the metadata in metadata.sqlite3 and don't write "
+                                "the per-media text files that the Metadata link opens.")
     ARGPARSER.add_argument("--version-label")
     ARGPARSER.add_argument("--extra-header-link",
                            help="Optional extra URL to append to the header")
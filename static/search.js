@@ -38,6 +38,9 @@ class SearchState {
 
   // Search engine
   processedMedia = null;
+  processedShardCount = 0;
+  sprites = null;
+  currentSprites = null;
   mainTitle = null;
   extraHeader = null;
 
@@ -56,8 +59,22 @@ function updateOverallStatusMessage(text) {
   addStatusMessage(document.querySelector('#all_media'), text);
 }
 
+// The search worker doesn't have a window, so the page sends it the query string with each
+// search.
+let workerQueryString = '';
+
+// The worker is started from the same file as the page, which is search.js or search.min.js.
+const SEARCH_SCRIPT_URL = typeof document !== 'undefined' && document.currentScript ?
+  document.currentScript.src : null;
+
+const IN_SEARCH_WORKER = typeof window === 'undefined' && typeof importScripts === 'function';
+
+function getQueryString() {
+  return typeof window === 'undefined' ? workerQueryString : window.location.search;
+}
+
 function getQueryParameter(name, defaultValue) {
-  const urlParams = new URLSearchParams(window.location.search);
+  const urlParams = new URLSearchParams(getQueryString());
   return urlParams.get(name) ?? defaultValue;
 }
 
@@ -74,6 +91,26 @@ function getFloatQueryParameter(name, defaultValue) {
   return isNaN(value) ? defaultValue : value;
 }
 
+// Script tags are used instead of fetch() so that the generated data files can also be
+// loaded when the site is opened with a file URI. The search worker loads the same files with
+// importScripts().
+function loadScript(src) {
+  if (typeof document === 'undefined') {
+    return new Promise((resolve) => {
+      importScripts(src);
+      resolve();
+    });
+  }
+
+  return new Promise((resolve, reject) => {
+    const script = document.createElement('script');
+    script.src = src;
+    script.onload = () => resolve();
+    script.onerror = () => reject(new Error(`Error loading ${src}`));
+    document.head.appendChild(script);
+  });
+}
+
 /*
  * Search criteria are stored in the URL as comma-separated field,op,value strings.
  * Commas and backslashes inside a value are escaped with a backslash so that values
@@ -106,6 +143,100 @@ function splitCriteriaParts(criteria) {
   return parts;
 }
 
+/*
+ * Decodes the blurhash placeholders (https://blurha.sh/) that the site generator stores in
+ * thumbnail.placeholder into a small data: URL that is painted behind each thumbnail while
+ * the real image is downloading. The decoded images are cached since the same media is
+ * redrawn every time the search results change.
+ */
+const BLURHASH_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+const BLURHASH_SIZE = 32;
+const placeholderCache = new Map();
+
+function decodeBase83(str) {
+  let value = 0;
+  for (const ch of str) {
+    value = value * 83 + BLURHASH_CHARS.indexOf(ch);
+  }
+  return value;
+}
+
+function srgbToLinear(value) {
+  const v = value / 255;
+  return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+}
+
+function linearToSrgb(value) {
+  const v = Math.max(0, Math.min(1, value));
+  return v <= 0.0031308 ? Math.round(v * 12.92 * 255) : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+}
+
+function decodeBlurhash(hash, width, height) {
+  const sizeFlag = decodeBase83(hash[0]);
+  const numX = (sizeFlag % 9) + 1;
+  const numY = Math.floor(sizeFlag / 9) + 1;
+  if (hash.length !== 4 + 2 * numX * numY) {
+    return null;
+  }
+
+  const maxValue = (decodeBase83(hash[1]) + 1) / 166;
+  const colors = [];
+  const dc = decodeBase83(hash.substring(2, 6));
+  colors.push([srgbToLinear(dc >> 16), srgbToLinear((dc >> 8) & 255), srgbToLinear(dc & 255)]);
+  for (let i = 1; i < numX * numY; i++) {
+    const ac = decodeBase83(hash.substring(4 + i * 2, 6 + i * 2));
+    colors.push([Math.floor(ac / (19 * 19)), Math.floor(ac / 19) % 19, ac % 19].map((quant) => {
+      const v = (quant - 9) / 9;
+      return Math.sign(v) * v * v * maxValue;
+    }));
+  }
+
+  const pixels = new Uint8ClampedArray(width * height * 4);
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      let r = 0;
+      let g = 0;
+      let b = 0;
+      for (let j = 0; j < numY; j++) {
+        const basisY = Math.cos((Math.PI * y * j) / height);
+        for (let i = 0; i < numX; i++) {
+          const basis = Math.cos((Math.PI * x * i) / width) * basisY;
+          const color = colors[i + j * numX];
+          r += color[0] * basis;
+          g += color[1] * basis;
+          b += color[2] * basis;
+        }
+      }
+
+      const pos = 4 * (x + y * width);
+      pixels[pos] = linearToSrgb(r);
+      pixels[pos + 1] = linearToSrgb(g);
+      pixels[pos + 2] = linearToSrgb(b);
+      pixels[pos + 3] = 255;
+    }
+  }
+  return pixels;
+}
+
+function getPlaceholderUrl(hash) {
+  if (placeholderCache.has(hash)) {
+    return placeholderCache.get(hash);
+  }
+
+  let url = null;
+  const pixels = decodeBlurhash(hash, BLURHASH_SIZE, BLURHASH_SIZE);
+  if (pixels) {
+    const canvas = document.createElement('canvas');
+    canvas.width = BLURHASH_SIZE;
+    canvas.height = BLURHASH_SIZE;
+    canvas.getContext('2d').putImageData(new ImageData(pixels, BLURHASH_SIZE, BLURHASH_SIZE), 0, 0);
+    url = canvas.toDataURL();
+  }
+
+  placeholderCache.set(hash, url);
+  return url;
+}
+
 class SingleIconSizeWriter {
   constructor() {
     this.currentGroupEle = null;
@@ -318,9 +449,18 @@ class CsvWriter {
 class SearchEngine {
   static MEDIA_TYPES = ['photo', 'motion_photo', 'video'];
   static PHOTO_TYPES = ['photo', 'motion_photo'];
+  static DEFAULT_VIEW_MIN_MEDIA = 1000;
+  // The number of results that the search worker sends back in each message.
+  static WORKER_PAGE_SIZE = 10000;
 
   constructor(state) {
     this.state = state;
+    this.searchGeneration = 0;
+    this.worker = null;
+    this.workerStarted = false;
+    this.workerRequestId = 0;
+    this.workerRequests = new Map();
+    this.workerQueue = Promise.resolve();
   }
 
   generateSearchUrl(criterias, matchPolicy, iconSize, groupBy, sortBy) {
@@ -399,7 +539,7 @@ class SearchEngine {
   }
 
   textSearchContainsWord(fieldInfo, op, value, media) {
-    return this.doTextSearch(fieldInfo, op, value, media, (input, searchterm) => {
+    const wordOp = (input, searchterm) => {
       for (const part of input.toLowerCase().split(' ')) {
         if (part === searchterm) {
           return true;
@@ -407,6 +547,28 @@ class SearchEngine {
       }
 
       return false;
+    };
+
+    // The media in the shards is looked up in the text index instead of scanning its text.
+    // The events, tags and years aren't in the index.
+    const indexedFields = media.shard_position === undefined ? [] :
+      TextIndex.getIndexedFields(fieldInfo, op);
+    const wordPositions = indexedFields.length === 0 ? null :
+      TextIndex.getWordPositions(indexedFields, value);
+    if (wordPositions === null) {
+      return this.doTextSearch(fieldInfo, op, value, media, wordOp);
+    }
+
+    // The fields that aren't in the index, such as the filename, are still scanned.
+    return TextIndex.getWords(value).every((word, idx) => {
+      if (wordPositions[idx].has(media.shard_position)) {
+        return true;
+      }
+
+      const otherFields = {
+        searchFields: fieldInfo.searchFields.filter((field) => !indexedFields.includes(field))
+      };
+      return this.doTextSearch(otherFields, op, word, media, wordOp);
     });
   }
 
@@ -427,6 +589,25 @@ class SearchEngine {
     return false;
   }
 
+  // Checks the MM-dd part of the date with the op's monthDayFilter. The media in the shards
+  // is looked up in the date facets when they are loaded instead of parsing its date.
+  matchMonthDay(field, op, values, media) {
+    const positions = media.shard_position === undefined ? null :
+      DateFacets.getPositions(op, values);
+    if (positions !== null) {
+      return positions.has(media.shard_position);
+    }
+
+    const filter = op.monthDayFilter(values);
+    return this.performGenericOp(field, media, null, (input, _value) => {
+      if (input == null) {
+        return false;
+      }
+
+      return filter(input.split('T')[0].split('-').slice(1, 3).join('-'));
+    });
+  }
+
   getCurrentMonthDay() {
     const today = new Date();
     return `${String(today.getMonth() + 1).padStart(2, '0')}-${String(today.getDate()).padStart(2, '0')}`;
@@ -521,94 +702,57 @@ class SearchEngine {
           return this.performGenericOp(field, media, values[0],
             (input, value) => input != null && input.startsWith(value));
         },
+        dayFilter: (values) => (day) => day.startsWith(values[0]) || values[0].startsWith(day),
         placeholder: ['yyyy-MM-dd'],
         inputPattern: ['[0-9]{4}-[0-9]{2}-[0-9]{2}'],
         numValues: 1,
       },
       {
         descr: 'was taken on month/day',
-        matches: (field, op, values, media) => {
-          return this.performGenericOp(field, media, null, (input, _value) => {
-            if (input == null) {
-              return false;
-            }
-
-            const compareTo = input.split('T')[0].split('-').slice(1, 3).join('-');
-            return compareTo === values[0];
-          });
-        },
+        matches: (field, op, values, media) => this.matchMonthDay(field, op, values, media),
+        monthDayFilter: (values) => (monthDay) => monthDay === values[0],
         placeholder: ['MM-dd'],
         inputPattern: ['[0-9]{2}-[0-9]{2}'],
         numValues: 1,
       },
       {
         descr: 'was taken on month',
-        matches: (field, op, values, media) => {
-          return this.performGenericOp(field, media, null, (input, _value) => {
-            if (input == null) {
-              return false;
-            }
-
-            const compareTo = input.split('T')[0].split('-').slice(1, 2).join('-');
-            return compareTo === values[0];
-          });
-        },
+        matches: (field, op, values, media) => this.matchMonthDay(field, op, values, media),
+        monthDayFilter: (values) => (monthDay) => monthDay.split('-')[0] === values[0],
         placeholder: ['MM'],
         inputPattern: ['[0-9]{2}'],
         numValues: 1,
       },
       {
         descr: 'was taken on this day',
-        matches: (field, op, values, media) => {
-          return this.performGenericOp(field, media, null, (input, _value) => {
-            if (input == null) {
-              return false;
-            }
-
-            const compareTo = input.split('T')[0].split('-').slice(1, 3).join('-');
-            return compareTo === this.getCurrentMonthDay();
-          });
+        matches: (field, op, values, media) => this.matchMonthDay(field, op, values, media),
+        monthDayFilter: (_values) => {
+          const today = this.getCurrentMonthDay();
+          return (monthDay) => monthDay === today;
         },
         numValues: 0,
       },
       {
         descr: 'was taken on this week',
-        matches: (field, op, values, media) => {
-          return this.performGenericOp(field, media, null, (input, _value) => {
-            if (input == null) {
-              return false;
-            }
-
-            const firstDate = new Date();
-            firstDate.setDate(firstDate.getDate() - 6);
-            const firstMonth = String(firstDate.getMonth() + 1).padStart(2, '0');
-            const firstDay = String(firstDate.getDate()).padStart(2, '0');
-            const firstMonthDay = `${firstMonth}-${firstDay}`;
-
-            const lastDate = new Date();
-            const lastMonth = String(lastDate.getMonth() + 1).padStart(2, '0');
-            const lastDay = String(lastDate.getDate()).padStart(2, '0');
-            const lastMonthDay = `${lastMonth}-${lastDay}`;
-
-            const compareTo = input.split('T')[0].split('-').slice(1, 3).join('-');
-            return firstMonthDay <= compareTo && compareTo <= lastMonthDay;
-          });
+        matches: (field, op, values, media) => this.matchMonthDay(field, op, values, media),
+        monthDayFilter: (_values) => {
+          const firstDate = new Date();
+          firstDate.setDate(firstDate.getDate() - 6);
+          const firstMonth = String(firstDate.getMonth() + 1).padStart(2, '0');
+          const firstDay = String(firstDate.getDate()).padStart(2, '0');
+          const firstMonthDay = `${firstMonth}-${firstDay}`;
+          const lastMonthDay = this.getCurrentMonthDay();
+
+          return (monthDay) => firstMonthDay <= monthDay && monthDay <= lastMonthDay;
         },
         numValues: 0,
       },
       {
         descr: 'was taken on this month',
-        matches: (field, op, values, media) => {
-          return this.performGenericOp(field, media, null, (input, _value) => {
-            if (input == null) {
-              return false;
-            }
-
-            const today = new Date();
-            const month = String(today.getMonth() + 1).padStart(2, '0');
-
-            return input.split('T')[0].split('-')[1] === month;
-          });
+        matches: (field, op, values, media) => this.matchMonthDay(field, op, values, media),
+        monthDayFilter: (_values) => {
+          const month = String(new Date().getMonth() + 1).padStart(2, '0');
+          return (monthDay) => monthDay.split('-')[0] === month;
         },
         numValues: 0,
       },
@@ -617,6 +761,7 @@ class SearchEngine {
         matches: (field, op, values, media) => {
           return this.performGenericOp(field, media, values[0], (input, value) => input != null && input < value);
         },
+        dayFilter: (values) => (day) => day < values[0],
         placeholder: ['yyyy-MM-dd'],
         inputPattern: ['[0-9]{4}-[0-9]{2}-[0-9]{2}'],
         numValues: 1,
@@ -626,6 +771,7 @@ class SearchEngine {
         matches: (field, op, values, media) => {
           return this.performGenericOp(field, media, values[0], (input, value) => input != null && input > value);
         },
+        dayFilter: (values) => (day) => day >= values[0].substring(0, 10),
         placeholder: ['yyyy-MM-dd'],
         inputPattern: ['[0-9]{4}-[0-9]{2}-[0-9]{2}'],
         numValues: 1,
@@ -640,6 +786,7 @@ class SearchEngine {
           };
           return this.performGenericOp(field, media, values, match);
         },
+        dayFilter: (values) => (day) => day >= values[0] && day <= values[1],
         placeholder: ['yyyy-MM-dd', 'yyyy-MM-dd'],
         inputPattern: ['[0-9]{4}-[0-9]{2}-[0-9]{2}', '[0-9]{4}-[0-9]{2}-[0-9]{2}'],
         numValues: 2,
@@ -1015,7 +1162,7 @@ class SearchEngine {
   ];
 
   getSearchQueryParams() {
-    const urlParams = new URLSearchParams(window.location.search);
+    const urlParams = new URLSearchParams(getQueryString());
     return urlParams.getAll('search');
   }
 
@@ -1135,6 +1282,8 @@ class SearchEngine {
         }
 
         media.title_prefix = mediaType[1];
+        // The search worker sends back the results as positions in the processed media.
+        media.ordinal = ret.length;
         ret.push(media);
       }
     }
@@ -1405,16 +1554,7 @@ class SearchEngine {
     }
 
     if (sortBy === 'random') {
-      // Keep the shuffle seed in the URL so the shuffled view survives reload/back
-      // navigation and shared links reproduce the same order.
-      const params = new URLSearchParams(window.location.search);
-      let seed = parseInt(params.get('seed'), 10);
-      if (Number.isNaN(seed)) {
-        seed = this.state.randomSeed;
-        params.set('seed', seed);
-        window.history.replaceState({}, '', `?${params.toString()}#`);
-      }
-      this.shuffleArray(ret, seed);
+      this.shuffleArray(ret, this.getShuffleSeed());
     } else {
       let sortField;
       let sortValLt;
@@ -1437,80 +1577,811 @@ class SearchEngine {
         sortValGt = -1;
       }
 
-      ret.sort((a, b) => {
-        if (a.groupIndex < b.groupIndex) {
-          return -1;
-        }
-        if (a.groupIndex > b.groupIndex) {
-          return 1;
-        }
+      ret.sort((a, b) => {
+        if (a.groupIndex < b.groupIndex) {
+          return -1;
+        }
+        if (a.groupIndex > b.groupIndex) {
+          return 1;
+        }
+
+        if (sortedTypes[a.type] < sortedTypes[b.type]) {
+          return -1;
+        }
+        if (sortedTypes[a.type] > sortedTypes[b.type]) {
+          return 1;
+        }
+
+        // No secondary sorting for tags
+        if (a.type === 'tags') {
+          return 0;
+        }
+
+        if (a[sortField] < b[sortField]) {
+          return sortValLt;
+        }
+        if (a[sortField] > b[sortField]) {
+          return sortValGt;
+        }
+        return 0;
+      });
+    }
+
+    let newDateRange;
+    if (minDatePretty !== undefined) {
+      minDatePretty = this.shortenPrettyDate(minDatePretty);
+      maxDatePretty = this.shortenPrettyDate(maxDatePretty);
+      if (minDatePretty === maxDatePretty) {
+        newDateRange = minDatePretty;
+      } else {
+        newDateRange = `${minDatePretty} - ${maxDatePretty}`;
+      }
+    }
+
+    return [ret, newDateRange];
+  }
+
+  getShuffleSeed() {
+    // Keep the shuffle seed in the URL so the shuffled view survives reload/back
+    // navigation and shared links reproduce the same order.
+    const params = new URLSearchParams(getQueryString());
+    let seed = parseInt(params.get('seed'), 10);
+    if (Number.isNaN(seed)) {
+      seed = this.state.randomSeed;
+      params.set('seed', seed);
+      window.history.replaceState({}, '', `?${params.toString()}#`);
+    }
+    return seed;
+  }
+
+  // Returns the shards from the media index that can have matches for the criteria, and
+  // whether the remaining shards can be appended to the results once they are loaded.
+  getNeededShards(allCriteria, canAppend) {
+    const shards = MediaShards.index.shards;
+
+    const isDefaultView = allCriteria.length === 1 && allCriteria[0].field.title === null;
+    if (isDefaultView) {
+      // The default view shows the newest media first so only the most recent shards are
+      // needed to show the first pages. The older shards sort after them.
+      if (!canAppend || getQueryParameter('view', null) !== null ||
+          !['default', 'takenZA'].includes(getQueryParameter('sort', 'default')) ||
+          getQueryParameter('group', 'none') !== 'none') {
+        return [shards, false];
+      }
+
+      const ret = [];
+      let numMedia = 0;
+      for (const shard of shards) {
+        ret.push(shard);
+        numMedia += shard.count;
+        if (numMedia >= SearchEngine.DEFAULT_VIEW_MIN_MEDIA) {
+          break;
+        }
+      }
+      return [ret, ret.length < shards.length];
+    }
+
+    if (getQueryParameter('match', 'all') !== 'all') {
+      return [shards, false];
+    }
+
+    let years = null;
+    if (MediaShards.columns && allCriteria.some((criteria) => MediaColumns.canCheck(criteria))) {
+      years = MediaShards.columns.getMatchingYears(allCriteria);
+    }
+
+    for (const criteria of allCriteria) {
+      let criteriaYears = null;
+      if (criteria.field.title === 'Year' && criteria.op.descr === 'equals') {
+        criteriaYears = [parseInt(criteria.searchValues[0], 10)];
+      } else if (criteria.field.title === 'Date' && criteria.op.descr === 'was taken on date') {
+        criteriaYears = [parseInt(criteria.searchValues[0].split('-')[0], 10)];
+      } else if (criteria.field.title === 'Event ID' && criteria.op.descr === 'equals') {
+        criteriaYears = [];
+        const evt = MediaShards.index.events.find((ent) => String(ent.id) === criteria.searchValues[0]);
+        if (evt) {
+          const maxYear = parseInt(evt.max_date.split('-')[0], 10);
+          for (let year = parseInt(evt.min_date.split('-')[0], 10); year <= maxYear; year++) {
+            criteriaYears.push(year);
+          }
+        }
+      } else if (DateFacets.canCheck(criteria)) {
+        criteriaYears = DateFacets.getMatchingYears(criteria);
+      } else {
+        criteriaYears = TextIndex.getMatchingYears(criteria);
+      }
+
+      if (criteriaYears !== null) {
+        years = years === null ? new Set(criteriaYears) :
+          new Set(criteriaYears.filter((year) => years.has(year)));
+      }
+    }
+
+    if (years === null) {
+      return [shards, false];
+    }
+
+    return [shards.filter((shard) => years.has(parseInt(shard.year, 10))), false];
+  }
+
+  processMediaIndex() {
+    if (this.state.events !== null) {
+      return;
+    }
+
+    const resp = MediaShards.index;
+    this.state.events = {};
+    for (const evt of resp.events) {
+      this.state.events[evt.id] = {
+        id: evt.id,
+        title: 'title' in evt ? evt.title : `Unnamed ${evt.id}`,
+        comment: evt.comment ?? ''
+      };
+    }
+
+    this.state.tags = {};
+    for (const tag of resp.tags) {
+      this.state.tags[tag.id] = tag;
+    }
+
+    this.state.sprites = { events: {}, years: {} };
+    for (const evt of resp.events) {
+      if (evt.sprites) {
+        this.state.sprites.events[evt.id] = evt.sprites;
+      }
+    }
+    for (const year of resp.years) {
+      if (year.sprites) {
+        this.state.sprites.years[year.id] = year.sprites;
+      }
+    }
+
+    this.state.extraHeader = resp.extra_header;
+    this.state.mainTitle = resp.title;
+  }
+
+  updateProcessedMedia() {
+    // The media is processed again when more shards were loaded since the last search.
+    if (this.state.processedMedia !== null &&
+        this.state.processedShardCount === MediaShards.shards.size) {
+      return;
+    }
+
+    const index = MediaShards.index;
+    let media = [];
+    for (const shard of index.shards) {
+      if (MediaShards.shards.has(shard.year)) {
+        media = media.concat(MediaShards.shards.get(shard.year));
+      }
+    }
+
+    this.state.processedMedia = this.doUpdateItems({
+      media: media, events: index.events, tags: index.tags, years: index.years
+    });
+    this.state.processedShardCount = MediaShards.shards.size;
+  }
+
+  // The search runs in a web worker, which is started from the same script as the page, so
+  // that matching and sorting all of the media doesn't block the page. Workers can't be
+  // started from file URIs, so the search runs on the page there.
+  getWorker() {
+    if (this.workerStarted) {
+      return this.worker;
+    }
+
+    this.workerStarted = true;
+    if (SEARCH_SCRIPT_URL === null || typeof Worker === 'undefined' ||
+        window.location.protocol === 'file:') {
+      return null;
+    }
+
+    try {
+      this.worker = new Worker(SEARCH_SCRIPT_URL);
+    } catch (error) {
+      console.error(error);
+      return null;
+    }
+
+    this.worker.onmessage = (event) => this.workerMessageReceived(event.data);
+    this.worker.onerror = (event) => {
+      // The searches that were sent to the worker are run again on the page.
+      console.error(event.message);
+      this.worker.terminate();
+      this.worker = null;
+      for (const request of this.workerRequests.values()) {
+        request.reject(new Error(event.message));
+      }
+      this.workerRequests.clear();
+    };
+    return this.worker;
+  }
+
+  workerMessageReceived(response) {
+    const request = this.workerRequests.get(response.id);
+    if (request === undefined) {
+      return;
+    }
+
+    if (response.error) {
+      this.workerRequests.delete(response.id);
+      request.reject(new Error(response.error));
+      return;
+    }
+
+    for (const ordinal of response.ordinals) {
+      request.results.push(request.processedMedia[ordinal]);
+    }
+
+    if (response.done) {
+      this.workerRequests.delete(response.id);
+      request.resolve([request.results, response.dateRange]);
+    }
+  }
+
+  // Resolves to the same results and date range as performSearch(). The worker has its own
+  // copy of the searchable fields of the loaded shards, and sends back the positions of the
+  // results in processedMedia a page at a time.
+  runSearch(allCriteria, defaultSort) {
+    this.updateProcessedMedia();
+    const processedMedia = this.state.processedMedia;
+    const worker = this.getWorker();
+    if (worker === null) {
+      return Promise.resolve(this.performSearch(processedMedia, allCriteria, defaultSort));
+    }
+
+    if (getQueryParameter('sort', 'default') === 'random') {
+      // The worker can't update the URL, so the seed is added before the search is sent.
+      this.getShuffleSeed();
+    }
+
+    this.workerRequestId += 1;
+    const id = this.workerRequestId;
+    return new Promise((resolve, reject) => {
+      this.workerRequests.set(id, { resolve, reject, processedMedia, results: [] });
+      worker.postMessage({
+        id: id,
+        queryString: window.location.search,
+        defaultSort: defaultSort,
+        years: Array.from(MediaShards.shards.keys()),
+      });
+    }).then(([results, dateRange]) => {
+      // The group names are shown on the page, so they are set on the page's copy of the media.
+      this.groupAllMedia(results);
+      return [results, dateRange];
+    }, (error) => {
+      console.error(error);
+      return this.performSearch(processedMedia, allCriteria, defaultSort);
+    });
+  }
+
+  // Runs a search from the page in the worker. The searches run one at a time since the query
+  // string is shared.
+  workerSearch(request) {
+    this.workerQueue = this.workerQueue.then(() => {
+      workerQueryString = request.queryString;
+      const allCriteria = this.getSearchCriteria();
+
+      return MediaShards.loadIndex().then(() => {
+        this.processMediaIndex();
+        return Promise.all([TextIndex.load(allCriteria), DateFacets.load(allCriteria)]);
+      }).then(() => {
+        // The same shards as the page are loaded so that the positions in processedMedia match.
+        const years = new Set(request.years);
+        return MediaShards.loadShards(
+          MediaShards.index.shards.filter((shard) => years.has(shard.year)));
+      }).then(() => {
+        this.updateProcessedMedia();
+        const [results, dateRange] =
+          this.performSearch(this.state.processedMedia, allCriteria, request.defaultSort);
+
+        // The last page is sent even when there are no results since it has the date range.
+        let start = 0;
+        do {
+          const end = start + SearchEngine.WORKER_PAGE_SIZE;
+          const ordinals = Int32Array.from(results.slice(start, end), (media) => media.ordinal);
+          const done = end >= results.length;
+          postMessage({
+            id: request.id, ordinals: ordinals, done: done, dateRange: done ? dateRange : null
+          }, [ordinals.buffer]);
+          start = end;
+        } while (start < results.length);
+      });
+    }).catch((error) => {
+      postMessage({ id: request.id, error: String(error) });
+    });
+  }
+
+  appendRemainingShards(results, allCriteria, preferredView, generation, appendFunc) {
+    MediaShards.loadShards(MediaShards.index.shards).then(() => {
+      if (generation !== this.searchGeneration) {
+        return null;
+      }
+
+      return this.runSearch(allCriteria, preferredView.defaultSort).then((searchResults) => {
+        if (generation !== this.searchGeneration) {
+          return;
+        }
+
+        for (const media of searchResults[0].slice(results.length)) {
+          results.push(media);
+        }
+        appendFunc(results, searchResults[1]);
+      });
+    }).catch((error) => console.error(error));
+  }
+
+  processJson(readyFunc, errorFunc = null, appendFunc = null) {
+    // Only the results for the most recent search are shown when the shards are loaded out
+    // of order.
+    this.searchGeneration += 1;
+    const generation = this.searchGeneration;
+    const allCriteria = this.getSearchCriteria();
+    let partial = false;
+
+    MediaShards.loadIndex().then(() => {
+      this.processMediaIndex();
+
+      // The columns are only needed to narrow down the shards for the criteria that can be
+      // checked against them.
+      if (getQueryParameter('match', 'all') === 'all' &&
+          allCriteria.some((criteria) => MediaColumns.canCheck(criteria))) {
+        return MediaColumns.load(MediaShards.index.columns).then((columns) => {
+          MediaShards.columns = columns;
+        });
+      }
+      return null;
+    }).then(() => {
+      // The text index and date facet files that the criteria can use.
+      return Promise.all([TextIndex.load(allCriteria), DateFacets.load(allCriteria)]);
+    }).then(() => {
+      let shards;
+      [shards, partial] = this.getNeededShards(allCriteria, appendFunc !== null);
+      return MediaShards.loadShards(shards);
+    }).then(() => {
+      if (generation !== this.searchGeneration) {
+        return null;
+      }
+
+      const preferredView = this.getPreferredView(allCriteria, this.state.mainTitle);
+      return this.runSearch(allCriteria, preferredView.defaultSort).then((searchResults) => {
+        if (generation !== this.searchGeneration) {
+          return;
+        }
+
+        readyFunc(searchResults[0], this.state.extraHeader, searchResults[1], preferredView);
+
+        if (partial) {
+          this.appendRemainingShards(searchResults[0], allCriteria, preferredView, generation,
+            appendFunc);
+        }
+      });
+    }).catch((error) => {
+      console.error(error);
+      if (errorFunc) {
+        errorFunc(error);
+      }
+    });
+  }
+}
+
+// The media is split into media-index.js, with the events, tags and years, and one
+// media-years/YYYY.js file per year. The files are loaded with script tags so that the site
+// works with file URIs. See CVE-2019-11730.
+class MediaShards {
+  // The search worker only keeps the fields of the media that the searches, sorting and
+  // grouping use so that it doesn't hold a second full copy of the shards. The fields that
+  // doUpdateItems() derives from these, such as the tag names, are added back there.
+  static WORKER_FIELDS = ['camera', 'clip_duration_secs', 'comment', 'event_id',
+    'exposure_time', 'exposure_time_pretty', 'filesize', 'fps', 'height', 'lat', 'link', 'lon',
+    'megapixels', 'rating', 'tags', 'time_created', 'title', 'type', 'width'];
+
+  static index = null;
+  static columns = null;
+  static shards = new Map();
+  static pending = new Map();
+
+  static loadFile(src) {
+    if (!MediaShards.pending.has(src)) {
+      MediaShards.pending.set(src, loadScript(src).catch((error) => {
+        MediaShards.pending.delete(src);
+        throw error;
+      }));
+    }
+
+    return MediaShards.pending.get(src);
+  }
+
+  static loadIndex() {
+    return MediaShards.loadFile('media-index.js');
+  }
+
+  static loadShards(shards) {
+    return Promise.all(shards.map((shard) => MediaShards.loadFile(shard.file)));
+  }
+
+  // Returns the years of the shards that have the media at the positions in the concatenated
+  // shards.
+  static getYearsForPositions(positions) {
+    const ret = new Set();
+    for (const position of positions) {
+      let start = 0;
+      for (const shard of MediaShards.index.shards) {
+        if (position < start + shard.count) {
+          ret.add(parseInt(shard.year, 10));
+          break;
+        }
+        start += shard.count;
+      }
+    }
+
+    return Array.from(ret);
+  }
+
+  // Rebuilds the artifact paths that the generator dropped from the shards. Each bit that is
+  // set in media.paths refers to an entry in the path templates in the index.
+  static expandPaths(media) {
+    if (!media.paths) {
+      return;
+    }
+
+    MediaShards.index.path_templates.forEach(([field, template], bit) => {
+      if (!(media.paths & (1 << bit))) {
+        return;
+      }
+
+      const value = template.replaceAll('{dir_hash}', media.dir_hash)
+        .replaceAll('{media_id}', media.media_id);
+      const parts = field.split('.');
+      if (parts.length === 1) {
+        media[parts[0]] = value;
+      } else {
+        media[parts[0]] ??= {};
+        media[parts[0]][parts[1]] = value;
+      }
+    });
+
+    delete media.paths;
+    delete media.dir_hash;
+  }
+}
+
+// Typed array columns of the numeric fields of all of the media, in the same order as the
+// shards. They are used to find the years that have media that match the search criteria
+// without loading the shards. fetch() doesn't work for file URIs so they are skipped there.
+class MediaColumns {
+  static TYPED_ARRAYS = {
+    int8: Int8Array, int32: Int32Array, uint32: Uint32Array, float64: Float64Array
+  };
+
+  static NUMERIC_FIELDS = ['rating', 'width', 'height', 'filesize', 'megapixels', 'fps',
+    'clip_duration_secs', 'lat', 'lon', 'event_id'];
+
+  // The search fields that can be checked against the columns. Media never has the totals or
+  // the parent tag, so they are always missing.
+  static FIELDS = MediaColumns.NUMERIC_FIELDS.concat(['year', 'camera', 'type', 'tag_id',
+    'photo_ratio', 'num_photos', 'num_videos', 'parent_tag_id']);
+
+  static pending = null;
+
+  constructor(header, buffer) {
+    this.header = header;
+    this.columns = {};
+    for (const [name, column] of Object.entries(header.columns)) {
+      this.columns[name] =
+        new MediaColumns.TYPED_ARRAYS[column.type](buffer, column.offset, column.length);
+    }
+  }
+
+  static load(header) {
+    if (MediaColumns.pending === null) {
+      if (!header || window.location.protocol === 'file:') {
+        MediaColumns.pending = Promise.resolve(null);
+      } else {
+        MediaColumns.pending = fetch(header.file)
+          .then((resp) => {
+            if (!resp.ok) {
+              throw new Error(`Error loading ${header.file}: ${resp.status}`);
+            }
+            return resp.arrayBuffer();
+          })
+          .then((buffer) => new MediaColumns(header, buffer))
+          .catch((error) => {
+            console.error(error);
+            return null;
+          });
+      }
+    }
+
+    return MediaColumns.pending;
+  }
+
+  static canCheck(criteria) {
+    return criteria.field.searchFields.every((field) => MediaColumns.FIELDS.includes(field));
+  }
+
+  setValue(rowView, name, value, missing) {
+    if (missing === null ? Number.isNaN(value) : value === missing) {
+      delete rowView[name];
+    } else {
+      rowView[name] = value;
+    }
+  }
+
+  // Fills in the fields of the media at the row the same way that doUpdateItems() does for the
+  // full media.
+  fillRow(rowView, row, fields) {
+    for (const name of MediaColumns.NUMERIC_FIELDS) {
+      this.setValue(rowView, name, this.columns[name][row], this.header.columns[name].missing);
+    }
+
+    rowView.year = [String(this.columns.year[row])];
+    for (const name of ['camera', 'type']) {
+      const idx = this.columns[name][row];
+      this.setValue(rowView, name, idx === -1 ? null : this.header.strings[name][idx], null);
+    }
+
+    if ('width' in rowView) {
+      rowView.photo_ratio = rowView.width / rowView.height;
+    } else {
+      delete rowView.photo_ratio;
+    }
+
+    if (fields.has('tag_id')) {
+      rowView.tag_id = Array.from(this.columns.tag_ids.subarray(this.columns.tag_offsets[row],
+        this.columns.tag_offsets[row + 1]));
+    }
+  }
+
+  // Returns the years that have media that matches all of the criteria that can be checked
+  // against the columns.
+  getMatchingYears(allCriteria) {
+    const criteriaToCheck = allCriteria.filter((criteria) => MediaColumns.canCheck(criteria));
+    const fields = new Set(criteriaToCheck.flatMap((criteria) => criteria.field.searchFields));
+    const years = new Set();
+    const rowView = {};
+    for (let row = 0; row < this.header.count; row++) {
+      if (years.has(this.columns.year[row])) {
+        continue;
+      }
+
+      this.fillRow(rowView, row, fields);
+      if (criteriaToCheck.every((criteria) =>
+        criteria.op.matches(criteria.field, criteria.op, criteria.searchValues, rowView))) {
+        years.add(this.columns.year[row]);
+      }
+    }
+
+    return years;
+  }
+}
+
+// The inverted index of the words in the text fields of the media. Each word maps to the
+// delta encoded positions of the media in the concatenated shards for each field. There is one
+// file per word prefix so only the files for the words in the search are loaded.
+class TextIndex {
+  static WORD_OPS = ['contains word', 'missing word'];
+
+  static prefixes = new Map();
+  static cache = new Map();
+
+  static getIndexedFields(field, op) {
+    const header = MediaShards.index.text_index;
+    if (!header || !TextIndex.WORD_OPS.includes(op.descr)) {
+      return [];
+    }
+
+    return field.searchFields.filter((name) => header.fields.includes(name));
+  }
+
+  // Splits the text the same way as textSearchContainsWord().
+  static getWords(value) {
+    return value.toLowerCase().split(' ');
+  }
+
+  static getPrefix(word) {
+    // Array.from() splits by code point to match the Python slice.
+    return Array.from(word).slice(0, MediaShards.index.text_index.prefix_length).join('');
+  }
+
+  static load(allCriteria) {
+    const files = new Set();
+    for (const criteria of allCriteria) {
+      if (TextIndex.getIndexedFields(criteria.field, criteria.op).length === 0) {
+        continue;
+      }
+
+      for (const word of TextIndex.getWords(criteria.searchValues[0])) {
+        const prefix = TextIndex.getPrefix(word);
+        if (Object.hasOwn(MediaShards.index.text_index.files, prefix)) {
+          files.add(MediaShards.index.text_index.files[prefix]);
+        }
+      }
+    }
+
+    // The text of the media is scanned when a file can't be loaded.
+    return Promise.all(Array.from(files).map((file) =>
+      MediaShards.loadFile(file).catch((error) => console.error(error))));
+  }
+
+  // Returns the positions of the media that have the word in any of the fields, or null when
+  // the file for the word isn't loaded.
+  static getPositions(word, fields) {
+    const prefix = TextIndex.getPrefix(word);
+    const ret = new Set();
+    if (!Object.hasOwn(MediaShards.index.text_index.files, prefix)) {
+      return ret;
+    }
+    if (!TextIndex.prefixes.has(prefix)) {
+      return null;
+    }
+
+    const words = TextIndex.prefixes.get(prefix);
+    if (!Object.hasOwn(words, word)) {
+      return ret;
+    }
+
+    for (const field of fields) {
+      let position = 0;
+      for (const delta of words[word][field] ?? []) {
+        position += delta;
+        ret.add(position);
+      }
+    }
+
+    return ret;
+  }
+
+  // Returns a set of media positions for each word in the value, or null when the index can't
+  // be used for the value.
+  static getWordPositions(fields, value) {
+    const key = `${fields.join(',')}:${value}`;
+    if (TextIndex.cache.has(key)) {
+      return TextIndex.cache.get(key);
+    }
+
+    const ret = [];
+    for (const word of TextIndex.getWords(value)) {
+      const positions = word === '' ? null : TextIndex.getPositions(word, fields);
+      if (positions === null) {
+        return null;
+      }
+      ret.push(positions);
+    }
+
+    TextIndex.cache.set(key, ret);
+    return ret;
+  }
+
+  // Returns the years of the media that have all of the words, or null when the index can't
+  // answer the criteria by itself.
+  static getMatchingYears(criteria) {
+    const fields = TextIndex.getIndexedFields(criteria.field, criteria.op);
+    if (criteria.op.descr !== 'contains word' ||
+        fields.length !== criteria.field.searchFields.length) {
+      return null;
+    }
 
-        if (sortedTypes[a.type] < sortedTypes[b.type]) {
-          return -1;
-        }
-        if (sortedTypes[a.type] > sortedTypes[b.type]) {
-          return 1;
-        }
+    const wordPositions = TextIndex.getWordPositions(fields, criteria.searchValues[0]);
+    if (wordPositions === null) {
+      return null;
+    }
 
-        // No secondary sorting for tags
-        if (a.type === 'tags') {
-          return 0;
-        }
+    const [smallest, ...others] = wordPositions.slice().sort((a, b) => a.size - b.size);
+    return MediaShards.getYearsForPositions(Array.from(smallest).filter((position) =>
+      others.every((positions) => positions.has(position))));
+  }
+}
 
-        if (a[sortField] < b[sortField]) {
-          return sortValLt;
-        }
-        if (a[sortField] > b[sortField]) {
-          return sortValGt;
-        }
-        return 0;
-      });
+// The dates of the media that the date searches use instead of parsing the exposure time of
+// every media item. month_days maps each MM-dd to the delta encoded positions of the media in
+// the concatenated shards, and days has the number of media per yyyy-MM-dd.
+class DateFacets {
+  static facets = null;
+  static cache = new Map();
+
+  static canCheck(criteria) {
+    return criteria.field.searchFields.length === 1 &&
+      criteria.field.searchFields[0] === 'exposure_time' &&
+      (criteria.op.monthDayFilter !== undefined || criteria.op.dayFilter !== undefined);
+  }
+
+  static load(allCriteria) {
+    const header = MediaShards.index.date_facets;
+    if (!header || !allCriteria.some((criteria) => DateFacets.canCheck(criteria))) {
+      return Promise.resolve();
     }
 
-    let newDateRange;
-    if (minDatePretty !== undefined) {
-      minDatePretty = this.shortenPrettyDate(minDatePretty);
-      maxDatePretty = this.shortenPrettyDate(maxDatePretty);
-      if (minDatePretty === maxDatePretty) {
-        newDateRange = minDatePretty;
-      } else {
-        newDateRange = `${minDatePretty} - ${maxDatePretty}`;
+    // The dates of the media are parsed when the file can't be loaded.
+    return MediaShards.loadFile(header.file).catch((error) => console.error(error));
+  }
+
+  // Returns the positions of the media with a MM-dd that passes the op's monthDayFilter, or
+  // null when the facets aren't loaded.
+  static getPositions(op, values) {
+    if (DateFacets.facets === null) {
+      return null;
+    }
+
+    // The filters for the current day, week and month depend on today's date.
+    const key = `${op.descr}:${values.join(',')}:${new Date().toDateString()}`;
+    if (!DateFacets.cache.has(key)) {
+      const filter = op.monthDayFilter(values);
+      const ret = new Set();
+      for (const [monthDay, deltas] of Object.entries(DateFacets.facets.month_days)) {
+        if (!filter(monthDay)) {
+          continue;
+        }
+
+        let position = 0;
+        for (const delta of deltas) {
+          position += delta;
+          ret.add(position);
+        }
       }
+      DateFacets.cache.set(key, ret);
     }
 
-    return [ret, newDateRange];
+    return DateFacets.cache.get(key);
   }
 
-  processJson(readyFunc) {
-    if (this.state.processedMedia == null) {
-      // getAllMediaViaJsFile() is defined in the media.json file.
-      // eslint-disable-next-line no-undef
-      const resp = getAllMediaViaJsFile();
-      this.state.events = {};
-      for (const evt of resp.events) {
-        this.state.events[evt.id] = {
-          id: evt.id,
-          title: 'title' in evt ? evt.title : `Unnamed ${evt.id}`,
-          comment: evt.comment ?? ''
-        };
-      }
+  // Returns the years of the media that can match the criteria, or null when the facets
+  // aren't loaded.
+  static getMatchingYears(criteria) {
+    if (DateFacets.facets === null) {
+      return null;
+    }
+
+    if (criteria.op.monthDayFilter !== undefined) {
+      return MediaShards.getYearsForPositions(DateFacets.getPositions(criteria.op,
+        criteria.searchValues));
+    }
 
-      this.state.tags = {};
-      for (const tag of resp.tags) {
-        this.state.tags[tag.id] = tag;
+    const filter = criteria.op.dayFilter(criteria.searchValues);
+    const ret = new Set();
+    for (const day of Object.keys(DateFacets.facets.days)) {
+      if (filter(day)) {
+        ret.add(parseInt(day.split('-')[0], 10));
       }
+    }
+
+    return Array.from(ret);
+  }
+}
+
+function registerMediaIndex(index) {
+  MediaShards.index = index;
+}
 
-      this.state.processedMedia = this.doUpdateItems(resp);
-      this.state.extraHeader = resp.extra_header;
-      this.state.mainTitle = resp.title;
+function registerMediaShard(year, media) {
+  // The text index refers to the media by its position in the concatenated shards.
+  let position = 0;
+  for (const shard of MediaShards.index.shards) {
+    if (shard.year === year) {
+      break;
     }
+    position += shard.count;
+  }
 
-    const allCriteria = this.getSearchCriteria();
-    const preferredView = this.getPreferredView(allCriteria, this.state.mainTitle);
-    const searchResults =
-      this.performSearch(this.state.processedMedia, allCriteria, preferredView.defaultSort);
-    readyFunc(searchResults[0], this.state.extraHeader, searchResults[1], preferredView);
+  if (IN_SEARCH_WORKER) {
+    media = media.map((item) => Object.fromEntries(MediaShards.WORKER_FIELDS
+      .filter((field) => field in item)
+      .map((field) => [field, item[field]])));
+  }
+
+  for (const item of media) {
+    MediaShards.expandPaths(item);
+    item.shard_position = position;
+    position += 1;
   }
+  MediaShards.shards.set(year, media);
+}
+
+function registerTextIndex(prefix, words) {
+  TextIndex.prefixes.set(prefix, words);
+}
+
+function registerDateFacets(facets) {
+  DateFacets.facets = facets;
 }
 
 class SearchUI {
@@ -1679,11 +2550,17 @@ class SearchUI {
     return Math.max(0, this.state.allMediaFullScreenIndex - 1);
   }
 
+  // The screen-sized derivative is preferred over the original so that the slideshow and
+  // photo frame don't need to download and decode the full-sized photo.
+  getFullSizeImageUrl(media) {
+    return media.thumbnail.fullscreen ?? media.link;
+  }
+
   getFullscreenImageUrl(index) {
     const media = this.state.allMedia[index];
     if (SearchEngine.MEDIA_TYPES.includes(media.type) &&
         window.innerWidth > SearchUI.SCREEN_BREAKPOINT_SMALL) {
-      return media.link;
+      return this.getFullSizeImageUrl(media);
     }
 
     return media.thumbnail.reg ?? media.thumbnail.large;
@@ -1929,7 +2806,8 @@ class SearchUI {
 
   loadFullSizeImageInBackground(imageEle, index, shownUrl) {
     const media = this.state.allMedia[index];
-    if (!SearchEngine.MEDIA_TYPES.includes(media.type) || !media.link || media.link === shownUrl) {
+    const fullSizeUrl = this.getFullSizeImageUrl(media);
+    if (!SearchEngine.MEDIA_TYPES.includes(media.type) || !fullSizeUrl || fullSizeUrl === shownUrl) {
       return;
     }
 
@@ -1947,7 +2825,7 @@ class SearchUI {
         return;
       }
       this.setLoadingSpinnerShown(false);
-      imageEle.src = media.link;
+      imageEle.src = fullSizeUrl;
     };
     loader.onerror = () => {
       if (this.state.fullSizeImageLoader !== loader) {
@@ -1956,7 +2834,7 @@ class SearchUI {
       this.state.fullSizeImageLoader = null;
       this.setLoadingSpinnerShown(false);
     };
-    loader.src = media.link;
+    loader.src = fullSizeUrl;
   }
 
   preloadNextImage() {
@@ -3121,6 +3999,73 @@ class SearchUI {
     return maxWidth < media.thumbnail.reg_width ? maxWidth : media.thumbnail.reg_width;
   }
 
+  /*
+   * The generator packs the small and medium thumbnails of each event and year into sprite
+   * sheets. Use them when all of the media in the search results come from a single event
+   * or year so that the icons are drawn with one request per sheet instead of one per media.
+   */
+  getSpritesForResults(allMedia) {
+    if (!this.state.sprites) {
+      return null;
+    }
+
+    const eventIds = new Set();
+    const years = new Set();
+    for (const media of allMedia) {
+      if (SearchEngine.MEDIA_TYPES.includes(media.type)) {
+        eventIds.add(media.event_id);
+        years.add(media.year[0]);
+      }
+    }
+
+    if (eventIds.size === 1) {
+      const sprites = this.state.sprites.events[eventIds.values().next().value];
+      if (sprites) {
+        return sprites;
+      }
+    }
+
+    if (years.size === 1) {
+      return this.state.sprites.years[years.values().next().value] ?? null;
+    }
+
+    return null;
+  }
+
+  // The tiles fill each sheet row by row in the order of media_ids, so the sheet and position
+  // of the media follow from its place in the list.
+  createSpriteElement(media, iconSize) {
+    const sprite = this.state.currentSprites?.[iconSize];
+    if (!sprite) {
+      return null;
+    }
+
+    sprite.positions ??= new Map(sprite.media_ids.map((mediaId, idx) => [mediaId, idx]));
+    const idx = sprite.positions.get(media.media_id);
+    if (idx === undefined) {
+      return null;
+    }
+
+    const tilesPerSheet = sprite.cols * sprite.rows;
+    const tile = idx % tilesPerSheet;
+    const [width, height] = sprite.tile;
+    const x = (tile % sprite.cols) * width;
+    const y = Math.floor(tile / sprite.cols) * height;
+    const [sheetUrl, sheetWidth, sheetHeight] = sprite.sheets[Math.floor(idx / tilesPerSheet)];
+
+    // Use percentages so that the icon scales with the responsive thumbnail sizes.
+    const ret = document.createElement('span');
+    ret.className = 'sprite';
+    ret.setAttribute('role', 'img');
+    ret.setAttribute('aria-label', media.title ?? '');
+    ret.style.backgroundImage = `url("${sheetUrl}")`;
+    ret.style.backgroundSize = `${(sheetWidth / width) * 100}% ${(sheetHeight / height) * 100}%`;
+    const xPercent = sheetWidth > width ? (x / (sheetWidth - width)) * 100 : 0;
+    const yPercent = sheetHeight > height ? (y / (sheetHeight - height)) * 100 : 0;
+    ret.style.backgroundPosition = `${xPercent}% ${yPercent}%`;
+    return ret;
+  }
+
   setupMotionPhotoHover(img, thumbnailSrc, motionPhotoSrc) {
     img.onmouseover = () => { img.src = motionPhotoSrc; };
     img.onmouseleave = () => { img.src = thumbnailSrc; };
@@ -3146,7 +4091,11 @@ class SearchUI {
     img.loading = 'lazy';
     img.decoding = 'async';
 
-    if (this.state.alwaysShowAnimations && media.motion_photo) {
+    const spriteEle = media.motion_photo ? null : this.createSpriteElement(media, iconSize);
+    if (spriteEle) {
+      mediaThumbSpan.replaceChildren(spriteEle);
+      mediaEle.className = iconSize === 'small' ? 'media_small' : 'media_medium';
+    } else if (this.state.alwaysShowAnimations && media.motion_photo) {
       if (iconSize === 'small') {
         img.src = media.motion_photo.small_gif;
         mediaEle.className = 'media_small';
@@ -3198,6 +4147,20 @@ class SearchUI {
       mediaEle.style.width = `${this.getMediaRegularWidth(media)}px`;
     }
 
+    // The square thumbnails have a known size, so paint the placeholder until the real
+    // image is loaded. The regular thumbnails have a variable height so they are skipped.
+    const placeholderUrl = !spriteEle && media.thumbnail?.placeholder && mediaEle.className !== 'media_dyn'
+      ? getPlaceholderUrl(media.thumbnail.placeholder)
+      : null;
+    if (placeholderUrl) {
+      img.classList.add('placeholder');
+      img.style.backgroundImage = `url(${placeholderUrl})`;
+      img.addEventListener('load', () => {
+        img.classList.remove('placeholder');
+        img.style.backgroundImage = '';
+      }, { once: true });
+    }
+
     const isAggregate = this.isAggregateMediaType(media.type);
 
     // Tags, events and years gate their full metadata on the page size (see
@@ -3462,12 +4425,28 @@ class SearchUI {
   }
 
   doPerformSearch() {
-    this.searchEngine.processJson((newAllMedia, extraHeader, newDateRange, preferredView) =>
-      this.populateMedia(newAllMedia, extraHeader, newDateRange, preferredView));
+    this.searchEngine.processJson(
+      (newAllMedia, extraHeader, newDateRange, preferredView) =>
+        this.populateMedia(newAllMedia, extraHeader, newDateRange, preferredView),
+      () => updateOverallStatusMessage('Error loading media'),
+      (allMedia, newDateRange) => this.mediaAppended(allMedia, newDateRange));
+  }
+
+  mediaAppended(allMedia, newDateRange) {
+    // The older media for the default view is loaded in the background after the first
+    // pages are shown.
+    if (allMedia !== this.state.allMedia) {
+      return;
+    }
+
+    this.state.currentSprites = this.getSpritesForResults(allMedia);
+    this.state.dateRange = newDateRange;
+    document.querySelector('.summary_stats').replaceChildren(this.createAllStatsHtml());
   }
 
   populateMedia(newAllMedia, extraHeader, newDateRange, preferredView) {
     this.state.allMedia = newAllMedia;
+    this.state.currentSprites = this.getSpritesForResults(newAllMedia);
     this.state.dateRange = newDateRange;
     this.state.currentYearView = preferredView.currentYearView;
 
@@ -4384,6 +5363,10 @@ class SearchUI {
 class MapUI {
   static MARKER_SIZE = 48;
 
+  // Filled in by map/index.js and the map/tiles/*.js files when the tiled map is used.
+  static tileIndex = null;
+  static tiles = new Map();
+
   constructor(state, searchEngine, searchUI) {
     this.state = state;
     this.searchEngine = searchEngine;
@@ -4415,7 +5398,84 @@ class MapUI {
     return features;
   }
 
-  initMap(mapInstance, markers, popupWidth, autoPanPadding) {
+  createMarker(props, latlng) {
+    const thumbUrl = props.thumbnail?.small ?? props.reg_thumbnail ?? null;
+    const inner = thumbUrl ?
+      `<div class="photo-marker-inner"><img src="${thumbUrl}" alt=""/></div>` :
+      '<div class="photo-marker-inner"></div>';
+    const size = MapUI.MARKER_SIZE;
+    return L.marker(latlng, {
+      icon: L.divIcon({
+        className: 'photo-marker',
+        html: inner,
+        iconSize: [size, size],
+        iconAnchor: [size / 2, size / 2],
+        popupAnchor: [0, -size / 2],
+      }),
+    });
+  }
+
+  bindMarkerPopup(layer, props, popupWidth, autoPanPadding) {
+    const popupContainer = document.createElement('div');
+    popupContainer.className = 'popup-container';
+    popupContainer.setAttribute('data-media-id', props.media_id);
+    if (props.mediaIndex !== undefined) {
+      popupContainer.setAttribute('data-media-index', props.mediaIndex);
+    }
+
+    const loadingText = document.createElement('div');
+    loadingText.className = 'popup-loading';
+    loadingText.textContent = 'Loading...';
+    popupContainer.appendChild(loadingText);
+
+    if (props.type === 'video') {
+      const video = document.createElement('video');
+      video.setAttribute('data-src', props.smallest_video);
+      video.className = 'popup-image';
+      video.loop = true;
+      video.controls = true;
+      video.style.display = 'none';
+      popupContainer.appendChild(video);
+    } else {
+      const img = document.createElement('img');
+      img.setAttribute('data-src', props.reg_thumbnail);
+      img.className = 'popup-image';
+      img.style.display = 'none';
+
+      if (props.motion_photo) {
+        img.setAttribute('data-motion-photo', props.motion_photo.reg_gif);
+      }
+
+      popupContainer.appendChild(img);
+    }
+
+    const metadata = this.searchUI.createMediaStatsHtml(props, false, null, true);
+    metadata.className = 'popup-metadata';
+    popupContainer.appendChild(metadata);
+
+    layer.bindPopup(popupContainer, {
+      minWidth: popupWidth,
+      maxWidth: popupWidth,
+      autoPan: true,
+      autoPanPadding: autoPanPadding
+    });
+
+    // Hovering a single (non-clustered) marker shows the small thumbnail as a
+    // quick preview popup. Clusters show a count and aren't bound here.
+    const hoverThumb = props.thumbnail?.medium ?? props.reg_thumbnail ?? null;
+    if (hoverThumb) {
+      layer.bindTooltip(`<img class="marker-hover-thumb" src="${hoverThumb}" alt=""/>`, {
+        direction: 'top',
+        offset: [0, -(MapUI.MARKER_SIZE / 2)],
+        opacity: 1,
+        className: 'marker-hover-tooltip'
+      });
+      // Avoid the hover preview overlapping the full popup once it's opened.
+      layer.on('popupopen', () => layer.closeTooltip());
+    }
+  }
+
+  initMap(mapInstance, markers, popupWidth, autoPanPadding, errorFunc) {
     this.searchEngine.processJson((filteredMedia, _extraHeader, _newDateRange, preferredView) => {
       if (preferredView && preferredView.title) {
         document.title = preferredView.title + ' - Map';
@@ -4431,278 +5491,403 @@ class MapUI {
       };
 
       const geoJsonLayer = L.geoJSON(geojson, {
-        pointToLayer: (feature, latlng) => {
-          const props = feature.properties || {};
-          const thumbUrl = props.thumbnail?.small ?? props.reg_thumbnail ?? null;
-          const inner = thumbUrl ?
-            `<div class="photo-marker-inner"><img src="${thumbUrl}" alt=""/></div>` :
-            '<div class="photo-marker-inner"></div>';
-          const size = MapUI.MARKER_SIZE;
-          return L.marker(latlng, {
-            icon: L.divIcon({
-              className: 'photo-marker',
-              html: inner,
-              iconSize: [size, size],
-              iconAnchor: [size / 2, size / 2],
-              popupAnchor: [0, -size / 2],
-            }),
-          });
-        },
+        pointToLayer: (feature, latlng) => this.createMarker(feature.properties || {}, latlng),
         onEachFeature: (feature, layer) => {
-          const props = feature.properties || {};
-
-          const popupContainer = document.createElement('div');
-          popupContainer.className = 'popup-container';
-          popupContainer.setAttribute('data-media-index', props.mediaIndex);
-
-          const loadingText = document.createElement('div');
-          loadingText.className = 'popup-loading';
-          loadingText.textContent = 'Loading...';
-          popupContainer.appendChild(loadingText);
-
-          if (props.type === 'video') {
-            const video = document.createElement('video');
-            video.setAttribute('data-src', props.smallest_video);
-            video.className = 'popup-image';
-            video.loop = true;
-            video.controls = true;
-            video.style.display = 'none';
-            popupContainer.appendChild(video);
-          } else {
-            const img = document.createElement('img');
-            img.setAttribute('data-src', props.reg_thumbnail);
-            img.className = 'popup-image';
-            img.style.display = 'none';
+          this.bindMarkerPopup(layer, feature.properties || {}, popupWidth, autoPanPadding);
+        }
+      });
 
-            if (props.motion_photo) {
-              img.setAttribute('data-motion-photo', props.motion_photo.reg_gif);
-            }
+      markers.addLayer(geoJsonLayer);
+      mapInstance.addLayer(markers);
 
-            popupContainer.appendChild(img);
-          }
+      const lat = getFloatQueryParameter('lat', null);
+      const lon = getFloatQueryParameter('lon', null);
+      if (lat !== null && lon !== null) {
+        mapInstance.setView([lat, lon], 13);
+      } else if (markers.getLayers().length > 0) {
+        mapInstance.fitBounds(markers.getBounds(), { padding: [20, 20] });
+      }
 
-          const metadata = this.searchUI.createMediaStatsHtml(props, false, null, true);
-          metadata.className = 'popup-metadata';
-          popupContainer.appendChild(metadata);
+      this.initControls(mapInstance,
+        markers.getLayers().length > 0 ? () => markers.getBounds() : null);
+    }, errorFunc);
+  }
 
-          layer.bindPopup(popupContainer, {
-            minWidth: popupWidth,
-            maxWidth: popupWidth,
-            autoPan: true,
-            autoPanPadding: autoPanPadding
-          });
+  static getTileX(lon, zoom) {
+    return Math.floor((lon + 180) / 360 * (2 ** zoom));
+  }
+
+  static getTileY(lat, zoom) {
+    const maxLatitude = 85.0511287798;
+    const numTiles = 2 ** zoom;
+    const latRad = Math.max(Math.min(lat, maxLatitude), -maxLatitude) * Math.PI / 180;
+    const y = Math.floor((1 - Math.asinh(Math.tan(latRad)) / Math.PI) / 2 * numTiles);
+    return Math.min(Math.max(y, 0), numTiles - 1);
+  }
+
+  tilePointToProps(point, fields) {
+    const row = {};
+    fields.forEach((field, idx) => {
+      row[field] = point[idx];
+    });
+
+    const props = {
+      media_id: row.media_id,
+      lat: row.lat,
+      lon: row.lon,
+      type: row.type,
+      title: row.title,
+      exposure_time: row.exposure_time,
+      exposure_time_pretty: row.exposure_time_pretty,
+      camera: row.camera,
+      thumbnail: { small: row.small, medium: row.medium, reg: row.reg },
+      reg_thumbnail: row.reg,
+      smallest_video: row.video,
+    };
+    if (row.motion_gif) {
+      props.motion_photo = { reg_gif: row.motion_gif };
+    }
+
+    return props;
+  }
+
+  initTiledMap(mapInstance, markers, popupWidth, autoPanPadding) {
+    // Only the tiles that overlap the current view are loaded. Once a tile is loaded, its
+    // markers stay in the cluster group.
+    const tileIndex = MapUI.tileIndex;
+    const zoom = tileIndex.zoom;
+    const requestedTiles = new Set();
+
+    // The busy areas are split into smaller tiles at higher zoom levels, so the tiles are
+    // grouped by their zoom level. The keys are z/x/y.
+    const tilesByZoom = new Map();
+    for (const key of Object.keys(tileIndex.tiles)) {
+      const [tileZoom, x, y] = key.split('/').map((part) => parseInt(part, 10));
+      if (!tilesByZoom.has(tileZoom)) {
+        tilesByZoom.set(tileZoom, []);
+      }
+      tilesByZoom.get(tileZoom).push({ key, x, y });
+    }
+    const summaryLayer = L.layerGroup();
+    let summaryZoom = null;
+
+    const addTile = (key) => {
+      const layers = [];
+      for (const point of MapUI.tiles.get(key) ?? []) {
+        const props = this.tilePointToProps(point, tileIndex.fields);
+        const layer = this.createMarker(props, L.latLng(props.lat, props.lon));
+        this.bindMarkerPopup(layer, props, popupWidth, autoPanPadding);
+        layers.push(layer);
+      }
+      markers.addLayers(layers);
+    };
 
-          // Hovering a single (non-clustered) marker shows the small thumbnail as a
-          // quick preview popup. Clusters show a count and aren't bound here.
-          const hoverThumb = props.thumbnail?.medium ?? props.reg_thumbnail ?? null;
-          if (hoverThumb) {
-            layer.bindTooltip(`<img class="marker-hover-thumb" src="${hoverThumb}" alt=""/>`, {
-              direction: 'top',
-              offset: [0, -(MapUI.MARKER_SIZE / 2)],
-              opacity: 1,
-              className: 'marker-hover-tooltip'
-            });
-            // Avoid the hover preview overlapping the full popup once it's opened.
-            layer.on('popupopen', () => layer.closeTooltip());
+    const loadVisibleTiles = () => {
+      const bounds = mapInstance.getBounds().pad(0.25);
+      for (const [tileZoom, tiles] of tilesByZoom) {
+        const numTiles = 2 ** tileZoom;
+        const minX = MapUI.getTileX(bounds.getWest(), tileZoom);
+        const numX = Math.min(MapUI.getTileX(bounds.getEast(), tileZoom) - minX, numTiles - 1);
+        const minY = MapUI.getTileY(bounds.getNorth(), tileZoom);
+        const maxY = MapUI.getTileY(bounds.getSouth(), tileZoom);
+
+        for (const tile of tiles) {
+          // The longitude wraps around when the map is panned past the antimeridian.
+          const offsetX = (((tile.x - minX) % numTiles) + numTiles) % numTiles;
+          if (offsetX > numX || tile.y < minY || tile.y > maxY ||
+              requestedTiles.has(tile.key)) {
+            continue;
           }
+
+          requestedTiles.add(tile.key);
+          loadScript(`map/tiles/${tile.key}.js`)
+            .then(() => addTile(tile.key))
+            .catch((error) => console.error(error));
         }
-      });
+      }
+    };
 
-      markers.addLayer(geoJsonLayer);
-      mapInstance.addLayer(markers);
+    const showClusterSummaries = (clusterZoom) => {
+      if (summaryZoom === clusterZoom) {
+        return;
+      }
 
-      // Lazy load media when popup opens
-      mapInstance.on('popupopen', (e) => {
-        const popup = e.popup;
-        const content = popup.getContent();
-
-        if (content && content.querySelector) {
-          const loadingText = content.querySelector('.popup-loading');
-          const video = content.querySelector('video[data-src]');
-          const img = content.querySelector('img[data-src]');
-          const mediaIndex = parseInt(content.getAttribute('data-media-index'));
-
-          if (video) {
-            video.src = video.getAttribute('data-src');
-            video.removeAttribute('data-src');
-            video.addEventListener('loadeddata', () => {
-              if (loadingText) {
-                loadingText.style.display = 'none';
-              }
-              video.style.display = 'block';
-            }, { once: true });
-            video.load();
-            video.play().catch(() => {
-              // Autoplay might be blocked, user can click play button
-            });
-          }
+      summaryZoom = clusterZoom;
+      summaryLayer.clearLayers();
+      for (const cluster of tileIndex.clusters[clusterZoom] ?? []) {
+        summaryLayer.addLayer(
+          this.createClusterSummaryMarker(mapInstance, cluster, tileIndex.cluster_fields));
+      }
+    };
 
-          if (img) {
-            const imgSrc = img.getAttribute('data-src');
-            const motionPhotoSrc = img.getAttribute('data-motion-photo');
+    // Below the tile zoom level, the precomputed cluster summaries are shown so that the
+    // individual points don't need to be loaded.
+    const updateVisibleLayers = () => {
+      const currentZoom = Math.floor(mapInstance.getZoom());
+      if (tileIndex.clusters && currentZoom < zoom) {
+        mapInstance.removeLayer(markers);
+        showClusterSummaries(String(Math.max(currentZoom, 0)));
+        mapInstance.addLayer(summaryLayer);
+      } else {
+        mapInstance.removeLayer(summaryLayer);
+        mapInstance.addLayer(markers);
+        loadVisibleTiles();
+      }
+    };
 
-            img.onload = () => {
-              if (loadingText) {
-                loadingText.style.display = 'none';
-              }
-              img.style.display = 'block';
-            };
+    mapInstance.on('moveend', updateVisibleLayers);
 
-            img.src = imgSrc;
-            img.removeAttribute('data-src');
+    const extents = tileIndex.bounds ? L.latLngBounds(tileIndex.bounds) : null;
+    const lat = getFloatQueryParameter('lat', null);
+    const lon = getFloatQueryParameter('lon', null);
+    if (lat !== null && lon !== null) {
+      mapInstance.setView([lat, lon], 13);
+    } else if (extents) {
+      mapInstance.fitBounds(extents, { padding: [20, 20] });
+    } else {
+      mapInstance.setView([0, 0], 2);
+    }
+    updateVisibleLayers();
 
-            if (motionPhotoSrc) {
-              this.searchUI.setupMotionPhotoHover(img, imgSrc, motionPhotoSrc);
-              img.removeAttribute('data-motion-photo');
-            }
+    this.initControls(mapInstance, extents ? () => extents : null);
+  }
 
-            img.style.cursor = 'pointer';
-            img.onclick = () => {
-              this.searchUI.enterSlideshowMode(mediaIndex);
-            };
-          }
-        }
-      });
+  createClusterSummaryMarker(mapInstance, clusterRow, fields) {
+    const cluster = {};
+    fields.forEach((field, idx) => {
+      cluster[field] = clusterRow[idx];
+    });
 
-      const lat = getFloatQueryParameter('lat', null);
-      const lon = getFloatQueryParameter('lon', null);
-      if (lat !== null && lon !== null) {
-        mapInstance.setView([lat, lon], 13);
-      } else if (markers.getLayers().length > 0) {
-        mapInstance.fitBounds(markers.getBounds(), { padding: [20, 20] });
+    const size = MapUI.MARKER_SIZE;
+    const thumb = cluster.thumbnail ? `<img src="${cluster.thumbnail}" alt=""/>` : '';
+    const marker = L.marker([cluster.lat, cluster.lon], {
+      icon: L.divIcon({
+        className: 'photo-marker',
+        html: `<div class="photo-marker-inner">${thumb}</div>` +
+          `<div class="summary-marker-count">${cluster.count.toLocaleString()}</div>`,
+        iconSize: [size, size],
+        iconAnchor: [size / 2, size / 2],
+      }),
+    });
+
+    const bounds = L.latLngBounds([cluster.south, cluster.west], [cluster.north, cluster.east]);
+    marker.on('click', () => {
+      mapInstance.flyToBounds(bounds, { padding: [20, 20], maxZoom: 16, duration: 2.0 });
+    });
+
+    return marker;
+  }
+
+  enterSlideshowModeForMediaId(mediaId) {
+    // The tiles only have what the markers need so the media is loaded the first time that
+    // a slideshow is started from the map.
+    this.searchEngine.processJson((filteredMedia) => {
+      this.state.allMedia = filteredMedia;
+      const index = filteredMedia.findIndex((media) => media.media_id === mediaId);
+      if (index >= 0) {
+        this.searchUI.enterSlideshowMode(index);
       }
+    });
+  }
 
-      document.getElementById('loading').style.display = 'none';
-
-      const zoomExtentsBtn = document.getElementById('zoom-extents');
-      if (zoomExtentsBtn && markers.getLayers().length > 0) {
-        zoomExtentsBtn.style.display = 'block';
-        zoomExtentsBtn.onclick = () => {
-          mapInstance.fitBounds(markers.getBounds(), { padding: [20, 20] });
-        };
-      }
-
-      const myLocationBtn = document.getElementById('my-location');
-      if (myLocationBtn) {
-        myLocationBtn.style.display = 'block';
-        myLocationBtn.onclick = () => {
-          if ('geolocation' in navigator) {
-            myLocationBtn.disabled = true;
-            myLocationBtn.style.opacity = '0.5';
-            navigator.geolocation.getCurrentPosition(
-              (position) => {
-                const lat = position.coords.latitude;
-                const lng = position.coords.longitude;
-                mapInstance.setView([lat, lng], 16);
-                myLocationBtn.disabled = false;
-                myLocationBtn.style.opacity = '1';
-              },
-              (error) => {
-                alert('Error getting location: ' + error.message);
-                myLocationBtn.disabled = false;
-                myLocationBtn.style.opacity = '1';
-              },
-              {
-                enableHighAccuracy: true,
-                timeout: 10000,
-                maximumAge: 0
-              }
-            );
-          } else {
-            alert('Geolocation is not supported by your browser');
-          }
-        };
-      }
-
-      const searchBoundsBtn = document.getElementById('search-bounds');
-      if (searchBoundsBtn) {
-        searchBoundsBtn.style.display = 'block';
-        searchBoundsBtn.onclick = () => {
-          const bounds = mapInstance.getBounds();
-          const center = bounds.getCenter();
-          const corner = bounds.getNorthEast();
-          // Use the radius that circumscribes the visible rectangle so that
-          // everything currently on screen matches the criteria. Round the
-          // radius up so the corners aren't lost to truncation.
-          const radiusKm = this.searchEngine.haversineDistance(
-            [center.lat, center.lng], [corner.lat, corner.lng]);
-          const roundedKm = Math.max(Math.ceil(radiusKm * 100) / 100, 0.01);
-          const criteria = joinCriteriaParts(['GPS Coordinate', 'is within',
-            center.lat.toFixed(6), center.lng.toFixed(6), roundedKm]);
-          window.top.location.href =
-            this.searchEngine.generateSearchUrl([criteria], 'all', 'default', 'none', 'default');
-        };
-      }
-
-      const zoomLastBtn = document.getElementById('zoom-last');
-      if (zoomLastBtn) {
-        const MAX_HISTORY = 50;
-        let viewHistory = [];
-        let currentViewIndex = -1;
-        let isRestoringView = false;
-
-        mapInstance.on('zoomend moveend', () => {
-          if (!isRestoringView) {
-            const currentCenter = mapInstance.getCenter();
-            const currentZoom = mapInstance.getZoom();
-            const newView = {
-              center: currentCenter,
-              zoom: currentZoom
-            };
-
-            // Check if this is a different view from the current one in history
-            if (currentViewIndex >= 0 && currentViewIndex < viewHistory.length) {
-              const currentHistoryView = viewHistory[currentViewIndex];
-              if (currentHistoryView.zoom === currentZoom &&
-                  currentHistoryView.center.lat === currentCenter.lat &&
-                  currentHistoryView.center.lng === currentCenter.lng) {
-                return;
-              }
+  initControls(mapInstance, getExtents) {
+    // Lazy load media when popup opens
+    mapInstance.on('popupopen', (e) => {
+      const popup = e.popup;
+      const content = popup.getContent();
+
+      if (content && content.querySelector) {
+        const loadingText = content.querySelector('.popup-loading');
+        const video = content.querySelector('video[data-src]');
+        const img = content.querySelector('img[data-src]');
+        const mediaId = content.getAttribute('data-media-id');
+        const mediaIndex = content.hasAttribute('data-media-index') ?
+          parseInt(content.getAttribute('data-media-index')) : null;
+
+        if (video) {
+          video.src = video.getAttribute('data-src');
+          video.removeAttribute('data-src');
+          video.addEventListener('loadeddata', () => {
+            if (loadingText) {
+              loadingText.style.display = 'none';
             }
+            video.style.display = 'block';
+          }, { once: true });
+          video.load();
+          video.play().catch(() => {
+            // Autoplay might be blocked, user can click play button
+          });
+        }
 
-            // If we're not at the end of history, truncate everything after current position
-            if (currentViewIndex < viewHistory.length - 1) {
-              viewHistory = viewHistory.slice(0, currentViewIndex + 1);
+        if (img) {
+          const imgSrc = img.getAttribute('data-src');
+          const motionPhotoSrc = img.getAttribute('data-motion-photo');
+
+          img.onload = () => {
+            if (loadingText) {
+              loadingText.style.display = 'none';
             }
+            img.style.display = 'block';
+          };
 
-            // Add the new view to history
-            viewHistory.push(newView);
+          img.src = imgSrc;
+          img.removeAttribute('data-src');
+
+          if (motionPhotoSrc) {
+            this.searchUI.setupMotionPhotoHover(img, imgSrc, motionPhotoSrc);
+            img.removeAttribute('data-motion-photo');
+          }
 
-            // Cap the history at MAX_HISTORY entries
-            if (viewHistory.length > MAX_HISTORY) {
-              viewHistory.shift();
+          img.style.cursor = 'pointer';
+          img.onclick = () => {
+            if (mediaIndex !== null) {
+              this.searchUI.enterSlideshowMode(mediaIndex);
             } else {
-              currentViewIndex++;
+              this.enterSlideshowModeForMediaId(mediaId);
+            }
+          };
+        }
+      }
+    });
+
+    document.getElementById('loading').style.display = 'none';
+
+    const zoomExtentsBtn = document.getElementById('zoom-extents');
+    if (zoomExtentsBtn && getExtents) {
+      zoomExtentsBtn.style.display = 'block';
+      zoomExtentsBtn.onclick = () => {
+        mapInstance.fitBounds(getExtents(), { padding: [20, 20] });
+      };
+    }
+
+    const myLocationBtn = document.getElementById('my-location');
+    if (myLocationBtn) {
+      myLocationBtn.style.display = 'block';
+      myLocationBtn.onclick = () => {
+        if ('geolocation' in navigator) {
+          myLocationBtn.disabled = true;
+          myLocationBtn.style.opacity = '0.5';
+          navigator.geolocation.getCurrentPosition(
+            (position) => {
+              const lat = position.coords.latitude;
+              const lng = position.coords.longitude;
+              mapInstance.setView([lat, lng], 16);
+              myLocationBtn.disabled = false;
+              myLocationBtn.style.opacity = '1';
+            },
+            (error) => {
+              alert('Error getting location: ' + error.message);
+              myLocationBtn.disabled = false;
+              myLocationBtn.style.opacity = '1';
+            },
+            {
+              enableHighAccuracy: true,
+              timeout: 10000,
+              maximumAge: 0
             }
+          );
+        } else {
+          alert('Geolocation is not supported by your browser');
+        }
+      };
+    }
+
+    const searchBoundsBtn = document.getElementById('search-bounds');
+    if (searchBoundsBtn) {
+      searchBoundsBtn.style.display = 'block';
+      searchBoundsBtn.onclick = () => {
+        const bounds = mapInstance.getBounds();
+        const center = bounds.getCenter();
+        const corner = bounds.getNorthEast();
+        // Use the radius that circumscribes the visible rectangle so that
+        // everything currently on screen matches the criteria. Round the
+        // radius up so the corners aren't lost to truncation.
+        const radiusKm = this.searchEngine.haversineDistance(
+          [center.lat, center.lng], [corner.lat, corner.lng]);
+        const roundedKm = Math.max(Math.ceil(radiusKm * 100) / 100, 0.01);
+        const criteria = joinCriteriaParts(['GPS Coordinate', 'is within',
+          center.lat.toFixed(6), center.lng.toFixed(6), roundedKm]);
+        window.top.location.href =
+          this.searchEngine.generateSearchUrl([criteria], 'all', 'default', 'none', 'default');
+      };
+    }
+
+    const zoomLastBtn = document.getElementById('zoom-last');
+    if (zoomLastBtn) {
+      const MAX_HISTORY = 50;
+      let viewHistory = [];
+      let currentViewIndex = -1;
+      let isRestoringView = false;
+
+      mapInstance.on('zoomend moveend', () => {
+        if (!isRestoringView) {
+          const currentCenter = mapInstance.getCenter();
+          const currentZoom = mapInstance.getZoom();
+          const newView = {
+            center: currentCenter,
+            zoom: currentZoom
+          };
 
-            // Enable/disable button based on history
-            zoomLastBtn.disabled = currentViewIndex <= 0;
+          // Check if this is a different view from the current one in history
+          if (currentViewIndex >= 0 && currentViewIndex < viewHistory.length) {
+            const currentHistoryView = viewHistory[currentViewIndex];
+            if (currentHistoryView.zoom === currentZoom &&
+                currentHistoryView.center.lat === currentCenter.lat &&
+                currentHistoryView.center.lng === currentCenter.lng) {
+              return;
+            }
           }
-          isRestoringView = false;
-        });
 
-        zoomLastBtn.style.display = 'block';
-        zoomLastBtn.disabled = true;
-        zoomLastBtn.onclick = () => {
-          if (currentViewIndex > 0) {
-            currentViewIndex--;
-            const previousView = viewHistory[currentViewIndex];
-            isRestoringView = true;
-            mapInstance.setView([previousView.center.lat, previousView.center.lng], previousView.zoom);
-            zoomLastBtn.disabled = currentViewIndex <= 0;
+          // If we're not at the end of history, truncate everything after current position
+          if (currentViewIndex < viewHistory.length - 1) {
+            viewHistory = viewHistory.slice(0, currentViewIndex + 1);
+          }
+
+          // Add the new view to history
+          viewHistory.push(newView);
+
+          // Cap the history at MAX_HISTORY entries
+          if (viewHistory.length > MAX_HISTORY) {
+            viewHistory.shift();
+          } else {
+            currentViewIndex++;
           }
-        };
-      }
 
-      document.addEventListener('keydown', (event) => {
-        if (event.key === 'Escape') {
-          mapInstance.closePopup();
+          // Enable/disable button based on history
+          zoomLastBtn.disabled = currentViewIndex <= 0;
         }
+        isRestoringView = false;
       });
+
+      zoomLastBtn.style.display = 'block';
+      zoomLastBtn.disabled = true;
+      zoomLastBtn.onclick = () => {
+        if (currentViewIndex > 0) {
+          currentViewIndex--;
+          const previousView = viewHistory[currentViewIndex];
+          isRestoringView = true;
+          mapInstance.setView([previousView.center.lat, previousView.center.lng], previousView.zoom);
+          zoomLastBtn.disabled = currentViewIndex <= 0;
+        }
+      };
+    }
+
+    document.addEventListener('keydown', (event) => {
+      if (event.key === 'Escape') {
+        mapInstance.closePopup();
+      }
     });
   }
 }
 
+function registerMapTileIndex(index) {
+  MapUI.tileIndex = index;
+}
+
+function registerMapTile(key, points) {
+  MapUI.tiles.set(key, points);
+}
+
 function doSearchInit() {
   const _state = new SearchState();
   const _searchEngine = new SearchEngine(_state);
@@ -4893,7 +6078,19 @@ function doMapInit() {
     searchUI.initFullscreenControls();
     const mapUI = new MapUI(state, searchEngine, searchUI);
 
-    mapUI.initMap(map, markers, POPUP_WIDTH, AUTOPAN_PADDING);
+    const initFullMap = () => {
+      mapUI.initMap(map, markers, POPUP_WIDTH, AUTOPAN_PADDING, () => showMediaLoadError());
+    };
+
+    // The precomputed tiles have every geotagged item so they are only used when the map
+    // isn't filtered by a search. Older sites without the tiles fall back to the full media.
+    if (searchEngine.getSearchQueryParams().length > 0) {
+      initFullMap();
+    } else {
+      loadScript('map/index.js').then(
+        () => mapUI.initTiledMap(map, markers, POPUP_WIDTH, AUTOPAN_PADDING),
+        () => initFullMap());
+    }
     initAddressSearch(map);
   } catch (error) {
     document.getElementById('loading').style.display = 'none';
@@ -4902,3 +6099,9 @@ function doMapInit() {
       error.message || 'An error occurred while loading the map';
   }
 }
+
+// search.js is also loaded as the search worker. See SearchEngine.getWorker().
+if (IN_SEARCH_WORKER) {
+  const _workerSearchEngine = new SearchEngine(new SearchState());
+  self.onmessage = (event) => _workerSearchEngine.workerSearch(event.data);
+}
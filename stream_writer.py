@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Writers for generating the large output files in pieces so that the serialized file never
+# needs to be held in memory as one string. This doesn't make the memory use flat: the media
+# list that the files are made from is still held in memory by the caller. The pieces are
+# compared against the existing file as they are written, and a temporary file is only started
+# once they differ, so an unchanged file is only read once and never written.
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import precompress
+
+def get_file_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as infile:
+        for block in iter(lambda: infile.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.digest()
+
+class StreamingFileWriter:
+    def __init__(self, dest, compress=False):
+        self.dest = dest
+        self.compress = compress
+        self.size = 0
+        self.tmp_path = None
+        self.fhandle = None
+
+        # pylint: disable=consider-using-with
+        self.existing = open(dest, "rb") if os.path.isfile(dest) else None
+
+    def __start_tmp_file(self):
+        # The pieces that matched so far are copied from the existing file.
+        dest_dir = os.path.dirname(self.dest)
+        os.makedirs(dest_dir, exist_ok=True)
+        (fd, self.tmp_path) = tempfile.mkstemp(dir=dest_dir, prefix='.media.', suffix='.tmp')
+        self.fhandle = os.fdopen(fd, 'wb')
+
+        if self.existing is not None:
+            self.existing.seek(0)
+            remaining = self.size
+            while remaining:
+                block = self.existing.read(min(remaining, 1024 * 1024))
+                self.fhandle.write(block)
+                remaining -= len(block)
+            self.existing.close()
+            self.existing = None
+
+    def write(self, text):
+        content = text.encode("UTF-8")
+        if self.fhandle is None:
+            if self.existing is not None and self.existing.read(len(content)) == content:
+                self.size += len(content)
+                return
+
+            self.__start_tmp_file()
+
+        self.size += len(content)
+        self.fhandle.write(content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, _exc_value, _traceback):
+        if self.fhandle is None and exc_type is None and \
+           (self.existing is None or self.existing.read(1) != b""):
+            # The new contents are a prefix of the existing file, or there is nothing to write.
+            self.__start_tmp_file()
+
+        if self.existing is not None:
+            self.existing.close()
+        if self.fhandle is not None:
+            self.fhandle.close()
+
+        if exc_type is not None:
+            if self.tmp_path is not None:
+                os.unlink(self.tmp_path)
+            return False
+
+        if self.tmp_path is not None:
+            os.chmod(self.tmp_path, 0o644)
+            logging.info("Writing %s", self.dest)
+            os.replace(self.tmp_path, self.dest)
+
+        if self.compress:
+            precompress.compress_file(self.dest)
+
+        return False
+
+class MediaJsonWriter:
+    # Writes the output dictionary one media item at a time. The result is the same as
+    # json.dumps(output, indent="\t"). begin() writes everything up to the media list, and end()
+    # writes everything after it.
+    def __init__(self, outfile, output):
+        self.outfile = outfile
+        self.output = output
+        self.encoder = json.JSONEncoder(indent="\t")
+        self.remaining_keys = []
+        self.media_count = 0
+
+    def __write_value(self, value, indent):
+        # Strings can't contain a raw newline, so every newline is between two JSON tokens.
+        for chunk in self.encoder.iterencode(value):
+            self.outfile.write(chunk.replace("\n", "\n" + indent))
+
+    def __write_key(self, key):
+        self.outfile.write("\n\t%s: " % (json.dumps(key)))
+
+    def begin(self):
+        keys = list(self.output.keys())
+        media_pos = keys.index("media")
+        self.remaining_keys = keys[media_pos + 1:]
+
+        self.outfile.write("{")
+        for key in keys[:media_pos]:
+            self.__write_key(key)
+            self.__write_value(self.output[key], "\t")
+            self.outfile.write(",")
+
+        self.__write_key("media")
+        self.outfile.write("[")
+
+    def add_media(self, media):
+        self.outfile.write(",\n\t\t" if self.media_count else "\n\t\t")
+        self.__write_value(media, "\t\t")
+        self.media_count += 1
+
+    def end(self):
+        self.outfile.write("\n\t]" if self.media_count else "]")
+        for key in self.remaining_keys:
+            self.outfile.write(",")
+            self.__write_key(key)
+            self.__write_value(self.output[key], "\t")
+        self.outfile.write("\n}")
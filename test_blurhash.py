@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import unittest
+from blurhash import BASE83_CHARS, encode
+
+def _decode_base83(value):
+    ret = 0
+    for char in value:
+        ret = ret * 83 + BASE83_CHARS.index(char)
+    return ret
+
+class TestBlurhash(unittest.TestCase):
+    def test_solid_color(self):
+        """Test that the DC component of a solid image is the image color"""
+        width, height = 8, 6
+        ret = encode([(255, 128, 0)] * (width * height), width, height)
+
+        # size flag + max AC + DC + 11 AC components
+        self.assertEqual(len(ret), 28)
+        self.assertEqual(_decode_base83(ret[0]), 3 + 2 * 9)
+
+        dc_value = _decode_base83(ret[2:6])
+        self.assertEqual((dc_value >> 16, (dc_value >> 8) & 255, dc_value & 255), (255, 128, 0))
+
+    def test_dc_only(self):
+        """Test a hash with a single component"""
+        ret = encode([(10, 20, 30)] * 4, 2, 2, 1, 1)
+        self.assertEqual(len(ret), 6)
+        self.assertEqual(ret[0:2], "00")
+        self.assertEqual(_decode_base83(ret[2:6]), (10 << 16) + (20 << 8) + 30)
+
+    def test_gradient(self):
+        """Test that a horizontal gradient produces a non-zero AC component"""
+        width, height = 16, 4
+        pixels = []
+        for _ in range(height):
+            for x in range(width):
+                value = int(x * 255 / (width - 1))
+                pixels.append((value, value, value))
+
+        ret = encode(pixels, width, height, 3, 1)
+        self.assertEqual(len(ret), 4 + 2 * 3)
+        self.assertGreater(_decode_base83(ret[1]), 0)
+        self.assertNotEqual(_decode_base83(ret[6:8]), 9 * 19 * 19 + 9 * 19 + 9)
+
+    def test_invalid_arguments(self):
+        """Test that invalid components or pixel counts are rejected"""
+        with self.assertRaises(ValueError):
+            encode([(0, 0, 0)] * 4, 2, 2, 10, 3)
+        with self.assertRaises(ValueError):
+            encode([(0, 0, 0)] * 3, 2, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import unittest
+from date_facets import build_date_facets
+
+class DateFacetsTest(unittest.TestCase):
+    def test_build_date_facets(self):
+        """The media positions are grouped by month and day, and the media is counted per day."""
+        media = [{"media_id": "p1", "exposure_time": "2024-10-19T10:00:00"},
+                 {"media_id": "p2", "exposure_time": "2024-10-19T08:00:00"},
+                 {"media_id": "p3", "exposure_time": "2024-03-01T10:00:00"},
+                 {"media_id": "p4", "exposure_time": "2020-10-19T08:00:00"},
+                 {"media_id": "p5", "exposure_time": "999-02-01T08:00:00"}]
+
+        facets = build_date_facets(media)
+
+        self.assertEqual(facets["month_days"], {"02-01": [4], "03-01": [2], "10-19": [0, 1, 2]})
+        self.assertEqual(facets["days"], {"2020-10-19": 1, "2024-03-01": 1, "2024-10-19": 2,
+                                          "999-02-01": 1})
+        self.assertEqual(list(facets["month_days"].keys()), ["02-01", "03-01", "10-19"])
+
+if __name__ == '__main__':
+    unittest.main()
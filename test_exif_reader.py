@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import os
+import re
+import struct
+import tempfile
+import unittest
+from exif_reader import format_exiv2_text, read_metadata_entries
+from exiv2_metadata import Exiv2MetadataParser
+from xmp_motion_photo import NotScannable
+
+XMP = b"""<x:xmpmeta xmlns:x="adobe:ns:meta/">
+  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+    <rdf:Description rdf:about=""
+        xmlns:GCamera="http://ns.google.com/photos/1.0/camera/"
+        xmlns:Container="http://ns.google.com/photos/1.0/container/"
+        xmlns:Item="http://ns.google.com/photos/1.0/container/item/"
+        GCamera:MotionPhoto="1">
+      <Container:Directory>
+        <rdf:Seq>
+          <rdf:li rdf:parseType="Resource">
+            <Container:Item Item:Mime="image/jpeg" Item:Semantic="Primary" Item:Length="0"/>
+          </rdf:li>
+          <rdf:li rdf:parseType="Resource">
+            <Container:Item Item:Mime="video/mp4" Item:Semantic="MotionPhoto"
+                            Item:Length="345678" Item:Padding="0"/>
+          </rdf:li>
+        </rdf:Seq>
+      </Container:Directory>
+    </rdf:Description>
+  </rdf:RDF>
+</x:xmpmeta>"""
+
+def _ifd(byte_order, start, entries, next_pointers):
+    # entries is a list of (tag, type, count, packed value). Values larger than 4 bytes are
+    # stored after the IFD. start is the offset of the IFD from the TIFF header.
+    data_start = start + 2 + (len(entries) * 12) + 4
+    header = struct.pack(byte_order + "H", len(entries))
+    data = b""
+    for (tag, type_id, count, value) in entries:
+        if tag in next_pointers:
+            value = struct.pack(byte_order + "L", next_pointers[tag])
+        if len(value) <= 4:
+            header += struct.pack(byte_order + "HHL", tag, type_id, count) + value.ljust(4, b"\x00")
+        else:
+            header += struct.pack(byte_order + "HHLL", tag, type_id, count,
+                                  data_start + len(data))
+            data += value
+
+    return header + struct.pack(byte_order + "L", 0) + data
+
+def _rational(byte_order, *values):
+    return b"".join(struct.pack(byte_order + "LL", num, den) for (num, den) in values)
+
+def _build_tiff(byte_order):
+    magic = b"II*\x00" if byte_order == "<" else b"MM\x00*"
+
+    ifd0_entries = [(0x010f, 2, 7, b"Google\x00"), (0x0110, 2, 12, b"Pixel 9 Pro\x00"),
+                    (0x8769, 4, 1, b""), (0x8825, 4, 1, b"")]
+    exif_entries = [(0x829a, 5, 1, _rational(byte_order, (1, 125))),
+                    (0x829d, 5, 1, _rational(byte_order, (168, 100))),
+                    (0x8827, 3, 1, struct.pack(byte_order + "H", 400)),
+                    (0x920a, 5, 1, _rational(byte_order, (690, 100)))]
+    gps_entries = [(0x0001, 2, 2, b"N\x00"),
+                   (0x0002, 5, 3, _rational(byte_order, (41, 1), (29, 1), (2424, 100))),
+                   (0x0003, 2, 2, b"W\x00"),
+                   (0x0004, 5, 3, _rational(byte_order, (81, 1), (41, 1), (534, 100)))]
+
+    ifd0_len = len(_ifd(byte_order, 8, ifd0_entries, {0x8769: 0, 0x8825: 0}))
+    exif_start = 8 + ifd0_len
+    exif_ifd = _ifd(byte_order, exif_start, exif_entries, {})
+    gps_start = exif_start + len(exif_ifd)
+    ifd0 = _ifd(byte_order, 8, ifd0_entries, {0x8769: exif_start, 0x8825: gps_start})
+
+    return magic + struct.pack(byte_order + "L", 8) + ifd0 + exif_ifd + \
+        _ifd(byte_order, gps_start, gps_entries, {})
+
+def _app1(payload):
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+def _read_exif_txt(file_contents):
+    ret = {}
+    for line in file_contents:
+        parts = re.split(r'\s+', line.strip(), maxsplit=3)
+        if len(parts) == 3:
+            ret[parts[0]] = ''
+        elif len(parts) >= 4:
+            ret[parts[0]] = parts[3]
+
+    return ret
+
+class ExifReaderTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, contents):
+        filename = os.path.join(self.tmpdir.name, name)
+        with open(filename, "wb") as outfile:
+            outfile.write(contents)
+        return filename
+
+    def _read(self, filename):
+        text = format_exiv2_text(read_metadata_entries(filename))
+        return _read_exif_txt(text.split("\n"))
+
+    def test_jpeg(self):
+        """EXIF and motion photo XMP tags are read from the JPEG header."""
+        filename = self._write("photo.jpg",
+                               b"\xff\xd8" + _app1(b"Exif\x00\x00" + _build_tiff(">")) +
+                               _app1(b"http://ns.adobe.com/xap/1.0/\x00" + XMP) +
+                               b"\xff\xda\x00\x02" + b"\x00" * 16)
+
+        metadata = self._read(filename)
+
+        self.assertEqual(metadata["Exif.Image.Make"], "Google")
+        self.assertEqual(metadata["Exif.Photo.FNumber"], "168/100")
+        self.assertEqual(metadata["Exif.GPSInfo.GPSLatitude"], "41/1 29/1 2424/100")
+        self.assertEqual(metadata["Xmp.GCamera.MotionPhoto"], "1")
+        self.assertEqual(metadata["Xmp.Container.Directory[2]/Container:Item/Item:Semantic"],
+                         "MotionPhoto")
+        self.assertEqual(metadata["Xmp.Container.Directory[2]/Container:Item/Item:Length"],
+                         "345678")
+
+        result = Exiv2MetadataParser({}).parse_photo_metadata(metadata)
+        self.assertEqual(result["camera"], "Google Pixel 9 Pro")
+        self.assertEqual(result["exif"], ["f/1.68", "1/125s", "6.9mm", "ISO400"])
+        self.assertAlmostEqual(result["lat"], 41.4901, places=4)
+        self.assertAlmostEqual(result["lon"], -81.6848, places=4)
+
+    def test_tiff(self):
+        """Little endian TIFF based raw files are read directly."""
+        filename = self._write("photo.dng", _build_tiff("<"))
+
+        metadata = self._read(filename)
+
+        self.assertEqual(metadata["Exif.Image.Model"], "Pixel 9 Pro")
+        self.assertEqual(metadata["Exif.Photo.ISOSpeedRatings"], "400")
+        self.assertEqual(metadata["Exif.GPSInfo.GPSLongitudeRef"], "W")
+
+    def test_unsupported(self):
+        """Other formats are left to exiv2."""
+        filename = self._write("photo.heic", b"\x00\x00\x00\x18ftypheic" + b"\x00" * 16)
+
+        with self.assertRaises(NotScannable):
+            read_metadata_entries(filename)
+
+    def test_truncated(self):
+        """Corrupt EXIF data is reported as NotScannable."""
+        tiff = _build_tiff("<")
+        filename = self._write("photo.dng", tiff[:40])
+
+        with self.assertRaises(NotScannable):
+            read_metadata_entries(filename)
+
+if __name__ == '__main__':
+    unittest.main()
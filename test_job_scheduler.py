@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import os
+import tempfile
+import unittest
+from job_scheduler import TIMED_OUT_RETURN_CODE, JobClass, JobScheduler
+
+class JobSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_inline(self):
+        """A single job runs the command before submit() returns."""
+        scheduler = JobScheduler(1)
+        output = self._path("out")
+        done = []
+
+        scheduler.submit(JobClass.PHOTO_RESIZE, ["touch", output], [output],
+                         on_done=done.append)
+
+        self.assertTrue(os.path.isfile(output))
+        self.assertEqual(done, [0])
+        self.assertIsNone(scheduler.get_thread_limit(JobClass.PHOTO_RESIZE))
+        self.assertFalse(scheduler.is_pending(output))
+
+    def test_class_limits(self):
+        """Composites, GIFs and transcodes get a share of the jobs."""
+        scheduler = JobScheduler(8)
+        try:
+            self.assertEqual(scheduler.limits[JobClass.PHOTO_RESIZE], 8)
+            self.assertEqual(scheduler.limits[JobClass.COMPOSITE], 4)
+            self.assertEqual(scheduler.limits[JobClass.GIF], 4)
+            self.assertEqual(scheduler.limits[JobClass.TRANSCODE], 2)
+        finally:
+            scheduler.shutdown()
+
+    def test_dependencies(self):
+        """A job only starts once the jobs that create its inputs are done."""
+        scheduler = JobScheduler(4, max_load=1000, min_free_memory_mb=0)
+        source = self._path("source")
+        dest = self._path("dest")
+
+        scheduler.submit(JobClass.TRANSCODE, ["sh", "-c", "sleep 0.2 && echo source > %s" % source],
+                         [source])
+        scheduler.submit(JobClass.PHOTO_RESIZE, ["cp", source, dest], [dest], [source])
+
+        scheduler.wait_for([dest])
+        with open(dest, "r", encoding="UTF-8") as infile:
+            self.assertEqual(infile.read(), "source\n")
+
+        scheduler.shutdown()
+        self.assertFalse(scheduler.is_pending(dest))
+
+    def test_timeout(self):
+        """Hung commands are killed once the timeout expires."""
+        scheduler = JobScheduler(1, timeout=0.1)
+        done = []
+
+        scheduler.submit(JobClass.TRANSCODE, ["sleep", "10"], [], on_done=done.append)
+
+        self.assertEqual(done, [TIMED_OUT_RETURN_CODE])
+
+if __name__ == '__main__':
+    unittest.main()
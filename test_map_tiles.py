@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import os
+import tempfile
+import unittest
+from map_tiles import CLUSTER_FIELDS, MAX_TILE_ZOOM, POINT_FIELDS, build_clusters, \
+    build_map_tiles, get_tile, get_tile_filename
+from media_writer_structured import write_map_tiles
+
+def _media(media_id, lat, lon, **kwargs):
+    media = {"media_id": media_id, "lat": lat, "lon": lon, "type": "photo",
+             "thumbnail": {"small": "s.jpg", "medium": "m.jpg", "reg": "r.jpg"}}
+    media.update(kwargs)
+    return media
+
+class MapTilesTest(unittest.TestCase):
+    def test_get_tile(self):
+        """Coordinates are mapped to the Web Mercator tile that contains them."""
+        self.assertEqual(get_tile(0.0, 0.0, 1), (1, 1))
+        self.assertEqual(get_tile(41.4993, -81.6944, 6), (17, 23))
+        self.assertEqual(get_tile(-33.8688, 151.2093, 6), (58, 38))
+
+    def test_get_tile_edges(self):
+        """The poles and the antimeridian are clamped to the edge tiles."""
+        self.assertEqual(get_tile(90.0, 180.0, 6), (63, 0))
+        self.assertEqual(get_tile(-90.0, -180.0, 6), (0, 63))
+
+    def test_build_map_tiles(self):
+        """Media is bucketed by tile and media without a location is skipped."""
+        media_list = [_media("p1", 41.4993, -81.6944),
+                      _media("p2", 41.5, -81.7, title="Cleveland"),
+                      _media("v1", -33.8688, 151.2093, type="video",
+                             variants={"480p": "v1-480p.mp4"}),
+                      {"media_id": "p3", "type": "photo"}]
+
+        (index, tiles) = build_map_tiles(media_list, 6)
+
+        self.assertEqual(index["count"], 3)
+        self.assertEqual(index["tiles"], {"6/17/23": 2, "6/58/38": 1})
+        self.assertEqual(index["bounds"], [[-33.8688, -81.7], [41.5, 151.2093]])
+        self.assertEqual(index["fields"], POINT_FIELDS)
+
+        video = dict(zip(POINT_FIELDS, tiles["6/58/38"][0]))
+        self.assertEqual(video["media_id"], "v1")
+        self.assertEqual(video["video"], "v1-480p.mp4")
+        self.assertEqual(video["small"], "s.jpg")
+        self.assertEqual(dict(zip(POINT_FIELDS, tiles["6/17/23"][1]))["title"], "Cleveland")
+
+        self.assertEqual(get_tile_filename("6/17/23"), "map/tiles/6/17/23.js")
+
+    def test_split_busy_tiles(self):
+        """Tiles with too many points are split until they fit or reach the maximum zoom."""
+        media_list = [_media("p1", 41.4993, -81.6944), _media("p2", 41.4994, -81.6945),
+                      _media("p3", 41.4995, -81.6946), _media("p4", 41.0, -81.0),
+                      _media("p5", -33.8688, 151.2093)]
+
+        (index, tiles) = build_map_tiles(media_list, 6, 2)
+
+        self.assertEqual(index["zoom"], 6)
+        self.assertEqual(index["count"], 5)
+        self.assertEqual(index["tiles"], {"6/58/38": 1, "7/35/47": 1,
+                                          "%d/%d/%d" % ((MAX_TILE_ZOOM,) +
+                                                        get_tile(41.4993, -81.6944,
+                                                                 MAX_TILE_ZOOM)): 3})
+        self.assertEqual(sorted(tiles.keys()), sorted(index["tiles"].keys()))
+
+    def test_stale_tiles(self):
+        """Tiles that are no longer used are only removed with --remove-stale-artifacts."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_map_tiles(tmpdir, [_media("p1", 41.4993, -81.6944)], False)
+            old_tile = os.path.join(tmpdir, get_tile_filename("6/17/23"))
+            self.assertTrue(os.path.isfile(old_tile))
+
+            write_map_tiles(tmpdir, [_media("p1", -33.8688, 151.2093)], False)
+            self.assertTrue(os.path.isfile(old_tile))
+
+            write_map_tiles(tmpdir, [_media("p1", -33.8688, 151.2093)], True)
+            self.assertFalse(os.path.exists(old_tile))
+            self.assertTrue(os.path.isfile(os.path.join(tmpdir,
+                                                        get_tile_filename("6/58/38"))))
+
+    def test_build_clusters(self):
+        """Nearby media is merged into one cluster that grows as the map zooms out."""
+        media_list = [_media("p1", 41.4993, -81.6944, rating=1),
+                      _media("p2", 41.5, -81.7, rating=5,
+                             thumbnail={"small": "best.jpg"}),
+                      _media("p3", 40.7128, -74.0060),
+                      _media("p4", -33.8688, 151.2093),
+                      {"media_id": "p5", "type": "photo"}]
+
+        clusters = build_clusters(media_list, 6)
+
+        self.assertEqual(sorted(clusters.keys()), ["0", "1", "2", "3", "4", "5"])
+        self.assertEqual([row[2] for row in clusters["5"]], [2, 1, 1])
+        self.assertEqual(sorted(row[2] for row in clusters["0"]), [1, 3])
+
+        cleveland = dict(zip(CLUSTER_FIELDS, clusters["5"][0]))
+        self.assertEqual(cleveland["thumbnail"], "best.jpg")
+        self.assertAlmostEqual(cleveland["lat"], 41.49965, places=4)
+        self.assertEqual([cleveland["south"], cleveland["west"], cleveland["north"],
+                          cleveland["east"]], [41.4993, -81.7, 41.5, -81.6944])
+
+        for rows in clusters.values():
+            self.assertEqual(sum(row[2] for row in rows), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import argparse
+import os
+import tempfile
+import unittest
+from PIL import Image
+import materialize_transformed
+from media_thumbnailer import Thumbnailer, ThumbnailType, get_pipeline_filename
+
+CROP = {"crop.left": "10", "crop.top": "5", "crop.right": "60", "crop.bottom": "45"}
+
+class MaterializeTransformedTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dest_directory = os.path.join(self.tmpdir.name, "site")
+        os.makedirs(self.dest_directory)
+        self.original = os.path.join(self.tmpdir.name, "original.jpg")
+        with Image.new("RGB", (100, 80), (200, 50, 50)) as image:
+            image.save(self.original)
+
+        self.transformed = os.path.join(self.dest_directory, "transformed", "2024", "photo.jpg")
+        self.thumbnailer = Thumbnailer("388x388", "100x100", "200x200", "1920x1080",
+                                       self.dest_directory, False, "convert", "ffmpeg",
+                                       "ffprobe", "exiv2", False, None, None, None,
+                                       transform_engine="pillow",
+                                       virtual_transformed_originals=True)
+
+    def tearDown(self):
+        self.thumbnailer.metadata_store.close()
+        self.tmpdir.cleanup()
+
+    def __record(self, transformations):
+        return self.thumbnailer.transform_original_image(self.original, self.transformed,
+                                                         transformations)
+
+    def __process(self, files):
+        return materialize_transformed.process(
+            argparse.Namespace(dest_directory=self.dest_directory, files=files))
+
+    def test_record_and_materialize(self):
+        """The recorded pipeline is replayed to write the transformed image."""
+        self.assertEqual(self.__record(CROP), (self.transformed, True))
+        self.assertTrue(os.path.isfile(get_pipeline_filename(self.transformed)))
+        self.assertFalse(os.path.exists(self.transformed))
+
+        self.assertEqual(self.__process(["transformed/2024/photo.jpg"]), 0)
+        with Image.open(self.transformed) as image:
+            self.assertEqual(image.size, (50, 40))
+
+        # An image that is newer than its pipeline isn't written again.
+        os.utime(get_pipeline_filename(self.transformed), (1, 1))
+        mtime = os.stat(self.transformed).st_mtime_ns
+        self.assertEqual(self.__process([]), 0)
+        self.assertEqual(os.stat(self.transformed).st_mtime_ns, mtime)
+
+    def test_changed_pipeline_removes_materialized_image(self):
+        """A new pipeline removes the image that was materialized for the old one."""
+        self.__record(CROP)
+        self.assertTrue(materialize_transformed.materialize(self.transformed))
+
+        self.__record(dict(CROP, **{"crop.right": "90"}))
+        self.assertFalse(os.path.exists(self.transformed))
+
+        self.assertTrue(materialize_transformed.materialize(self.transformed))
+        with Image.open(self.transformed) as image:
+            self.assertEqual(image.size, (80, 40))
+
+    def test_rejects_paths_outside_transformed(self):
+        """Only paths that resolve to inside the transformed directory are materialized."""
+        self.__record(CROP)
+        outside = os.path.join(self.tmpdir.name, "outside")
+        os.makedirs(outside)
+        os.symlink(outside, os.path.join(self.dest_directory, "transformed", "link"))
+
+        for filename in ["../original.jpg", "transformed/../../original.jpg",
+                         "transformed/link/photo.jpg", "transformed", self.original]:
+            with self.subTest(filename=filename):
+                self.assertEqual(self.__process([filename]), 1)
+
+        self.assertEqual(os.listdir(outside), [])
+        self.assertFalse(os.path.exists(self.transformed))
+
+    def test_thumbnails_from_virtual_source(self):
+        """The thumbnails are rendered from the pipeline without writing the full-sized image."""
+        self.__record(CROP)
+        self.assertEqual(self.thumbnailer.get_transformed_image_dimensions(self.transformed),
+                         (50, 40))
+
+        thumbs = os.path.join(self.dest_directory, "thumbnails")
+        for (thumbnail_type, expected) in [(ThumbnailType.SMALL_SQ, (100, 100)),
+                                           (ThumbnailType.REGULAR, (485, 388))]:
+            resized_image = os.path.join(thumbs, "%s.jpg" % (thumbnail_type.name))
+            self.thumbnailer.create_thumbnail(self.transformed, False, 0, resized_image, None,
+                                              thumbnail_type, 50, 40)
+            with Image.open(resized_image) as image:
+                self.assertEqual(image.size, expected)
+
+        self.assertFalse(os.path.exists(self.transformed))
+
+    def test_keeps_format(self):
+        """A transformed original is written in the format of its extension."""
+        original = os.path.join(self.tmpdir.name, "original.png")
+        with Image.new("RGB", (100, 80)) as image:
+            image.save(original)
+        transformed = os.path.join(self.dest_directory, "transformed", "2024", "photo.png")
+
+        self.thumbnailer.transform_original_image(original, transformed, CROP)
+        self.assertTrue(materialize_transformed.materialize(transformed))
+        with Image.open(transformed) as image:
+            self.assertEqual((image.format, image.size), ("PNG", (50, 40)))
+
+    def test_bad_originals(self):
+        """A bad original is reported and the other images are still materialized."""
+        self.__record(CROP)
+        other = os.path.join(self.dest_directory, "transformed", "2024", "other.jpg")
+        self.thumbnailer.transform_original_image(self.original, other, CROP)
+        with open(self.original, "wb") as outfile:
+            outfile.write(b"\xff\xd8not a jpeg")
+
+        # The thumbnails of the corrupt original are skipped.
+        thumbnail = os.path.join(self.dest_directory, "thumbnails", "small.jpg")
+        self.thumbnailer.create_thumbnail(self.transformed, False, 0, thumbnail, None,
+                                          ThumbnailType.SMALL_SQ, 50, 40)
+        self.assertFalse(os.path.exists(thumbnail))
+
+        self.assertEqual(self.__process(["transformed/2024/photo.jpg",
+                                         "transformed/2024/other.jpg"]), 1)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.transformed))),
+                         ["other.jpg.pipeline.json", "photo.jpg.pipeline.json"])
+
+        with Image.new("RGB", (100, 80)) as image:
+            image.save(self.original)
+        self.assertEqual(self.__process([]), 0)
+        self.assertTrue(os.path.isfile(other))
+
+        # Originals that Pillow can't read are used as is.
+        unsupported = os.path.join(self.tmpdir.name, "original.cr2")
+        with open(unsupported, "wb") as outfile:
+            outfile.write(b"raw")
+        transformed = os.path.join(self.dest_directory, "transformed", "raw.cr2")
+        self.assertEqual(self.thumbnailer.transform_original_image(unsupported, transformed,
+                                                                   CROP),
+                         (unsupported, False))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import math
+import struct
+import unittest
+from media_columns import build_media_columns
+
+FORMATS = {"int8": "b", "int32": "i", "uint32": "I", "float64": "d"}
+
+def _read_column(header, contents, name):
+    column = header["columns"][name]
+    fmt = "<%d%s" % (column["length"], FORMATS[column["type"]])
+    return list(struct.unpack_from(fmt, contents, column["offset"]))
+
+class MediaColumnsTest(unittest.TestCase):
+    def setUp(self):
+        self.media = [{"media_id": "p1", "exposure_time": "2024-05-01T10:00:00",
+                       "time_created": "2024-05-02T10:00:00", "rating": 5, "width": 400,
+                       "height": 300, "camera": "Pixel", "type": "photo", "tags": [3, 4],
+                       "lat": 41.5, "lon": -81.7, "event_id": 7},
+                      {"media_id": "v1", "exposure_time": "2019-05-01T10:00:00",
+                       "time_created": "2019-05-01T10:00:00", "rating": 0, "type": "video",
+                       "clip_duration_secs": 12, "tags": []},
+                      {"media_id": "p2", "exposure_time": "2018-05-01T10:00:00",
+                       "time_created": "2018-05-01T10:00:00", "type": "motion_photo",
+                       "camera": "Canon", "tags": [4]}]
+
+    def test_numeric_columns(self):
+        """Numeric fields are written as little endian columns with markers for missing values."""
+        (header, contents) = build_media_columns(self.media)
+
+        self.assertEqual(header["count"], 3)
+        self.assertEqual(_read_column(header, contents, "year"), [2024, 2019, 2018])
+        self.assertEqual(_read_column(header, contents, "rating"), [5, 0, -1])
+        self.assertEqual(_read_column(header, contents, "clip_duration_secs"), [-1, 12, -1])
+        self.assertNotIn("exposure_time", header["columns"])
+
+        lat = _read_column(header, contents, "lat")
+        self.assertEqual(lat[0], 41.5)
+        self.assertTrue(math.isnan(lat[1]))
+        self.assertIsNone(header["columns"]["lat"]["missing"])
+
+        for column in header["columns"].values():
+            self.assertEqual(column["offset"] % 8, 0)
+
+    def test_string_and_tag_columns(self):
+        """Strings are indexes into a table and tags are a flat list with offsets."""
+        (header, contents) = build_media_columns(self.media)
+
+        self.assertEqual(header["strings"]["camera"], ["Canon", "Pixel"])
+        self.assertEqual(_read_column(header, contents, "camera"), [1, -1, 0])
+        self.assertEqual([header["strings"]["type"][idx]
+                          for idx in _read_column(header, contents, "type")],
+                         ["photo", "video", "motion_photo"])
+        self.assertEqual(_read_column(header, contents, "tag_offsets"), [0, 2, 2, 3])
+        self.assertEqual(_read_column(header, contents, "tag_ids"), [3, 4, 4])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import unittest
+from media_shards import PATH_TEMPLATES, build_media_shards, compact_media_paths, \
+    expand_path_template
+
+class MediaShardsTest(unittest.TestCase):
+    def test_build_media_shards(self):
+        """The media is split by year, newest first, and the rest goes in the index."""
+        output = {"title": "Photos", "events": [{"id": 1}], "tags": [], "years": [],
+                  "media": [{"media_id": "p3", "exposure_time": "2024-05-01T10:00:00"},
+                            {"media_id": "p2", "exposure_time": "2024-01-01T10:00:00"},
+                            {"media_id": "p1", "exposure_time": "999-12-31T10:00:00"}]}
+
+        (index, shards) = build_media_shards(output)
+
+        self.assertNotIn("media", index)
+        self.assertEqual(index["title"], "Photos")
+        self.assertEqual(index["events"], [{"id": 1}])
+        self.assertEqual(index["shards"],
+                         [{"year": "2024", "file": "media-years/2024.js", "count": 2},
+                          {"year": "999", "file": "media-years/999.js", "count": 1}])
+        self.assertEqual([media["media_id"] for media in shards["2024"]], ["p3", "p2"])
+        self.assertEqual([media["media_id"] for media in shards["999"]], ["p1"])
+
+    def test_compact_media_paths(self):
+        """The derivable paths are dropped and can be rebuilt from the templates."""
+        media = {"media_id": "photo-1f", "exposure_time": "2024-05-01T10:00:00",
+                 "thumbnail": {"small": "thumbnails/media/small/9d/photo-1f.jpg",
+                               "reg": "thumbnails/media/regular/9d/photo-1f.jpg",
+                               "reg_width": 400},
+                 "motion_photo": {"reg_gif": "motion_photo/regular/9d/photo-1f.gif"},
+                 "metadata_text": "metadata/9d/photo-1f.txt",
+                 "link": "original/photo.jpg"}
+
+        compact = compact_media_paths(media)
+
+        self.assertEqual(compact["thumbnail"], {"reg_width": 400})
+        self.assertEqual(compact["motion_photo"], {})
+        self.assertNotIn("metadata_text", compact)
+        self.assertEqual(compact["link"], "original/photo.jpg")
+        self.assertEqual(compact["dir_hash"], "9d")
+        self.assertIn("small", media["thumbnail"])
+
+        rebuilt = {}
+        for (bit, (field, template)) in enumerate(PATH_TEMPLATES):
+            if compact["paths"] & (1 << bit):
+                rebuilt[field] = expand_path_template(template, compact["media_id"],
+                                                      compact["dir_hash"])
+        self.assertEqual(rebuilt, {"thumbnail.small": media["thumbnail"]["small"],
+                                   "thumbnail.reg": media["thumbnail"]["reg"],
+                                   "motion_photo.reg_gif": media["motion_photo"]["reg_gif"],
+                                   "metadata_text": media["metadata_text"]})
+
+    def test_unexpected_paths_kept(self):
+        """Paths that don't match a template are written out as is."""
+        media = {"media_id": "photo-1f", "thumbnail": {"small": "thumbnails/other.jpg"}}
+
+        compact = compact_media_paths(media)
+
+        self.assertEqual(compact, media)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import json
+import unittest
+from media_stats import add_group_stats
+
+def _new_stats():
+    return {"num_events": 0, "num_photos": 0, "num_videos": 0, "total_filesize": 0,
+            "min_date": None, "max_date": None}
+
+class MediaStatsTest(unittest.TestCase):
+    def test_add_group_stats(self):
+        """The counts, file sizes and date ranges of each group are added to its stats."""
+        media = [{"media_id": "thumb1", "all_artifacts_size": 100, "exposure_time": 300},
+                 {"media_id": "video2", "all_artifacts_size": 2000, "exposure_time": 100},
+                 {"media_id": "thumb3", "all_artifacts_size": 30, "exposure_time": 0},
+                 {"media_id": "thumb4", "all_artifacts_size": 4, "exposure_time": 200}]
+        all_stats = _new_stats()
+        all_stats["num_photos"] = 1
+        undated_stats = _new_stats()
+        empty_stats = _new_stats()
+        twice_stats = _new_stats()
+
+        add_group_stats(media, [(all_stats, media),
+                                (undated_stats, [media[2]]),
+                                (empty_stats, []),
+                                (twice_stats, [media[3], media[3]])])
+
+        self.assertEqual(all_stats, {"num_events": 0, "num_photos": 4, "num_videos": 1,
+                                     "total_filesize": 2134, "min_date": 100, "max_date": 300})
+        self.assertEqual(undated_stats["num_photos"], 1)
+        self.assertIsNone(undated_stats["min_date"])
+        self.assertEqual(empty_stats, _new_stats())
+        self.assertEqual((twice_stats["num_photos"], twice_stats["total_filesize"]), (2, 8))
+
+        # The stats are written to JSON, so they need to be plain integers.
+        json.dumps([all_stats, undated_stats, twice_stats])
+
+if __name__ == '__main__':
+    unittest.main()
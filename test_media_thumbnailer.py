@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from PIL import Image
+from media_thumbnailer import PILLOW_TRANSFORM_FAILURE_KEY, POSTER_FRAME_FAILURE_KEY, \
+    SPRITE_SHEET_COLUMNS, SPRITE_SHEET_ROWS, Thumbnailer, ThumbnailType
+
+def _ffprobe_output(video, pix_fmt, audio):
+    streams = [{"codec_type": "video", "codec_name": video, "pix_fmt": pix_fmt}]
+    if audio:
+        streams.append({"codec_type": "audio", "codec_name": audio})
+    return json.dumps({"streams": streams}).encode("UTF-8")
+
+class FakeCommandThumbnailer(Thumbnailer):
+    # Records the commands instead of running them. results maps the command name to the
+    # (returncode, stdout) that it returns. When ffmpeg_output is set, it's written to the
+    # output file of the ffmpeg commands, or raised when it's an exception.
+    def __init__(self, dest_directory, results, ffmpeg_output=None, **kwargs):
+        Thumbnailer.__init__(self, "388x388", "100x100", "200x200", "1920x1080", dest_directory,
+                             False, "convert", "ffmpeg", "ffprobe", "exiv2", False, None, None,
+                             None, **kwargs)
+        self.results = results
+        self.ffmpeg_output = ffmpeg_output
+        self.commands = []
+
+    def _do_run_command(self, cmd, capture_output, source=None):
+        if source and self._is_known_failure(source, cmd):
+            return subprocess.CompletedProcess(cmd, 1, b"", b"")
+
+        self.commands.append(cmd)
+        if cmd[0] == "ffmpeg" and isinstance(self.ffmpeg_output, Exception):
+            raise self.ffmpeg_output
+        if cmd[0] == "ffmpeg" and self.ffmpeg_output:
+            with open(cmd[-1], "wb") as outfile:
+                outfile.write(self.ffmpeg_output)
+
+        (returncode, stdout) = self.results.get(cmd[0], (0, b""))
+        if source:
+            self._record_command_result(source, cmd, returncode)
+        return subprocess.CompletedProcess(cmd, returncode, stdout, b"")
+
+    def _submit_command(self, job_class, cmd, outputs, inputs=(), on_done=None, source=None):
+        self.commands.append(cmd)
+
+class TransformVideoTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.video = os.path.join(self.tmpdir.name, "video.mov")
+        with open(self.video, "wb") as outfile:
+            outfile.write(b"video")
+        self.transformed = os.path.join(self.tmpdir.name, "site", "transformed", "video.mp4")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def __transform(self, results):
+        thumbnailer = FakeCommandThumbnailer(self.tmpdir.name, results)
+        try:
+            thumbnailer.transform_video(self.video, self.transformed)
+        finally:
+            thumbnailer.metadata_store.close()
+
+        ffmpeg_commands = [cmd for cmd in thumbnailer.commands if cmd[0] == "ffmpeg"]
+        self.assertEqual(len(ffmpeg_commands), 1)
+        return ffmpeg_commands[0]
+
+    def test_codec_combinations(self):
+        """Only browser compatible video is copied, and only AAC or missing audio is copied."""
+        copy_all = (["-c:v", "copy"], ["-c:a", "copy"])
+        copy_video = (["-c:v", "copy"], ["-c:a", "aac"])
+        encode = (["-c:v", "libx264"], ["-c:a", "aac"])
+        for (video, pix_fmt, audio, expected) in [("h264", "yuv420p", "aac", copy_all),
+                                                  ("h264", "yuvj420p", "aac", copy_all),
+                                                  ("h264", "yuv420p", None, copy_all),
+                                                  ("h264", "yuv420p", "mp3", copy_video),
+                                                  ("h264", "yuv420p", "pcm_s16le", copy_video),
+                                                  ("h264", "yuv422p", "aac", encode),
+                                                  ("h264", "yuv420p10le", "aac", encode),
+                                                  ("hevc", "yuv420p", "aac", encode),
+                                                  ("mjpeg", "yuvj420p", None, encode),
+                                                  ("vp9", "yuv420p", "opus", encode)]:
+            with self.subTest(video=video, pix_fmt=pix_fmt, audio=audio):
+                cmd = self.__transform({"ffprobe": (0, _ffprobe_output(video, pix_fmt, audio))})
+                joined = " ".join(cmd)
+                for args in expected:
+                    self.assertIn(" ".join(args), joined)
+                self.assertEqual(cmd[-1], self.transformed)
+
+    def test_ffprobe_failures(self):
+        """The video is fully encoded when its streams can't be read."""
+        for result in [(1, b""), (0, b"not json"), (0, b'{"streams": []}'),
+                       (0, json.dumps({"streams": [{"codec_type": "audio",
+                                                    "codec_name": "aac"}]}).encode("UTF-8"))]:
+            with self.subTest(result=result):
+                cmd = self.__transform({"ffprobe": result})
+                self.assertIn("libx264", cmd)
+                self.assertNotIn("copy", cmd)
+
+class PosterFrameTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.video = os.path.join(self.tmpdir.name, "video.mp4")
+        with open(self.video, "wb") as outfile:
+            outfile.write(b"video")
+        self.thumbs = os.path.join(self.tmpdir.name, "thumbnails")
+        self.thumbnailer = None
+
+    def tearDown(self):
+        # This also removes the poster frame of the last video.
+        self.thumbnailer.remove_thumbnails()
+        self.tmpdir.cleanup()
+
+    def __create_thumbnail(self, video, name):
+        self.thumbnailer.create_thumbnail(video, True, 0, os.path.join(self.thumbs, name), None,
+                                          ThumbnailType.SMALL_SQ, None, None)
+
+    def __get_commands(self, name):
+        return [cmd for cmd in self.thumbnailer.commands if cmd[0] == name]
+
+    def test_failure(self):
+        """A failed extraction removes the poster frame and is skipped until the video changes."""
+        self.thumbnailer = FakeCommandThumbnailer(self.tmpdir.name, {"ffmpeg": (1, b"")})
+        self.__create_thumbnail(self.video, "small.jpg")
+
+        # The keyframe seek and the first frame are both tried.
+        ffmpeg_commands = self.__get_commands("ffmpeg")
+        self.assertEqual(len(ffmpeg_commands), 2)
+        for cmd in ffmpeg_commands:
+            self.assertFalse(os.path.exists(cmd[-1]))
+        self.assertEqual(self.__get_commands("convert"), [])
+        self.assertEqual(self.thumbnailer.failure_cache[POSTER_FRAME_FAILURE_KEY + " " +
+                                                        self.video]["returncode"], 1)
+
+        self.__create_thumbnail(self.video, "medium.jpg")
+        self.assertEqual(len(self.__get_commands("ffmpeg")), 2)
+
+        os.utime(self.video, (1, 1))
+        self.__create_thumbnail(self.video, "large.jpg")
+        self.assertEqual(len(self.__get_commands("ffmpeg")), 4)
+
+    def test_exception(self):
+        """The poster frame is removed when running ffmpeg raises an exception."""
+        self.thumbnailer = FakeCommandThumbnailer(self.tmpdir.name, {},
+                                                  OSError("cannot run ffmpeg"))
+        with self.assertRaises(OSError):
+            self.__create_thumbnail(self.video, "small.jpg")
+
+        self.assertFalse(os.path.exists(self.__get_commands("ffmpeg")[0][-1]))
+
+    def test_success(self):
+        """The poster frame is shared by the thumbnails and removed for the next video."""
+        self.thumbnailer = FakeCommandThumbnailer(self.tmpdir.name, {}, b"frame")
+        self.__create_thumbnail(self.video, "small.jpg")
+        self.__create_thumbnail(self.video, "medium.jpg")
+
+        (ffmpeg_cmd,) = self.__get_commands("ffmpeg")
+        poster_frame = ffmpeg_cmd[-1]
+        self.assertEqual([cmd[1] for cmd in self.__get_commands("convert")],
+                         [poster_frame, poster_frame])
+        self.assertTrue(os.path.exists(poster_frame))
+
+        other_video = os.path.join(self.tmpdir.name, "other.mp4")
+        with open(other_video, "wb") as outfile:
+            outfile.write(b"other")
+        self.__create_thumbnail(other_video, "other.jpg")
+        self.assertFalse(os.path.exists(poster_frame))
+        self.assertEqual(self.thumbnailer.failure_cache, {})
+
+class PillowTransformTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.thumbnailer = FakeCommandThumbnailer(self.tmpdir.name, {},
+                                                  transform_engine="pillow")
+        self.transformed_dir = os.path.join(self.tmpdir.name, "transformed")
+
+    def tearDown(self):
+        self.thumbnailer.remove_thumbnails()
+        self.tmpdir.cleanup()
+
+    def __transform(self, original):
+        return self.thumbnailer.transform_original_image(
+            original, os.path.join(self.transformed_dir, os.path.basename(original)),
+            {"crop.left": "0", "crop.top": "0", "crop.right": "4", "crop.bottom": "4"})
+
+    def test_corrupt_original(self):
+        """A corrupt original is used as is and isn't decoded again until it changes."""
+        original = os.path.join(self.tmpdir.name, "corrupt.jpg")
+        with open(original, "wb") as outfile:
+            outfile.write(b"\xff\xd8not a jpeg")
+
+        self.assertEqual(self.__transform(original), (original, False))
+        self.assertEqual(os.listdir(self.transformed_dir), [])
+        key = "%s %s" % (PILLOW_TRANSFORM_FAILURE_KEY, original)
+        self.assertEqual(self.thumbnailer.failure_cache[key]["returncode"], 1)
+
+        with Image.new("RGB", (8, 8)) as image:
+            image.save(original)
+        os.utime(original, (1, 1))
+        (transformed, is_transformed) = self.__transform(original)
+        self.assertTrue(is_transformed)
+        self.assertTrue(os.path.isfile(transformed))
+        self.assertNotIn(key, self.thumbnailer.failure_cache)
+
+    def test_keeps_format(self):
+        """The transformed original is written in the format of the original."""
+        original = os.path.join(self.tmpdir.name, "photo.png")
+        with Image.new("RGB", (8, 8)) as image:
+            image.save(original)
+
+        (transformed, _) = self.__transform(original)
+        with Image.open(transformed) as image:
+            self.assertEqual((image.format, image.size), ("PNG", (4, 4)))
+
+        self.assertIsNotNone(self.thumbnailer.transformed_image_cache)
+        self.thumbnailer.release_transformed_image()
+        self.assertIsNone(self.thumbnailer.transformed_image_cache)
+
+class SpriteSheetTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.thumbnailer = FakeCommandThumbnailer(self.tmpdir.name, {})
+
+    def tearDown(self):
+        self.thumbnailer.remove_thumbnails()
+        self.tmpdir.cleanup()
+
+    def test_sheets(self):
+        """The tiles are listed in order and split across sheets of the full grid."""
+        tiles_per_sheet = SPRITE_SHEET_COLUMNS * SPRITE_SHEET_ROWS
+        media = []
+        for idx in range(tiles_per_sheet + 3):
+            media.append({"media_id": "m%d" % (idx),
+                          "small_thumbnail_path": "small/%d.jpg" % (idx)})
+            if idx != 1:
+                thumbnail = os.path.join(self.tmpdir.name, "thumbnails",
+                                         media[-1]["small_thumbnail_path"])
+                os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+                with open(thumbnail, "wb") as outfile:
+                    outfile.write(b"jpg")
+
+        prefix = os.path.join(self.tmpdir.name, "sprite")
+        (sheets, media_ids, tile) = self.thumbnailer.create_sprite_sheets("event", media,
+                                                                          ThumbnailType.SMALL_SQ,
+                                                                          prefix)
+
+        # The media without a thumbnail is left out.
+        self.assertEqual(media_ids,
+                         [item["media_id"] for item in media if item["media_id"] != "m1"])
+        self.assertEqual(tile, (100, 100))
+        self.assertEqual(sheets, [(prefix + "_0.jpg", SPRITE_SHEET_COLUMNS * 100,
+                                   SPRITE_SHEET_ROWS * 100),
+                                  (prefix + "_1.jpg", 200, 100)])
+        montage_commands = [cmd for cmd in self.thumbnailer.commands if cmd[0] == "montage"]
+        self.assertEqual(len(montage_commands), 2)
+
+class PhotoMetadataTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.photo = os.path.join(self.tmpdir.name, "photo.jpg")
+        exif = Image.Exif()
+        exif[0x010f] = "Google"
+        with Image.new("RGB", (8, 8)) as image:
+            image.save(self.photo, exif=exif.tobytes())
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def __get_exiv2_commands(self, native_metadata_reader):
+        exiv2_output = b"Exif.Image.Make                              Ascii       7  Google Inc\n"
+        thumbnailer = FakeCommandThumbnailer(self.tmpdir.name, {"exiv2": (0, exiv2_output)},
+                                             native_metadata_reader=native_metadata_reader)
+        (_, metadata) = thumbnailer.get_photo_metadata(self.photo, "thumb0000000000000001")
+        thumbnailer.remove_thumbnails()
+        return ([cmd for cmd in thumbnailer.commands if cmd[0] == "exiv2"], metadata)
+
+    def test_exiv2_by_default(self):
+        """exiv2 is used unless the native reader is turned on."""
+        (commands, metadata) = self.__get_exiv2_commands(False)
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(metadata["Exif.Image.Make"], "Google Inc")
+
+    def test_changing_the_reader(self):
+        """The stored native entries aren't used once the native reader is turned off."""
+        (commands, metadata) = self.__get_exiv2_commands(True)
+        self.assertEqual(commands, [])
+        self.assertEqual(metadata["Exif.Image.Make"], "Google")
+
+        (commands, metadata) = self.__get_exiv2_commands(False)
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(metadata["Exif.Image.Make"], "Google Inc")
+
+        # The exiv2 entries have all of the tags, so they are kept with the native reader.
+        (commands, metadata) = self.__get_exiv2_commands(True)
+        self.assertEqual(commands, [])
+        self.assertEqual(metadata["Exif.Image.Make"], "Google Inc")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import os
+import tempfile
+import unittest
+from media_writer_html import Html, get_page_filename, get_search_link
+
+def _media(media_id, exposure_time, event_id, tags):
+    return {"media_id": media_id, "title": "Media %s" % (media_id),
+            "exposure_time": exposure_time, "event_id": event_id, "tags": tags,
+            "link": "original/%s.jpg" % (media_id),
+            "thumbnail": {"medium": "thumbnails/media/medium/%s.jpg" % (media_id)}}
+
+class MediaWriterHtmlTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        thumbnail = {"medium": "thumbnails/event/medium/1.jpg"}
+        self.output = {
+            "events": [{"id": 1, "title": "Beach <Trip>", "link": "event/1.html",
+                        "thumbnail": thumbnail, "num_photos": 3,
+                        "date_range": "May 1-3, 2024", "min_date": "2024-05-01T10:00:00"}],
+            "tags": [{"id": 7, "title": "Ocean", "link": "tag/7.html", "num_photos": 1}],
+            "years": [{"id": "2024", "title": "2024", "link": "year/2024.html",
+                       "num_photos": 3}],
+            "media": [_media("p3", "2024-05-03T10:00:00", 1, [7]),
+                      _media("p2", "2024-05-02T10:00:00", 1, []),
+                      _media("p1", "2024-05-01T10:00:00", 1, [])]}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def __write(self):
+        writer = Html({}, "Photos", 2, self.tmpdir.name, None, None, None)
+        writer.write(self.output)
+
+    def __read(self, filename):
+        with open(os.path.join(self.tmpdir.name, filename), "r", encoding="UTF-8") as infile:
+            return infile.read()
+
+    def test_page_filename(self):
+        """The first page is at the link and the others have the page number in the name."""
+        self.assertEqual(get_page_filename("event/1.html", 1), "event/1.html")
+        self.assertEqual(get_page_filename("event/1.html", 3), "event/1_3.html")
+
+    def test_search_link(self):
+        """The search criteria is encoded into the link to the search page."""
+        self.assertEqual(get_search_link("Tag ID", 7),
+                         "../index.html?search=Tag%20ID%2Cequals%2C7#")
+
+    def test_write_pages(self):
+        """The media is split across pages, oldest first for the events and years."""
+        self.__write()
+
+        page1 = self.__read("event/1.html")
+        page2 = self.__read("event/1_2.html")
+        self.assertIn("Beach &lt;Trip&gt; (page 1 of 2)", page1)
+        self.assertIn('href="1_2.html"', page1)
+        self.assertIn('href="1.html"', page2)
+        self.assertLess(page1.index("original/p1.jpg"), page1.index("original/p2.jpg"))
+        self.assertNotIn("original/p3.jpg", page1)
+        self.assertIn("original/p3.jpg", page2)
+        self.assertIn("Event%20ID%2Cequals%2C1", page1)
+
+        self.assertIn('href="../event/1.html"', self.__read("year/2024.html"))
+        self.assertIn("original/p3.jpg", self.__read("tag/7.html"))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "tag/7_2.html")))
+
+    def test_unchanged_and_stale_pages(self):
+        """Unchanged pages are not written again and pages that are no longer used are removed."""
+        self.__write()
+        filename = os.path.join(self.tmpdir.name, "tag/7.html")
+        os.utime(filename, (0, 0))
+
+        self.output["media"] = self.output["media"][:2]
+        self.__write()
+
+        self.assertEqual(os.stat(filename).st_mtime, 0)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "event/1_2.html")))
+
+if __name__ == '__main__':
+    unittest.main()
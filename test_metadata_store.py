@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from metadata_store import COMMIT_INTERVAL, MetadataStore
+
+class MetadataStoreTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store_file = os.path.join(self.tmpdir.name, "metadata.sqlite3")
+        self.media = os.path.join(self.tmpdir.name, "photo.jpg")
+        with open(self.media, "wb") as outfile:
+            outfile.write(b"photo")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        """Stored metadata is returned on the next run."""
+        store = MetadataStore(self.store_file)
+        self.assertIsNone(store.get(self.media, ["exiv2"]))
+        store.put(self.media, "exiv2", {"Exif.Image.Make": "Google"}, "raw output")
+        store.close()
+
+        store = MetadataStore(self.store_file)
+        self.assertEqual(store.get(self.media, ["exiv2"]),
+                         ({"Exif.Image.Make": "Google"}, "raw output"))
+        store.close()
+
+    def test_changed_file(self):
+        """The stored metadata isn't used once the file changes."""
+        store = MetadataStore(self.store_file)
+        store.put(self.media, "exiv2", {"Exif.Image.Make": "Google"}, "raw output")
+
+        with open(self.media, "ab") as outfile:
+            outfile.write(b" edited")
+
+        self.assertIsNone(store.get(self.media, ["exiv2"]))
+        store.close()
+
+    def test_changed_source(self):
+        """The stored metadata is only used for the sources that are asked for."""
+        store = MetadataStore(self.store_file)
+        store.put(self.media, "native", {"Exif.Image.Make": "Google"}, "raw output")
+
+        self.assertIsNone(store.get(self.media, ["exiv2"]))
+        self.assertEqual(store.get(self.media, ["native", "exiv2"]),
+                         ({"Exif.Image.Make": "Google"}, "raw output"))
+        self.assertTrue(store.contains(self.media))
+        store.close()
+
+    def test_periodic_commit(self):
+        """The entries are committed while the run is still going."""
+        store = MetadataStore(self.store_file)
+        for _ in range(COMMIT_INTERVAL):
+            store.put(self.media, "exiv2", {}, "")
+
+        conn = sqlite3.connect(self.store_file)
+        try:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM media_metadata").fetchone()[0],
+                             1)
+        finally:
+            conn.close()
+            store.close()
+
+    def test_stale_entries_removed(self):
+        """Media that isn't looked up during a run is dropped from the store."""
+        store = MetadataStore(self.store_file)
+        store.put(self.media, "exiv2", {}, "")
+        store.close()
+
+        store = MetadataStore(self.store_file)
+        store.close()
+
+        store = MetadataStore(self.store_file)
+        self.assertIsNone(store.get(self.media, ["exiv2"]))
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import colorsys
+import os
+import tempfile
+import unittest
+import numpy
+from PIL import Image
+import pillow_transformer
+
+def _pixels(values):
+    return numpy.array([values], dtype=numpy.float32)
+
+class PillowTransformerTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def __path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_transformation_parameters(self):
+        """The Shotwell adjustments map to the same values as the ImageMagick arguments."""
+        transformations = {"adjustments.expansion": "{ 0, 130 }", "adjustments.exposure": "16",
+                           "adjustments.saturation": "-8", "adjustments.shadows": "16"}
+
+        self.assertEqual(pillow_transformer.get_expansion_levels(transformations),
+                         (0.0, 130.0 / 255.0))
+        self.assertEqual(pillow_transformer.get_modulate_multipliers(transformations), (1.5, 0.5))
+        self.assertEqual(pillow_transformer.get_shadows_contrast(transformations), 2.0)
+        self.assertEqual(pillow_transformer.get_modulate_multipliers({}), (1.0, 1.0))
+        self.assertIsNone(pillow_transformer.get_shadows_contrast({"adjustments.shadows": "0"}))
+
+    def test_levels(self):
+        """The values between black and white are stretched out to the full range."""
+        data = _pixels([[0.0, 0.25, 0.5], [0.75, 1.0, 0.625]])
+
+        numpy.testing.assert_allclose(pillow_transformer.levels(data, 0.25, 0.75),
+                                      [[[0.0, 0.0, 0.5], [1.0, 1.0, 0.75]]])
+        numpy.testing.assert_allclose(pillow_transformer.levels(data, 0.5, 0.5),
+                                      [[[0.0, 0.0, 1.0], [1.0, 1.0, 1.0]]])
+
+    def test_modulate_known_colors(self):
+        """Scaling the HSL lightness and saturation of red and gray gives the known colors."""
+        red = _pixels([[1.0, 0.0, 0.0]])
+        gray = _pixels([[0.4, 0.4, 0.4]])
+
+        # hsl(0, 50%, 50%) and hsl(0, 100%, 25%)
+        numpy.testing.assert_allclose(pillow_transformer.modulate(red, 1.0, 0.5),
+                                      [[[0.75, 0.25, 0.25]]], atol=1e-6)
+        numpy.testing.assert_allclose(pillow_transformer.modulate(red, 0.5, 1.0),
+                                      [[[0.5, 0.0, 0.0]]], atol=1e-6)
+        numpy.testing.assert_allclose(pillow_transformer.modulate(gray, 1.5, 2.0),
+                                      [[[0.6, 0.6, 0.6]]], atol=1e-6)
+
+    def test_modulate_matches_hsl(self):
+        """modulate() matches converting to HSL, scaling and converting back."""
+        colors = [[0.2, 0.6, 0.4], [0.9, 0.7, 0.1], [0.3, 0.1, 0.8], [0.95, 0.9, 0.92]]
+        for (brightness, saturation) in [(1.2, 0.7), (0.8, 1.5), (1.0, 1.0), (1.6, 2.0)]:
+            expected = []
+            for (red, green, blue) in colors:
+                (hue, lightness, sat) = colorsys.rgb_to_hls(red, green, blue)
+                expected.append(colorsys.hls_to_rgb(hue, min(lightness * brightness, 1.0),
+                                                    min(sat * saturation, 1.0)))
+
+            with self.subTest(brightness=brightness, saturation=saturation):
+                numpy.testing.assert_allclose(
+                    pillow_transformer.modulate(_pixels(colors), brightness, saturation),
+                    [expected], atol=1e-5)
+
+    def test_sigmoidal_contrast(self):
+        """The sigmoidal contrast keeps the end points and matches the ImageMagick curve."""
+        data = _pixels([[0.0, 0.25, 0.5], [0.3, 1.0, 0.75]])
+
+        # With contrast 3 and midpoint 0.5, the curve runs from sig(-1.5) = 0.182426 to
+        # sig(1.5) = 0.817574, so 0.25 maps to (sig(-0.75) - 0.182426) / 0.635148.
+        numpy.testing.assert_allclose(pillow_transformer.sigmoidal_contrast(data, 3.0, 0.5),
+                                      [[[0.0, 0.217895, 0.5], [0.270674, 1.0, 0.782105]]],
+                                      atol=1e-5)
+
+        # The midpoint maps to (0.5 - sig(-0.6)) / (sig(1.4) - sig(-0.6)).
+        numpy.testing.assert_allclose(pillow_transformer.sigmoidal_contrast(data, 2.0, 0.3)[0][1],
+                                      [0.325242, 1.0, 0.796279], atol=1e-5)
+
+        self.assertIs(pillow_transformer.sigmoidal_contrast(data, 0.0, 0.3), data)
+
+    def test_apply_transformations(self):
+        """The crop sets the size, straightening keeps it and the levels change the colors."""
+        with Image.new("RGB", (100, 80), (100, 100, 100)) as image:
+            cropped = pillow_transformer.apply_transformations(
+                image, {"crop.left": "10", "crop.top": "5", "crop.right": "60",
+                        "crop.bottom": "45", "adjustments.expansion": "{ 0, 200 }"})
+            self.assertEqual(cropped.size, (50, 40))
+            self.assertEqual(cropped.getpixel((25, 20)), (128, 128, 128))
+
+            straightened = pillow_transformer.apply_transformations(
+                image, {"straighten.angle": "5.0"})
+            self.assertEqual(straightened.size, (100, 80))
+
+            unchanged = pillow_transformer.apply_transformations(image, {})
+            self.assertIsNot(unchanged, image)
+            self.assertEqual(unchanged.getpixel((0, 0)), (100, 100, 100))
+
+    def test_create_thumbnail(self):
+        """The thumbnails are rotated clockwise and sized for each mode."""
+        with Image.new("RGB", (100, 50), (0, 0, 255)) as image:
+            image.paste((255, 0, 0), (0, 0, 20, 20))
+            for (rotate, mode, size, expected) in [(90, "fill", (20, 20), (20, 20)),
+                                                   (90, "shrink", (40, 40), (20, 40)),
+                                                   (0, "shrink", (400, 400), (100, 50)),
+                                                   (0, "exact", (30, 10), (30, 10))]:
+                dest = self.__path("thumb.jpg")
+                pillow_transformer.create_thumbnail(image, rotate, dest, size, mode, None)
+                with Image.open(dest) as thumbnail:
+                    self.assertEqual(thumbnail.size, expected)
+
+            # The top left corner ends up at the top right after a clockwise rotation.
+            dest = self.__path("rotated.jpg")
+            pillow_transformer.create_thumbnail(image, 90, dest, (100, 100), "shrink", None,
+                                                quality=100)
+            with Image.open(dest) as thumbnail:
+                (red, _, blue) = thumbnail.getpixel((thumbnail.width - 5, 5))
+                self.assertGreater(red, blue)
+
+    def test_overlay_icon(self):
+        """The overlay icon is placed in the bottom right corner."""
+        icon_path = self.__path("icon.png")
+        with Image.new("RGBA", (5, 5), (255, 0, 0, 255)) as icon:
+            icon.save(icon_path)
+
+        dest = self.__path("thumb.jpg")
+        with Image.new("RGB", (40, 40), (0, 0, 0)) as image:
+            pillow_transformer.create_thumbnail(image, 0, dest, (40, 40), "fill", icon_path,
+                                                quality=100)
+
+        with Image.open(dest) as thumbnail:
+            self.assertGreater(thumbnail.getpixel((38, 38))[0], 200)
+            self.assertLess(thumbnail.getpixel((2, 2))[0], 50)
+
+    def test_save_jpeg(self):
+        """The quality is passed to the encoder and the EXIF from the original is kept."""
+        exif = Image.Exif()
+        exif[0x010f] = "TestCam"
+        rng = numpy.random.default_rng(1)
+        noise = rng.integers(0, 256, size=(64, 64, 3), dtype=numpy.uint8)
+
+        sizes = {}
+        with Image.fromarray(noise, "RGB") as image:
+            for quality in [pillow_transformer.JPEG_QUALITY, 100]:
+                dest = self.__path("%d.jpg" % (quality))
+                pillow_transformer.save_jpeg(image, dest, {"exif": exif.tobytes()}, quality)
+                sizes[quality] = os.path.getsize(dest)
+
+        self.assertLess(sizes[pillow_transformer.JPEG_QUALITY], sizes[100])
+        with Image.open(self.__path("100.jpg")) as saved:
+            self.assertEqual(set(saved.quantization[0]), set([1]))
+            self.assertEqual(saved.getexif()[0x010f], "TestCam")
+
+    def test_save_image_format(self):
+        """The image is written in the format of its extension."""
+        with Image.new("RGB", (8, 8), (10, 20, 30)) as image:
+            for (name, expected) in [("image.JPG", "JPEG"), ("image.png", "PNG"),
+                                     ("image.tif", "TIFF"), ("image.webp", "WEBP")]:
+                with self.subTest(name=name):
+                    pillow_transformer.save_image(image, self.__path(name), {})
+                    with Image.open(self.__path(name)) as saved:
+                        self.assertEqual(saved.format, expected)
+
+            pillow_transformer.save_image(image, self.__path("image.tmp"), {}, "PNG")
+            with Image.open(self.__path("image.tmp")) as saved:
+                self.assertEqual(saved.format, "PNG")
+
+            with self.assertRaises(ValueError):
+                pillow_transformer.save_image(image, self.__path("image.cr2"), {})
+
+if __name__ == '__main__':
+    unittest.main()
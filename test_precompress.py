@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import gzip
+import os
+import tempfile
+import unittest
+import precompress
+
+class PrecompressTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "media-index.js")
+        self.content = b"registerMediaIndex({});\n" * 100
+        with open(self.filename, "wb") as outfile:
+            outfile.write(self.content)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_gzip_copy(self):
+        """A gzip copy with the same mtime as the original is written."""
+        precompress.compress_file(self.filename)
+
+        with gzip.open(self.filename + ".gz", "rb") as infile:
+            self.assertEqual(infile.read(), self.content)
+        self.assertEqual(os.stat(self.filename + ".gz").st_mtime_ns,
+                         os.stat(self.filename).st_mtime_ns)
+        self.assertEqual(os.path.exists(self.filename + ".br"), precompress.brotli is not None)
+
+    def test_unchanged_file_not_compressed_again(self):
+        """The compressed copy is left alone until the original is rewritten."""
+        precompress.compress_file(self.filename)
+        with open(self.filename + ".gz", "wb") as outfile:
+            outfile.write(b"marker")
+        os.utime(self.filename + ".gz", ns=(os.stat(self.filename).st_atime_ns,
+                                            os.stat(self.filename).st_mtime_ns))
+
+        precompress.compress_file(self.filename)
+        with open(self.filename + ".gz", "rb") as infile:
+            self.assertEqual(infile.read(), b"marker")
+
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        precompress.compress_file(self.filename)
+        with gzip.open(self.filename + ".gz", "rb") as infile:
+            self.assertEqual(infile.read(), self.content)
+
+    def test_small_file_removes_copies(self):
+        """Files below the minimum size have no compressed copies."""
+        precompress.compress_file(self.filename)
+        with open(self.filename, "wb") as outfile:
+            outfile.write(b"small")
+
+        precompress.compress_file(self.filename)
+        for ext in precompress.COMPRESSED_EXTENSIONS:
+            self.assertFalse(os.path.exists(self.filename + ext))
+
+    def test_get_source_filename(self):
+        """The original file name is found from the name of a compressed copy."""
+        self.assertEqual(precompress.get_source_filename("map/index.js.gz"), "map/index.js")
+        self.assertEqual(precompress.get_source_filename("map/index.js.br"), "map/index.js")
+        self.assertIsNone(precompress.get_source_filename("map/index.js"))
+
+if __name__ == '__main__':
+    unittest.main()
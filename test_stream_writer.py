@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import json
+import os
+import tempfile
+import unittest
+from stream_writer import MediaJsonWriter, StreamingFileWriter
+
+def _write_media_json(filename, output):
+    with StreamingFileWriter(filename) as outfile:
+        json_writer = MediaJsonWriter(outfile, output)
+        json_writer.begin()
+        for media in output["media"]:
+            json_writer.add_media(media)
+        json_writer.end()
+
+class StreamWriterTest(unittest.TestCase):
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "media.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_same_as_json_dumps(self):
+        """The streamed media.json is the same as json.dumps() with tab indentation."""
+        for media in ([], [{"media_id": "p1", "tags": [1, 2], "exif": [],
+                            "thumbnail": {"small": "a.jpg"}, "title": "Café\n"},
+                           {"media_id": "p2", "tags": []}]):
+            output = {"title": "Photos", "version_label": None, "media": media,
+                      "events": [{"id": 1, "years": {}}], "tags": [], "years": []}
+            with self.subTest(media_count=len(media)):
+                _write_media_json(self.filename, output)
+                with open(self.filename, "r", encoding="UTF-8") as infile:
+                    self.assertEqual(infile.read(), json.dumps(output, indent="\t"))
+
+    def test_unchanged_file_kept(self):
+        """The file is only replaced when its contents changed."""
+        output = {"title": "Photos", "media": [{"media_id": "p1"}]}
+        _write_media_json(self.filename, output)
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns - 1000000000))
+        old_mtime = os.stat(self.filename).st_mtime_ns
+
+        _write_media_json(self.filename, output)
+        self.assertEqual(os.stat(self.filename).st_mtime_ns, old_mtime)
+
+        output["media"].append({"media_id": "p2"})
+        _write_media_json(self.filename, output)
+        self.assertNotEqual(os.stat(self.filename).st_mtime_ns, old_mtime)
+        self.assertEqual(os.listdir(self.tmpdir.name), ["media.json"])
+
+    def test_partial_matches(self):
+        """Contents that share a prefix with the existing file are written in full."""
+        for (old, new) in [(["abc", "def"], ["abc", "de"]), (["abc"], ["abc", "def"]),
+                           (["abc", "def"], ["abc", "dxf", "ghi"]), (["abc"], []),
+                           ([], ["abc"])]:
+            with self.subTest(old=old, new=new):
+                for pieces in (old, new):
+                    with StreamingFileWriter(self.filename) as outfile:
+                        for piece in pieces:
+                            outfile.write(piece)
+
+                with open(self.filename, "r", encoding="UTF-8") as infile:
+                    self.assertEqual(infile.read(), "".join(new))
+                self.assertEqual(os.listdir(self.tmpdir.name), ["media.json"])
+
+    def test_error_removes_temporary_file(self):
+        """A failure while writing leaves the existing file alone."""
+        with self.assertRaises(ValueError):
+            with StreamingFileWriter(self.filename) as outfile:
+                outfile.write("partial")
+                raise ValueError("failed")
+
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+        with open(self.filename, "w", encoding="UTF-8") as outfile:
+            outfile.write("existing")
+        with self.assertRaises(ValueError):
+            with StreamingFileWriter(self.filename) as outfile:
+                outfile.write("exist")
+                outfile.write("changed")
+                raise ValueError("failed")
+
+        self.assertEqual(os.listdir(self.tmpdir.name), ["media.json"])
+        with open(self.filename, "r", encoding="UTF-8") as infile:
+            self.assertEqual(infile.read(), "existing")
+
+if __name__ == '__main__':
+    unittest.main()
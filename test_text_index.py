@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import unittest
+from text_index import build_text_index, get_shard_filename, get_words
+
+def _decode(deltas):
+    ret = []
+    for delta in deltas:
+        ret.append(delta + (ret[-1] if ret else 0))
+    return ret
+
+class TextIndexTest(unittest.TestCase):
+    def test_get_words(self):
+        """The text is split the same way as the contains word search."""
+        self.assertEqual(get_words("Sunny  Day at the BEACH"),
+                         set(["sunny", "day", "at", "the", "beach"]))
+
+    def test_build_text_index(self):
+        """Each word maps to the positions of the media that have it in each field."""
+        events = [{"id": 1, "title": "Beach Trip"}, {"id": 2}]
+        tags = [{"id": 5, "title": "Dog"}]
+        media = [{"media_id": "p1", "title": "Sunny day", "event_id": 1, "tags": [5]},
+                 {"media_id": "p2", "comment": "A dog at the beach", "event_id": 2,
+                  "camera": "Pixel 7"},
+                 {"media_id": "p3", "title": "Sunny sunny", "event_id": 2}]
+
+        (header, shards) = build_text_index(media, events, tags)
+
+        self.assertEqual(header["files"]["su"], "text-index/7375.js")
+        self.assertEqual(set(header["files"].keys()), set(shards.keys()))
+        self.assertEqual(_decode(shards["su"]["sunny"]["title"]), [0, 2])
+        self.assertEqual(_decode(shards["be"]["beach"]["event_name"]), [0])
+        self.assertEqual(_decode(shards["be"]["beach"]["comment"]), [1])
+        self.assertEqual(_decode(shards["do"]["dog"]["tag_name"]), [0])
+        self.assertEqual(_decode(shards["un"]["unnamed"]["event_name"]), [1, 2])
+        self.assertEqual(_decode(shards["pi"]["pixel"]["camera"]), [1])
+
+    def test_shard_filename(self):
+        """The prefixes are written to file names that only have hex digits."""
+        self.assertEqual(get_shard_filename("é/"), "text-index/c3a92f.js")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+
+import os
+import struct
+import tempfile
+import unittest
+from xmp_motion_photo import NotScannable, get_offset_from_xmp, scan_motion_photo_offset
+
+V1_XMP = b"""<x:xmpmeta xmlns:x="adobe:ns:meta/">
+  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+    <rdf:Description rdf:about=""
+        xmlns:GCamera="http://ns.google.com/photos/1.0/camera/"
+        GCamera:MicroVideo="1"
+        GCamera:MicroVideoVersion="1"
+        GCamera:MicroVideoOffset="123456"/>
+  </rdf:RDF>
+</x:xmpmeta>"""
+
+V2_XMP = b"""<x:xmpmeta xmlns:x="adobe:ns:meta/">
+  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+    <rdf:Description rdf:about=""
+        xmlns:GCamera="http://ns.google.com/photos/1.0/camera/"
+        xmlns:Container="http://ns.google.com/photos/1.0/container/"
+        xmlns:Item="http://ns.google.com/photos/1.0/container/item/"
+        GCamera:MotionPhoto="1">
+      <Container:Directory>
+        <rdf:Seq>
+          <rdf:li rdf:parseType="Resource">
+            <Container:Item Item:Mime="image/jpeg" Item:Semantic="Primary" Item:Length="0"/>
+          </rdf:li>
+          <rdf:li rdf:parseType="Resource">
+            <Container:Item Item:Mime="video/mp4" Item:Semantic="MotionPhoto"
+                            Item:Length="345678" Item:Padding="0"/>
+          </rdf:li>
+        </rdf:Seq>
+      </Container:Directory>
+    </rdf:Description>
+  </rdf:RDF>
+</x:xmpmeta>"""
+
+def _segment(marker, payload):
+    return b"\xff" + bytes([marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+def _build_jpeg(xmp_packet):
+    data = b"\xff\xd8"
+    data += _segment(0xe1, b"Exif\x00\x00" + b"\x00" * 32)
+    if xmp_packet is not None:
+        data += _segment(0xe1, b"http://ns.adobe.com/xap/1.0/\x00" + xmp_packet)
+    data += _segment(0xdb, b"\x00" * 65)
+    data += _segment(0xda, b"\x00" * 10)
+    data += b"\x12\x34\x56\xff\xd9"
+    return data
+
+class TestXmpMotionPhoto(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, contents):
+        filename = os.path.join(self.tmpdir.name, "photo.jpg")
+        with open(filename, "wb") as outfile:
+            outfile.write(contents)
+        return filename
+
+    def test_v1_micro_video(self):
+        """Test MVIMG_* photos with the GCamera:MicroVideoOffset attribute"""
+        self.assertEqual(get_offset_from_xmp(V1_XMP), 123456)
+
+    def test_v2_container_directory(self):
+        """Test PXL_*.MP.jpg photos with a Container:Directory"""
+        self.assertEqual(get_offset_from_xmp(V2_XMP), 345678)
+
+    def test_v2_element_form(self):
+        """Test container items that are written as child elements instead of attributes"""
+        xmp = V2_XMP.replace(
+            b'<Container:Item Item:Mime="video/mp4" Item:Semantic="MotionPhoto"\n'
+            b'                            Item:Length="345678" Item:Padding="0"/>',
+            b'<Container:Item rdf:parseType="Resource"><Item:Semantic>MotionPhoto'
+            b'</Item:Semantic><Item:Length>4567</Item:Length></Container:Item>')
+        self.assertEqual(get_offset_from_xmp(xmp), 4567)
+
+    def test_not_a_motion_photo(self):
+        """Test XMP without any motion photo properties"""
+        xmp = V1_XMP.replace(b'GCamera:MicroVideo="1"', b'GCamera:MicroVideo="0"')
+        self.assertIsNone(get_offset_from_xmp(xmp))
+        self.assertIsNone(get_offset_from_xmp(b"<not xml"))
+
+    def test_scan_jpeg_header(self):
+        """Test finding the XMP APP1 segment in a JPEG file"""
+        self.assertEqual(scan_motion_photo_offset(self._write(_build_jpeg(V2_XMP))), 345678)
+
+    def test_scan_jpeg_without_xmp(self):
+        """Test that JPEGs without an XMP packet are not motion photos"""
+        self.assertIsNone(scan_motion_photo_offset(self._write(_build_jpeg(None))))
+
+    def test_scan_non_jpeg(self):
+        """Test that other file formats are reported as not scannable"""
+        with self.assertRaises(NotScannable):
+            scan_motion_photo_offset(self._write(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64))
+
+if __name__ == '__main__':
+    unittest.main()
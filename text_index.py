@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Builds an inverted index of the words in the text fields of the media so that the search page
+# can answer the "contains word" searches without scanning the text of every media item. Each
+# word maps to the positions of the media that have it in each field, where the position is the
+# media's place in the concatenated per-year shards. The positions are delta encoded, and the
+# words are split into one file per prefix so that a search only loads the files for its words.
+
+from common import delta_encode
+
+TEXT_INDEX_DIRECTORY = "text-index"
+
+# The search fields in search.js that have their words in the index.
+TEXT_FIELDS = ["title", "comment", "event_name", "tag_name", "camera"]
+
+PREFIX_LENGTH = 2
+
+def get_words(value):
+    # Matches how the "contains word" search in search.js splits up the text.
+    return set(word for word in value.lower().split(" ") if word)
+
+def get_prefix(word):
+    return word[:PREFIX_LENGTH]
+
+def get_shard_filename(prefix):
+    # The prefix can have any characters so the file is named after its UTF-8 bytes.
+    return "%s/%s.js" % (TEXT_INDEX_DIRECTORY, prefix.encode("UTF-8").hex())
+
+def _get_field_values(media, field, event_names, tag_names):
+    if field == "event_name":
+        return [event_names.get(media.get("event_id"))]
+    if field == "tag_name":
+        return [tag_names.get(tag_id) for tag_id in media.get("tags", [])]
+    return [media.get(field)]
+
+def build_text_index(media_list, events, tags):
+    # Returns the header for the media index and a dictionary that maps each prefix to the
+    # words that start with it. media_list needs to be in the same order as the shards.
+    # The search page names the events without a title the same way.
+    event_names = {event["id"]: event.get("title", "Unnamed %s" % (event["id"]))
+                   for event in events}
+    tag_names = {tag["id"]: tag.get("title") for tag in tags}
+
+    postings = {}
+    for (position, media) in enumerate(media_list):
+        for field in TEXT_FIELDS:
+            words = set([])
+            for value in _get_field_values(media, field, event_names, tag_names):
+                if value:
+                    words.update(get_words(value))
+
+            for word in words:
+                postings.setdefault(word, {}).setdefault(field, []).append(position)
+
+    shards = {}
+    for word in sorted(postings.keys()):
+        shards.setdefault(get_prefix(word), {})[word] = \
+            {field: delta_encode(positions) for (field, positions) in postings[word].items()}
+
+    header = {"fields": TEXT_FIELDS, "prefix_length": PREFIX_LENGTH,
+              "files": {prefix: get_shard_filename(prefix) for prefix in sorted(shards.keys())}}
+
+    return (header, shards)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# Copyright (C) 2026 Brian Masney <masneyb@onstation.org>
+#
+# Detects Google motion photos by reading the XMP packet directly out of the JPEG header
+# instead of going through the full exiv2 text dump.
+
+import mmap
+import os
+import struct
+import xml.etree.ElementTree as ET
+
+# The XMP packet lives in an APP1 segment near the start of the file, after the EXIF APP1
+# segment (max 64KB) and possibly an ICC profile. Only this much of the file is mapped.
+MAX_HEADER_BYTES = 512 * 1024
+
+XMP_APP1_SIGNATURE = b"http://ns.adobe.com/xap/1.0/\x00"
+
+SOI = b"\xff\xd8"
+SOS_MARKER = 0xda
+EOI_MARKER = 0xd9
+APP1_MARKER = 0xe1
+
+class NotScannable(Exception):
+    pass
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1] if "}" in tag else tag
+
+def iter_app1_segments(data):
+    # Yields the payload of each APP1 segment in the JPEG header. These hold the EXIF and
+    # XMP metadata.
+    if data[0:2] != SOI:
+        raise NotScannable("not a JPEG file")
+
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xff:
+            raise NotScannable("corrupt JPEG marker at offset %d" % (pos))
+
+        marker = data[pos + 1]
+        if marker == 0xff:
+            # Fill bytes are allowed before a marker.
+            pos += 1
+            continue
+
+        if marker in (SOS_MARKER, EOI_MARKER):
+            return
+
+        # Markers without a length field
+        if marker == 0x01 or 0xd0 <= marker <= 0xd7:
+            pos += 2
+            continue
+
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        payload_start = pos + 4
+        payload_end = pos + 2 + length
+        if payload_end > len(data):
+            raise NotScannable("JPEG header is larger than %d bytes" % (MAX_HEADER_BYTES))
+
+        if marker == APP1_MARKER:
+            yield data[payload_start:payload_end]
+
+        pos = payload_end
+
+    raise NotScannable("did not find the start of the image data")
+
+def iter_xmp_packets(data):
+    for segment in iter_app1_segments(data):
+        if segment[0:len(XMP_APP1_SIGNATURE)] == XMP_APP1_SIGNATURE:
+            yield segment[len(XMP_APP1_SIGNATURE):]
+
+def _get_props(element):
+    # XMP properties can either be written as attributes (rdf:parseType shorthand) or as
+    # child elements. Collapse both into a single dictionary keyed by the local name.
+    props = {}
+    for key, value in element.attrib.items():
+        props[_local_name(key)] = value.strip()
+
+    for child in element:
+        if child.text and child.text.strip() and len(child) == 0:
+            props[_local_name(child.tag)] = child.text.strip()
+
+    return props
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def get_offset_from_xmp(xmp_packet):
+    # Returns the number of bytes from the end of the file where the embedded video starts,
+    # or None if the XMP packet does not describe a motion photo.
+    try:
+        root = ET.fromstring(xmp_packet.strip(b"\x00 \r\n\t"))
+    except ET.ParseError:
+        return None
+
+    motion_photo_offset = None
+    for element in root.iter():
+        props = _get_props(element)
+
+        # v1 motion photos (MVIMG_*)
+        if props.get("MicroVideo") == "1":
+            offset = _parse_int(props.get("MicroVideoOffset"))
+            if offset:
+                return offset
+
+        # v2 motion photos (PXL_*.MP.jpg). The Container:Directory is a sequence of
+        # Container:Item entries; the entry with the MotionPhoto semantic holds the length
+        # of the video that is appended to the end of the file. Note that some phones
+        # write a different namespace URI for the same prefix, so match the local names
+        # only.
+        if props.get("Semantic") == "MotionPhoto":
+            length = _parse_int(props.get("Length"))
+            if length:
+                motion_photo_offset = length
+
+    return motion_photo_offset
+
+def scan_motion_photo_offset(filename):
+    # Returns the offset from the end of the file to the start of the embedded video, or
+    # None if this is not a motion photo. NotScannable is raised when the file is not a JPEG
+    # or the header can't be parsed so that the caller can fall back to the exiv2 metadata.
+    with open(filename, "rb") as infile:
+        size = os.fstat(infile.fileno()).st_size
+        if size < 4:
+            raise NotScannable("file is too small")
+
+        with mmap.mmap(infile.fileno(), min(size, MAX_HEADER_BYTES),
+                       access=mmap.ACCESS_READ) as data:
+            for packet in iter_xmp_packets(data):
+                offset = get_offset_from_xmp(packet)
+                if offset:
+                    return offset
+
+    return None